@@ -13,10 +13,11 @@ from nrelcsm.csmPPI import *
 # Initialize ref and current YYYYMM
 # Calling program can override these
 #   e.g., ppi.ref_yr = 2003, etc.
+# The PPI tables are not read until the first escalator is computed.
 
 ref_yr  = 2002
 ref_mon =    9
 curr_yr = 2009
 curr_mon =  12
 
-ppi = PPI(ref_yr,ref_mon,curr_yr,curr_mon)
\ No newline at end of file
+ppi = LazyPPI(ref_yr,ref_mon,curr_yr,curr_mon)
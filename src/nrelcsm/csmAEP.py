@@ -0,0 +1,422 @@
+"""
+csmAEP.py
+
+Annual energy production kernels for the NREL Cost and Scaling Model power curve.
+
+The CSM power curve is piecewise polynomial in wind speed (zero below cut-in, cubic in region 2,
+linear in region 2.5, constant at rated and zero above cut-out), so its convolution with a Weibull
+distribution can be written in terms of regularized incomplete gamma functions.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+from nrelcsm.utilities import scipy_module
+
+def weibull(X,K,L):
+    '''
+    Return Weibull probability at speed X for distribution with k=K, c=L
+
+    The arguments may be arrays, in which case they are broadcast against each other.
+
+    Parameters
+    ----------
+    X : float or array
+       wind speed of interest [m/s]
+    K : float or array
+       Weibull shape factor for site
+    L : float or array
+       Weibull scale factor for site [m/s]
+
+    Returns
+    -------
+    w : float or array
+      Weibull pdf value
+    '''
+    w = (K/L) * ((X/L)**(K-1)) * np.exp(-((X/L)**K))
+    return w
+
+def weibull_partial_moments(n, K, L, a, b):
+    '''
+    Partial moments of a Weibull distribution over the wind speed interval [a, b]
+
+    Integral from a to b of v**n * weibull(v, K, L) dv, which is
+    L**n * Gamma(1 + n/K) * [P(1 + n/K, (b/L)**K) - P(1 + n/K, (a/L)**K)]
+    with P the regularized lower incomplete gamma function.
+
+    Parameters
+    ----------
+    n : int or array
+       order of the moment
+    K : float or array
+       Weibull shape factor for site
+    L : float or array
+       Weibull scale factor for site [m/s]
+    a, b : float or array
+       interval limits [m/s], 0 <= a <= b
+
+    Returns
+    -------
+    m : float or array
+      partial moment, the arguments broadcast against each other
+    '''
+
+    special = scipy_module('special')
+    s = 1.0 + n / K
+    return L**n * special.gamma(s) * (special.gammainc(s, (b/L)**K) - special.gammainc(s, (a/L)**K))
+
+def drivetrain_loss_polynomial(coeffs, rated_power, constant, linear, quadratic):
+    '''
+    Apply the CSM drivetrain loss model to a polynomial power curve segment
+
+    The drivetrain efficiency is eff = 1 - (constant/Pbar + linear + quadratic*Pbar) with Pbar = P / rated_power,
+    so the output power P*eff = (1-linear)*P - constant*rated_power - quadratic*P**2/rated_power is again
+    polynomial in wind speed.  The smoothing that drivetrain_csm applies near zero and rated power is not included.
+
+    Parameters
+    ----------
+    coeffs : array (..., m)
+       polynomial coefficients of the aerodynamic power [kW] in ascending powers of wind speed
+    rated_power : float or array
+       machine rating [kW]
+    constant, linear, quadratic : float
+       drivetrain loss coefficients
+
+    Returns
+    -------
+    out : array (..., 2m-1)
+      polynomial coefficients of the power after drivetrain losses [kW]
+    '''
+
+    coeffs = np.asarray(coeffs, dtype=float)
+    rated_power = np.asarray(rated_power, dtype=float)[..., np.newaxis]
+    m = coeffs.shape[-1]
+
+    out = np.zeros(coeffs.shape[:-1] + (2*m-1,))
+    for i in range(m):
+        out[..., i:i+m] -= (quadratic / rated_power) * coeffs[..., i:i+1] * coeffs
+    out[..., :m] += (1.0 - linear) * coeffs
+    out[..., 0] -= constant * rated_power[..., 0]
+
+    return out
+
+def exact_turbine_energy(breaks, coeffs, K, L):
+    '''
+    Mean turbine power [kW] for a piecewise polynomial power curve and a Weibull wind distribution
+
+    Parameters
+    ----------
+    breaks : array (..., s+1)
+       segment boundaries [m/s], power is zero outside of [breaks[0], breaks[-1]]
+    coeffs : array (..., s, m)
+       polynomial coefficients of each segment in ascending powers of wind speed
+    K : float or array
+       Weibull shape factor for site
+    L : float or array
+       Weibull scale factor for site [m/s]
+
+    Returns
+    -------
+    p : float or array
+      expected power [kW], i.e. the integral of the power curve times the Weibull pdf
+    '''
+
+    breaks = np.asarray(breaks, dtype=float)
+    coeffs = np.asarray(coeffs, dtype=float)
+    m = coeffs.shape[-1]
+
+    # indexes are [..., segment, moment order]
+    K = np.asarray(K, dtype=float)[..., np.newaxis, np.newaxis]
+    L = np.asarray(L, dtype=float)[..., np.newaxis, np.newaxis]
+    a = breaks[..., :-1, np.newaxis]
+    b = breaks[..., 1:, np.newaxis]
+    moments = weibull_partial_moments(np.arange(m), K, L, a, b)
+
+    return (coeffs * moments).sum(axis=(-2, -1))
+
+_legendre_rules = {}
+
+def _leggauss(n):
+    '''n-point Gauss-Legendre nodes and weights on [-1, 1], cached by n'''
+
+    if n not in _legendre_rules:
+        _legendre_rules[n] = np.polynomial.legendre.leggauss(n)
+    return _legendre_rules[n]
+
+def _gauss_rule(breaks, counts):
+
+    nodes = []
+    weights = []
+    for a, b, n in zip(breaks[:-1], breaks[1:], counts):
+        if n > 0:
+            x, w = _leggauss(n)
+            nodes.append(0.5*(b-a)*x + 0.5*(a+b))
+            weights.append(0.5*(b-a)*w)
+
+    return np.concatenate(nodes), np.concatenate(weights)
+
+def gauss_legendre_nodes(breaks, n_nodes=30):
+    '''
+    Wind speeds and quadrature weights for integrating a power curve region by region with Gauss-Legendre rules
+
+    The nodes are shared out between the power curve regions in proportion to their width (at least four per
+    region of non-zero width), so the kinks at the region boundaries never fall inside a rule.  An embedded
+    rule with half as many nodes per region is added for the error estimate.
+
+    Parameters
+    ----------
+    breaks : array
+       region boundaries [m/s] from aero_csm.power_curve_segments, cut-in first and cut-out last
+    n_nodes : int
+       approximate number of nodes of the main rule
+
+    Returns
+    -------
+    wind : array (n,)
+      wind speeds [m/s] in increasing order, the nodes of both rules
+    weights : array (2, n)
+      quadrature weights [m/s] of the main rule (row 0) and of the half order rule (row 1),
+      each zero at the nodes of the other rule
+    '''
+
+    breaks = np.asarray(breaks, dtype=float)
+    widths = np.diff(breaks)
+    active = widths > 0
+    if not active.any():
+        raise ValueError('power curve has no operating range between cut-in and cut-out')
+
+    fine = np.where(active, np.maximum(4, np.round(n_nodes * widths / widths.sum())), 0).astype(int)
+    coarse = fine // 2
+
+    wind_f, wts_f = _gauss_rule(breaks, fine)
+    wind_c, wts_c = _gauss_rule(breaks, coarse)
+
+    wind = np.concatenate([wind_f, wind_c])
+    weights = np.zeros((2, wind.size))
+    weights[0, :wind_f.size] = wts_f
+    weights[1, wind_f.size:] = wts_c
+
+    order = np.argsort(wind, kind='mergesort')
+    return wind[order], weights[:, order]
+
+def open_wind_record(filename, dtype='<f4'):
+    '''
+    Memory map a wind speed record without reading it into memory
+
+    Parameters
+    ----------
+    filename : str
+       .npy file (any dtype and shape, read with np.load) or raw binary file of dtype values
+    dtype : str or numpy dtype
+       value type of a raw binary file
+
+    Returns
+    -------
+    record : memmap (n,)
+      read-only wind speeds [m/s] in file order
+
+    Raises
+    ------
+    ValueError
+      if the mapped array is neither C nor Fortran contiguous, since it could not be flattened without a copy
+    '''
+
+    if str(filename).endswith('.npy'):
+        record = np.load(filename, mmap_mode='r')
+    else:
+        record = np.memmap(filename, dtype=dtype, mode='r')
+    if not (record.flags.c_contiguous or record.flags.f_contiguous):
+        raise ValueError('wind record %s is not contiguous on disk' % (filename,))
+    # memory (i.e. file) order keeps C and Fortran ordered records a view of the file
+    return record.ravel(order='K')
+
+def timeseries_energy(record, wind_curve, power_curve, scale=1.0, chunk_size=2**20):
+    '''
+    Stream a wind speed record through a power curve in chunks
+
+    Samples that are not finite (missing data) are skipped.  The power curve is interpolated linearly
+    and is zero outside of wind_curve; such samples count as valid (zero power) but are left out of the
+    histogram and counted in n_outside instead.
+
+    Parameters
+    ----------
+    record : array (n,)
+       wind speeds [m/s], typically a memmap from open_wind_record
+    wind_curve : array (m,)
+       increasing wind speeds [m/s] of the power curve
+    power_curve : array (m,)
+       turbine power [kW] at wind_curve
+    scale : float
+       factor applied to the record, e.g. the shear correction to hub height
+    chunk_size : int
+       number of samples converted to float64 at a time
+
+    Returns
+    -------
+    power_sum : float
+      sum of the turbine power [kW] over the valid samples
+    n_valid : int
+      number of valid samples
+    histogram : array (m,)
+      number of valid samples in bins centred on wind_curve
+    n_outside : int
+      number of valid samples below wind_curve[0] or above wind_curve[-1]
+    '''
+
+    wind_curve = np.asarray(wind_curve, dtype=float)
+    power_curve = np.asarray(power_curve, dtype=float)
+    edges = 0.5 * (wind_curve[1:] + wind_curve[:-1])
+
+    power_sum = 0.0
+    n_valid = 0
+    n_outside = 0
+    histogram = np.zeros(wind_curve.size, dtype=np.int64)
+    for start in range(0, len(record), chunk_size):
+        wind = np.asarray(record[start:start+chunk_size], dtype=float) * scale
+        wind = wind[np.isfinite(wind)]
+
+        power_sum += np.interp(wind, wind_curve, power_curve, left=0.0, right=0.0).sum()
+        n_valid += wind.size
+
+        inside = wind[(wind >= wind_curve[0]) & (wind <= wind_curve[-1])]
+        n_outside += wind.size - inside.size
+        histogram += np.bincount(np.searchsorted(edges, inside), minlength=wind_curve.size)
+
+    return power_sum, n_valid, histogram, n_outside
+
+class AEPTable(object):
+    '''
+    Precomputed normalized AEP of one power curve over a grid of hub height mean wind speed and weibull k
+
+    The table holds the gross capacity factor (mean turbine power / machine rating) from the same binned
+    weibull convolution as aep_calc_csm.compute, so that
+    gross_aep = table(mean_speed, k) * machine_rating * 8760 * turbine_number.
+    Queries are answered by bilinear or bicubic interpolation on the grid.
+    '''
+
+    def __init__(self, power_curve, wind_curve, machine_rating, mean_speeds=None, shape_factors=None, estimate_error=True):
+        '''
+        Parameters
+        ----------
+        power_curve : array
+           power after drivetrain losses [kW], e.g. aep_csm.drivetrain.power
+        wind_curve : array
+           evenly spaced wind speeds [m/s] of power_curve, e.g. aep_csm.aero.wind_curve
+        machine_rating : float
+           machine rating [kW] used to normalize the table
+        mean_speeds : array
+           increasing hub height mean wind speeds [m/s] of the grid, default 2 to 15 m/s by 0.05 m/s
+        shape_factors : array
+           increasing weibull shape factors of the grid, default 1 to 4 by 0.02
+        estimate_error : bool
+           compare the interpolated table with the direct result at the cell centres and store the largest
+           differences in max_error
+        '''
+
+        self.power_curve = np.asarray(power_curve, dtype=float)
+        self.wind_curve = np.asarray(wind_curve, dtype=float)
+        self.machine_rating = float(machine_rating)
+        self.mean_speeds = np.arange(2.0, 15.0 + 1e-9, 0.05) if mean_speeds is None else np.asarray(mean_speeds, dtype=float)
+        self.shape_factors = np.arange(1.0, 4.0 + 1e-9, 0.02) if shape_factors is None else np.asarray(shape_factors, dtype=float)
+
+        self.table = np.empty((self.mean_speeds.size, self.shape_factors.size))
+        for j, K in enumerate(self.shape_factors):
+            self.table[:, j] = self.direct(self.mean_speeds, K)
+
+        self._spline = None
+        self.max_error = {}
+        if estimate_error:
+            self.estimate_error()
+
+    def direct(self, mean_speed, weibull_k):
+        '''gross capacity factor from the weibull convolution on the power curve bins (no table)'''
+
+        from math import gamma
+
+        mean_speed, K = np.broadcast_arrays(np.asarray(mean_speed, dtype=float), np.asarray(weibull_k, dtype=float))
+        L = mean_speed / np.exp(np.log(np.vectorize(gamma, otypes=[float])(1.+1./K)))
+        ws_inc = self.wind_curve[1] - self.wind_curve[0]
+
+        weights = weibull(self.wind_curve, K[..., np.newaxis], L[..., np.newaxis])
+        return np.dot(weights, self.power_curve) * ws_inc / self.machine_rating
+
+    def __call__(self, mean_speed, weibull_k, method='linear'):
+        '''
+        Interpolated gross capacity factor
+
+        Parameters
+        ----------
+        mean_speed : float or array
+           hub height mean wind speed [m/s]
+        weibull_k : float or array
+           weibull shape factor
+        method : str
+           'linear' (bilinear) or 'cubic' (bicubic spline)
+
+        Returns
+        -------
+        cf : float or array
+          gross capacity factor, the arguments broadcast against each other.  Queries outside of the
+          grid raise ValueError.
+        '''
+
+        mean_speed, K = np.broadcast_arrays(np.asarray(mean_speed, dtype=float), np.asarray(weibull_k, dtype=float))
+        if (mean_speed.min() < self.mean_speeds[0] or mean_speed.max() > self.mean_speeds[-1] or
+            K.min() < self.shape_factors[0] or K.max() > self.shape_factors[-1]):
+            raise ValueError('query outside of the AEP table grid')
+
+        if method == 'linear':
+            i = np.clip(np.searchsorted(self.mean_speeds, mean_speed) - 1, 0, self.mean_speeds.size - 2)
+            j = np.clip(np.searchsorted(self.shape_factors, K) - 1, 0, self.shape_factors.size - 2)
+            u = (mean_speed - self.mean_speeds[i]) / (self.mean_speeds[i+1] - self.mean_speeds[i])
+            v = (K - self.shape_factors[j]) / (self.shape_factors[j+1] - self.shape_factors[j])
+            t = self.table
+            cf = (1-u)*(1-v)*t[i, j] + u*(1-v)*t[i+1, j] + (1-u)*v*t[i, j+1] + u*v*t[i+1, j+1]
+        elif method == 'cubic':
+            if self._spline is None:
+                self._spline = scipy_module('interpolate').RectBivariateSpline(self.mean_speeds, self.shape_factors, self.table, kx=3, ky=3)
+            cf = self._spline.ev(mean_speed, K)
+        else:
+            raise ValueError('unknown interpolation method %r' % (method,))
+
+        return cf[()] if cf.ndim == 0 else cf
+
+    def estimate_error(self):
+        '''
+        Largest absolute difference between the interpolated and the direct gross capacity factor at the cell centres,
+        where the interpolation error is largest, stored in max_error by method
+        '''
+
+        U = 0.5 * (self.mean_speeds[1:] + self.mean_speeds[:-1])
+        K = 0.5 * (self.shape_factors[1:] + self.shape_factors[:-1])
+        exact = np.empty((U.size, K.size))
+        for j, k in enumerate(K):
+            exact[:, j] = self.direct(U, k)
+
+        U, K = np.meshgrid(U, K, indexing='ij')
+        self.max_error = dict((method, float(np.abs(self(U, K, method) - exact).max())) for method in ('linear', 'cubic'))
+        return self.max_error
+
+    def save(self, filename):
+        '''write the table to a .npz file'''
+
+        np.savez(filename, power_curve=self.power_curve, wind_curve=self.wind_curve, machine_rating=self.machine_rating,
+                 mean_speeds=self.mean_speeds, shape_factors=self.shape_factors, table=self.table,
+                 max_error_methods=np.array(sorted(self.max_error)),
+                 max_error_values=np.array([self.max_error[m] for m in sorted(self.max_error)]))
+
+    @classmethod
+    def load(cls, filename):
+        '''read a table written by save, without recomputing it'''
+
+        with np.load(filename) as data:
+            obj = cls.__new__(cls)
+            obj.power_curve = data['power_curve']
+            obj.wind_curve = data['wind_curve']
+            obj.machine_rating = float(data['machine_rating'])
+            obj.mean_speeds = data['mean_speeds']
+            obj.shape_factors = data['shape_factors']
+            obj.table = data['table']
+            obj.max_error = dict(zip([str(m) for m in data['max_error_methods']], data['max_error_values'].tolist()))
+        obj._spline = None
+        return obj
@@ -9,6 +9,11 @@ import nrelcsm
 import os
 import sys
 import re
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from nrelcsm.utilities import LRUCache
  
 class Escalator:
     ''' 
@@ -16,10 +21,14 @@ class Escalator:
     '''
     
     def __init__(self,x):
-        ''' x is a list '''
+        ''' 
+            x is a list [name, table names, weights in pct, (optional) start years]
+            a start year pins that table's escalation to start in the given year instead of the reference year
+        '''
         self.name = x[0]  # name
-        self.tbls = x[1]  # list of table names
+        self.tbls = [t.strip() for t in x[1]]  # list of table names
         self.wts  = x[2]  # list of weights in pct (0-100.0)
+        self.start_yrs = x[3] if len(x) > 3 else [None] * len(self.tbls)  # list of fixed start years (None - reference year)
         
         sum = 0.0
         for i in range(len(self.wts)):
@@ -32,72 +41,259 @@ class Escalator:
         ''' 
             returns cost escalator between start_yr/start_mon and end_yr/end_mon 
             ppitbls is a dictionary of PPITbl objects, indexed by NAICS code
+            (reference implementation - PPI.compute uses the compiled weight matrix)
         '''
         sum = 0.0
         for i in range(len(self.tbls)):
-            key = self.tbls[i].strip()
-            '''if (key == 'GDP'):
-                print('Skipping GDP')
-                continue'''
+            key = self.tbls[i]
             if (key not in ppitbls):
-                print ('No PPI table %s'.format(key))
+                print ('No PPI table {0}'.format(key))
                 continue           
-            if (key == "326150P") and (self.name == "Advanced Blade material costs       "):
-            		ce = ppitbls[key].getEsc(2002,sm,ey,em)
+            if self.start_yrs[i] is not None:
+                ce = ppitbls[key].getEsc(self.start_yrs[i],sm,ey,em)
             else:
-            		ce = ppitbls[key].getEsc(sy,sm,ey,em)
+                ce = ppitbls[key].getEsc(sy,sm,ey,em)
             sum += ce * self.wts[i]
         return sum
 
 #------------------------------------------------
 
 class PPITbl:
-    ''' a PPITbl object represents a cost table '''
+    ''' 
+        a PPITbl object represents a cost table, stored as a dense (n_years, 13) array with NaN
+        for months that are not published yet (month 13 is the annual value)
+    '''
     
-    def __init__(self,code="",name="PPITbl"):
-        self.cost = [] # empty list
-        self.years = []
+    def __init__(self,code="",name="PPITbl",first_year=None,cost=None):
         self.name = name
         self.code = code
-        pass
-        
+        self.first_year = first_year
+        if cost is None:
+            cost = np.empty((0, 13))
+        self._cost = np.array(cost, dtype=float).reshape(-1, 13)
+        self._flat = self._cost.ravel()
+        self._pending = []  # rows from add_row, stacked onto _cost once, on the next access
+
+    def _stack_pending(self):
+        if self._pending:
+            self._cost = np.vstack([self._cost] + self._pending)
+            self._flat = self._cost.ravel()
+            self._pending = []
+
+    @property
+    def cost(self):
+        ''' (n_years, 13) array of index values '''
+        self._stack_pending()
+        return self._cost
+
+    @property
+    def flat(self):
+        ''' flat month index: (yr - first_year)*13 + mon - 1 '''
+        self._stack_pending()
+        return self._flat
+
+    @property
+    def years(self):
+        n = self._cost.shape[0] + len(self._pending)
+        return list(range(self.first_year, self.first_year + n)) if n else []
+
     def add_row(self,year,cost_array):
-        self.cost.append(cost_array)
-        self.years.append(year) 
+        ''' append the row for year (rows must be added for consecutive years) '''
+        if self.first_year is None:
+            self.first_year = year
+        if (year != self.first_year + self._cost.shape[0] + len(self._pending)):
+            raise ValueError('Year {0} does not follow the last year of table {1}'.format(year, self.code))
+        row = np.empty((1, 13))
+        row.fill(np.nan)
+        row[0, :len(cost_array)] = cost_array
+        self._pending.append(row)
         return 1
+
+    def index(self,yr,mon):
+        ''' flat index of yr/mon into self.flat (mon==13 is annual value); yr and mon may be arrays '''
+        idx = (yr - self.first_year)*13 + mon - 1
+        if np.ndim(idx) == 0:  # scalar fast path
+            valid = (0 < mon < 14) and (0 <= idx < self.flat.size)
+        else:
+            mon = np.asarray(mon)
+            valid = np.all((mon > 0) & (mon < 14) & (idx >= 0) & (idx < self.flat.size))
+        if not valid:
+            raise IndexError('Date out of range for table {0} ({1}-{2})'.format(self.code, self.first_year, self.first_year + self.cost.shape[0] - 1))
+        return idx
+
+    def getValue(self,yr,mon):
+        ''' return the index value(s) for yr/mon '''
+        return self.flat[self.index(yr,mon)]
         
     def getEsc(self,start_yr,start_mon,end_yr,end_mon,printFlag=0):
-        ''' return cost escalator between two dates (mon==13 is annual value) '''
-        start_row = start_yr-self.years[0]
-        end_row   = end_yr-self.years[0]
-        
-        if (start_row < 0):
-            print('\n*** Year start_yr ${0:.2f} before table start {1}\n'.format(start_yr,self.years[0]))
-            return None
-        if (end_row >= len(self.cost)):
-            print('\n*** Year end_yr ${0:.2f} after table end {1}\n'.format(end_yr,self.years[-1]))
-            return None            
-        if (len(self.cost[start_row]) < start_mon):
-            raise IndexError("Start_mon out of range")
-        if (len(self.cost[int(end_row)]) < int(end_mon)):
-            print('\n*** EM {0:2d} > LER {0:2d} in table {}'.format(end_mon, len(self.cost[end_row]), self.code))
-            raise IndexError("End_mon out of range")
-            
-        try:
-            '''print('SR {0:2d} ER {0:2d}'.format(start_row,end_row))
-            print('LSR {0:2d} LER {0:2d}'.format(len(self.cost[start_row]),len(self.cost[end_row])))'''
-            cost_start = self.cost[start_row][start_mon-1]
-            cost_end   = self.cost[int(end_row)][int(end_mon)-1]
-        except:
-            print('Index out of range for table {} {}'.format(self.code, self.name))
-            return None
-        esc = cost_end / cost_start
+        ''' 
+            return cost escalator between two dates (mon==13 is annual value)
+            the dates may be arrays, in which case an array of escalators is returned
+        '''
+        esc = self.flat[self.index(end_yr,end_mon)] / self.flat[self.index(start_yr,start_mon)]
+        if np.isnan(esc).any():
+            raise IndexError('Month not published in table {0} {1}'.format(self.code, self.name))
         return esc
 
 #--------------------------------------------------------------------------------------
 
+# version of the compiled table cache - bump whenever the cache layout changes
+PPI_CACHE_VERSION = 1
+
+def _parse_ppi_tables(fullfile, debug=0):
+    """
+    Parse the text PPI table file into dense arrays.
+
+    Parameters
+    ----------
+    fullfile : str
+      path to PPI_Tables.txt
+    debug : int
+      print progress if > 0
+
+    Returns
+    -------
+    tables : dict
+      'codes', 'names' : table codes and descriptions
+      'first_year', 'n_years' : first year and number of years in each table
+      'cost' : array (n_tables, max_years, 13) of index values, NaN where a month is not published
+      'yrs_gdp', 'ppi_gdp' : years and values of the GDP table
+    """
+
+    try:
+        infile = open(fullfile, 'r') #infile = open(self.tblfile)
+    except IOError as e:
+        raise IOError("Error opening or reading PPI tables %s: %s" % (fullfile, e))
+    if (debug > 0):
+        sys.stdout.write ("Opened %s\n" % fullfile)
+
+    codes = []
+    names = []
+    years = []  # list of year lists, one per table
+    rows  = []  # list of row lists, one per table
+    yrs_gdp = []
+    ppi_gdp = []
+
+    found_tables = False
+    found_GDP = False
+    num_re = re.compile(r"[\d\.]+")
+
+    for line in infile:
+        words = line.split("\t")
+        if not words:
+            continue
+
+        if (words[0].startswith("Gross Domestic Product")):
+            found_GDP = True
+            continue
+        if (found_GDP and words[0].startswith("Year")):
+            yrs_gdp = [int(w) for w in words[1:] if w.startswith("20")]
+            continue
+        if (found_GDP and words[0].startswith("Absolute Value")):
+            ppi_gdp = [float(w) for w in words[1:] if num_re.search(w)]
+
+            codes.append('GDP')
+            names.append("Gross Domestic Product")
+            years.append(list(yrs_gdp))
+            rows.append([[g] * 13 for g in ppi_gdp]) # fill all monthly values with annual value
+            if (debug > 0):
+                print('Created {0:2d} {1} {2}'.format(len(codes)-1, codes[-1], names[-1]))
+            continue
+
+        if (words[0].startswith("NAICS")):
+            found_tables = True
+            codes.append(words[1])
+            names.append(words[2].replace(r'"', ''))  # strip quotes from name
+            years.append([])
+            rows.append([])
+            if (debug > 0):
+                print('Created {0:2d} {1} {2}'.format(len(codes)-1, codes[-1], names[-1]))
+
+        if (found_tables and words[0].startswith("20")): # a year number
+            rvals = []
+            i = 1
+            while (re.match(r"\d+\.",words[i])):
+                rvals.append(float(words[i]))
+                i += 1
+            years[-1].append(int(words[0]))
+            rows[-1].append(rvals)
+    infile.close()
+
+    n_years = [len(y) for y in years]
+    cost = np.empty((len(codes), max(n_years), 13))
+    cost.fill(np.nan)
+    for i in range(len(codes)):
+        for j in range(n_years[i]):
+            cost[i, j, :len(rows[i][j])] = rows[i][j]
+
+    return {'codes' : np.array(codes), 'names' : np.array(names),
+            'first_year' : np.array([y[0] for y in years]), 'n_years' : np.array(n_years),
+            'cost' : cost, 'yrs_gdp' : np.array(yrs_gdp), 'ppi_gdp' : np.array(ppi_gdp)}
+
+def read_ppi_tables(fullfile, cachefile=None, debug=0):
+    """
+    Return the PPI tables in fullfile as dense arrays (see _parse_ppi_tables).
+
+    The parsed tables are kept in a compiled .npz cache next to the text file, tagged with
+    PPI_CACHE_VERSION and the SHA-1 of the text file.  The cache is rebuilt whenever either
+    changes; if it cannot be written (e.g. read-only install) the text file is parsed every time.
+
+    Parameters
+    ----------
+    fullfile : str
+      path to PPI_Tables.txt
+    cachefile : str
+      path to the compiled cache (default: fullfile with a .npz extension)
+    debug : int
+      print progress if > 0
+
+    Raises
+    ------
+    IOError
+      if fullfile cannot be read
+    """
+
+    if cachefile is None:
+        cachefile = os.path.splitext(fullfile)[0] + '.npz'
+
+    try:
+        with open(fullfile, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except IOError as e:
+        raise IOError("Error opening or reading PPI tables %s: %s" % (fullfile, e))
+
+    try:
+        with np.load(cachefile) as cache:
+            if int(cache['version']) == PPI_CACHE_VERSION and str(cache['digest']) == digest:
+                if (debug > 0):
+                    sys.stdout.write ("Loaded compiled PPI tables from %s\n" % cachefile)
+                return dict((k, cache[k]) for k in cache.files if k not in ('version', 'digest'))
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+
+    tables = _parse_ppi_tables(fullfile, debug)
+
+    try:
+        tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(cachefile), suffix='.npz', delete=False)
+        try:
+            with tmp:
+                np.savez(tmp, version=PPI_CACHE_VERSION, digest=digest, **tables)
+            os.replace(tmp.name, cachefile)  # atomic, so concurrent workers never see a partial cache
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+        if (debug > 0):
+            sys.stdout.write ("Wrote compiled PPI tables to %s\n" % cachefile)
+    except (IOError, OSError):
+        if (debug > 0):
+            sys.stdout.write ("Could not write compiled PPI tables to %s\n" % cachefile)
+
+    return tables
+
+#--------------------------------------------------------------------------------------
+
 class PPI:
-    def __init__(self,ref_yr,ref_mon,curr_yr,curr_mon,debug=0):
+    def __init__(self,ref_yr,ref_mon,curr_yr,curr_mon,debug=0,cache_size=1024):
         '''
         Initialize the PPI class for calculation of PPI indices given a referene year/month and current year/month.
         
@@ -111,6 +307,8 @@ class PPI:
           current PPI year
         curr_mon : int
           current PPI month   
+        cache_size : int
+          number of escalator values kept by the memo cache in compute (0 disables it)
         '''     
         
         #self.escData = [None] * 37
@@ -126,82 +324,12 @@ class PPI:
         self.curr_mon = curr_mon
         self.debug = debug
 
-        fullfile = os.path.join(nrelcsm.__path__[0], self.tblfile)
-        try:
-            infile = open(fullfile, 'r') #infile = open(self.tblfile)
-        except:
-            sys.stdout.write ("Error opening or reading %s\n" % fullfile)
-            quit()
-        else:
-            if (self.debug > 0):
-                sys.stdout.write ("Opened %s\n" % self.tblfile)
-            
-        itable = -1
-        found_tables = False
-        found_GDP = False
-        iCode   = {}
-        code = ''
-    
-        for line in infile:
-            words = line.split("\t")
-            if not words:
-                continue
-                
-            if (words[0].startswith("Gross Domestic Product")):
-                found_GDP = True
-                continue
-            if (found_GDP and words[0].startswith("Year")):
-                y = []
-                for i in range(1,len(words)):
-                    if (words[i].startswith("20")):
-                        y.append(int(words[i]))
-                self.yrs_gdp = y
-                continue
-            if (found_GDP and words[0].startswith("Absolute Value")):
-                g = []
-                num_re = re.compile(r"[\d\.]+")
-                for i in range(1,len(words)):
-                    if (num_re.search(words[i])):
-                        g.append(float(words[i]))
-                self.ppi_gdp = g
-                
-                code = 'GDP'
-                self.ppitbls[code] = PPITbl(code=code, name="Gross Domestic Product")  # add a new element to self.ppitbls
-                for i in range(len(y)):
-                    rvals = []
-                    for mon in range(13):
-                        rvals.append(g[i]) # fill all monthly values with annual value
-                    self.ppitbls[code].add_row(y[i], rvals)
-                ippi = len(self.ppitbls)-1
-                iCode[code] = ippi  # index of tables by code
-                if (self.debug > 0): 
-                    print('Created {0:2d} {} {}'.format(ippi, code, self.ppitbls[code].name))
-                continue
-                
-            if (words[0].startswith("NAICS")):
-                found_tables = True
-                itable += 1
-                iyr = 0
-                
-                words[2] = words[2].replace(r'"', '')  # strip quotes from name
-                code = words[1]
-                self.ppitbls[code] = PPITbl(code=code, name=words[2])  # add a new element to self.ppitbls
-                ippi = len(self.ppitbls)-1
-                if (self.debug > 0): 
-                    print('Created {0:2d} {} {}'.format(ippi, code, self.ppitbls[code].name))
-                iCode[code] = ippi  # index of tables by code 
-                
-            if (found_tables and words[0].startswith("20")): # a year number
-                rvals = []
-                i = 1
-                while (re.match(r"\d+\.",words[i])):
-                    rvals.append(float(words[i]))
-                    i += 1
-                self.ppitbls[code].add_row(int(words[0]), rvals)
-                iyr += 1
+        self.cache = LRUCache(cache_size)  # memo of escalator values, keyed on (code, ref_yr, ref_mon, curr_yr, curr_mon)
+        self.bundles = LRUCache(256)  # memo of callers' groups of escalators (e.g. nrel_csm.escalation_bundle), cleared with cache
+        self.load_tables()
         
         self.escData['IPPI_BLD'] = Escalator( ['Baseline Blade material costs       ',   ['3272123', '3255204', '332722489', '326150P'], [ 60.00,  23.00,  8.00,   9.00 ]  ] )
-        self.escData['IPPI_BLA'] = Escalator( ['Advanced Blade material costs       ',   ['3272123', '3255204', '332722489', '326150P'], [ 61.00,  27.00,  3.00,   9.00 ]  ] )
+        self.escData['IPPI_BLA'] = Escalator( ['Advanced Blade material costs       ',   ['3272123', '3255204', '332722489', '326150P'], [ 61.00,  27.00,  3.00,   9.00 ], [None, None, None, 2002]  ] )
         self.escData['IPPI_BLL'] = Escalator( ['Blade Labor costs                   ',   ['GDP    '                                   ], [ 100.00                       ]  ] )
         self.escData['IPPI_HUB'] = Escalator( ['Hub                                 ',   ['3315113',                                  ], [ 100.00                       ]  ] )
         self.escData['IPPI_PMB'] = Escalator( ['Pitch Mechanisms/Bearings           ',   ['332991P', '3353123', '333612P  ', '334513' ], [ 50.00,  20.00, 20.00,  10.00 ]  ] )
@@ -238,6 +366,123 @@ class PPI:
         self.escData['IPPI_RDC'] = Escalator( ['Road & Civil Work                   ',   ['BHWY   '                                   ], [ 100.00                       ]  ] )
         self.escData['IPPI_PAE'] = Escalator( ['Personnel Access Equipment          ',   ['GDP    '                                   ], [ 100.00                       ]  ] )
 
+        self.compile()
+
+    def load_tables(self):
+        ''' (re)read the PPI tables from self.tblfile; recompiles the escalators and clears the memo cache '''
+
+        fullfile = os.path.join(nrelcsm.__path__[0], self.tblfile)
+        tables = read_ppi_tables(fullfile, debug=self.debug)
+
+        self.yrs_gdp = tables['yrs_gdp'].tolist()
+        self.ppi_gdp = tables['ppi_gdp'].tolist()
+        self.ppitbls = {}
+        for i in range(len(tables['codes'])):
+            code = str(tables['codes'][i])
+            self.ppitbls[code] = PPITbl(code=code, name=str(tables['names'][i]), first_year=int(tables['first_year'][i]),
+                                        cost=tables['cost'][i, :tables['n_years'][i]])  # add a new element to self.ppitbls
+        if self.escData:
+            self.compile()
+
+    def compile(self):
+        '''
+        Compile the escalators in escData into weight matrices over the PPI tables, so that every
+        escalator for a pair of dates is one matrix-vector product of table escalation ratios.
+
+        self.weights[i, j] is the weight of table self.tbl_codes[j] in escalator self.esc_codes[i].
+        Table terms with a fixed start year go into self.pinned[start_yr] instead.
+        Clears the memo caches, so call it again after changing escData.
+        '''
+        self.cache.clear()
+        self.bundles.clear()
+        self.esc_codes = list(self.escData.keys())
+        self.tbl_codes = list(self.ppitbls.keys())
+        self._esc_index = dict((code, i) for i, code in enumerate(self.esc_codes))
+        tbl_index = dict((code, j) for j, code in enumerate(self.tbl_codes))
+
+        # all tables on a common year axis, flat month index (yr - first_year)*13 + mon - 1
+        self.first_year = min(t.first_year for t in self.ppitbls.values())
+        n_years = max(t.first_year + t.cost.shape[0] for t in self.ppitbls.values()) - self.first_year
+        self.flat = np.empty((len(self.tbl_codes), n_years*13))
+        self.flat.fill(np.nan)
+        for j, code in enumerate(self.tbl_codes):
+            tbl = self.ppitbls[code]
+            start = (tbl.first_year - self.first_year)*13
+            self.flat[j, start:start+tbl.flat.size] = tbl.flat
+
+        self.weights = np.zeros((len(self.esc_codes), len(self.tbl_codes)))
+        self.pinned = {}
+        for i, code in enumerate(self.esc_codes):
+            esc = self.escData[code]
+            for key, wt, start_yr in zip(esc.tbls, esc.wts, esc.start_yrs):
+                if (key not in tbl_index):
+                    print ('No PPI table {0}'.format(key))
+                    continue
+                if start_yr is None:
+                    self.weights[i, tbl_index[key]] += wt
+                else:
+                    self.pinned.setdefault(start_yr, np.zeros_like(self.weights))[i, tbl_index[key]] += wt
+        self._used = self.weights != 0.0
+        for start_yr in self.pinned:
+            self._used |= self.pinned[start_yr] != 0.0
+
+        # sparse rows for evaluating a single escalator: [(start_yr or None, table columns, weights)]
+        self._terms = []
+        for i in range(len(self.esc_codes)):
+            terms = [(None, np.flatnonzero(self.weights[i]), self.weights[i][self.weights[i] != 0.0])]
+            for start_yr, wts in self.pinned.items():
+                if wts[i].any():
+                    terms.append((start_yr, np.flatnonzero(wts[i]), wts[i][wts[i] != 0.0]))
+            self._terms.append(terms)
+
+    def _index(self,yr,mon):
+        ''' flat month index of yr/mon into self.flat; yr and mon may be arrays '''
+        idx = (yr - self.first_year)*13 + mon - 1
+        if np.ndim(idx) == 0:  # scalar fast path
+            valid = (0 < mon < 14) and (0 <= idx < self.flat.shape[1])
+        else:
+            mon = np.asarray(mon)
+            valid = np.all((mon > 0) & (mon < 14) & (idx >= 0) & (idx < self.flat.shape[1]))
+        if not valid:
+            raise IndexError('Date out of range of the PPI tables')
+        return idx
+
+    def _escalate_one(self,i,sy,sm,ey,em):
+        ''' escalator esc_codes[i] between sy/sm and ey/em, NaN if it needs a month that is not published '''
+        if np.ndim(sy) or np.ndim(sm) or np.ndim(ey) or np.ndim(em):
+            return self._escalate([i],sy,sm,ey,em)[0]
+        iend = self._index(ey,em)
+        esc = 0.0
+        for start_yr, cols, wts in self._terms[i]:
+            istart = self._index(sy if start_yr is None else start_yr,sm)
+            esc = esc + np.dot(wts, self.flat[cols, iend] / self.flat[cols, istart])
+        return esc
+
+    def _escalate(self,rows,sy,sm,ey,em):
+        ''' 
+            escalators for the escalator rows (index array or slice into esc_codes) between sy/sm and ey/em
+            NaN where an escalator needs a month that is not published
+        '''
+        istart = self._index(sy,sm)
+        iend = self._index(ey,em)
+        if np.ndim(istart) or np.ndim(iend):
+            istart, iend = np.broadcast_arrays(istart, iend)
+        end = self.flat[:, iend]
+        ratios = end / self.flat[:, istart]
+        missing = np.isnan(ratios)
+        # contract over the table axis, so dates of any shape give escalators of shape (rows,) + date shape
+        esc = np.tensordot(self.weights[rows], np.where(missing, 0.0, ratios), axes=(1, 0))
+        for start_yr, wts in self.pinned.items():
+            ipinned = self._index(start_yr,sm)
+            if np.ndim(iend):
+                ipinned = np.broadcast_to(ipinned, np.shape(iend))
+            pinned = end / self.flat[:, ipinned]
+            esc += np.tensordot(wts[rows], np.where(np.isnan(pinned), 0.0, pinned), axes=(1, 0))
+            missing |= np.isnan(pinned)
+        if missing.any():
+            esc = np.where(np.tensordot(self._used[rows], missing, axes=(1, 0)), np.nan, esc)
+        return esc
+
     def compute(self,escCode,debug=0):
         """
         Returns the cost escalator for escData object 'escCode', using reference and current yr/mon values.
@@ -254,16 +499,171 @@ class PPI:
         """ 
         # returns the cost escalator for escData object 'escCode', using reference and current yr/mon values
         
-        if (escCode not in self.escData):
-            print('Warning - no such code in PPI {0:.2f}'.format(escCode))
-            #return 0
-        esc = self.escData[escCode].compute(self.ppitbls,self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon)
+        esc = self.escalate(escCode,self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon)
         if (debug > 0):
             print('Escalator {} from {}{:02} to {}{:02} = {:.4}'.format(escCode,self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon,esc))
         return esc
+
+    def escalate(self,escCode,ref_yr,ref_mon,curr_yr,curr_mon):
+        """
+        Returns the cost escalator for escData object 'escCode' between the given reference and current yr/mon.
+        Results for scalar dates are memoized in self.cache (see cache_info).
+
+        Parameters
+        ----------
+        escCode : str
+          code of the escalator, e.g. 'IPPI_TWR'
+        ref_yr, ref_mon, curr_yr, curr_mon : int or array
+          reference and current dates (mon==13 is the annual value)
+
+        Returns
+        -------
+        esc : float or array
+          cost escalator from the reference year/month to the current year/month, of the broadcast shape of the dates
+
+        Raises
+        ------
+        KeyError
+          if escCode is not an escalator code
+        """
+        key = (escCode,ref_yr,ref_mon,curr_yr,curr_mon)
+        try:
+            esc = self.cache.get(key)
+        except TypeError:  # array dates are not cached
+            key = esc = None
+        if esc is not None:
+            return esc
+
+        if (escCode not in self._esc_index):
+            raise KeyError('No such escalator code in PPI: {0}'.format(escCode))
+        esc = self._escalate_one(self._esc_index[escCode],ref_yr,ref_mon,curr_yr,curr_mon)
+        if np.isnan(esc).any():
+            raise IndexError('Escalator {0} uses a month that is not published in the PPI tables'.format(escCode))
+        if key is not None:
+            self.cache.put(key, esc)
+        return esc
+
+    def context(self,**dates):
+        """
+        Returns an immutable PPIContext for this PPI, with the current reference and current yr/mon
+        values of this object unless overridden by keyword (ref_yr, ref_mon, curr_yr, curr_mon).
+        """
+        ctx = PPIContext(self,self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon)
+        return ctx.replace(**dates) if dates else ctx
+
+    def cache_info(self):
+        """ hits, misses, size and maxsize of the escalator memo cache, with those of the bundle cache under 'bundles' """
+        info = self.cache.info()
+        info['bundles'] = self.bundles.info()
+        return info
+
+    def cache_clear(self):
+        """ empty the escalator and bundle memo caches and reset their counters """
+        self.cache.clear()
+        self.bundles.clear()
+
+    def compute_all(self,ref=None,curr=None):
+        """
+        Returns every cost escalator at once.
+
+        Parameters
+        ----------
+        ref : tuple
+          (year, month) of the reference date, default (self.ref_yr, self.ref_mon)
+        curr : tuple
+          (year, month) of the current date, default (self.curr_yr, self.curr_mon)
+          years and months may be arrays, giving arrays of escalators
+
+        Returns
+        -------
+        esc : dict
+          cost escalator for each code in escData (NaN if it needs a month that is not published)
+        """
+        if ref is None:
+            ref = (self.ref_yr, self.ref_mon)
+        if curr is None:
+            curr = (self.curr_yr, self.curr_mon)
+        esc = self._escalate(slice(None),ref[0],ref[1],curr[0],curr[1])
+        return dict(zip(self.esc_codes, esc))
         
 #--------------------------------------------------------------------------------------
 
+class PPIContext(object):
+    '''
+        immutable escalation context: a PPI object with a reference and a current yr/mon.
+
+        Components build one per evaluation (ppi.context(...).replace(...)) instead of setting
+        dates on the shared PPI object, so evaluations do not leak dates into each other and
+        can run concurrently from several threads.
+    '''
+
+    __slots__ = ('ppi', 'ref_yr', 'ref_mon', 'curr_yr', 'curr_mon')
+
+    def __init__(self,ppi,ref_yr,ref_mon,curr_yr,curr_mon):
+        for name, value in zip(PPIContext.__slots__, (ppi, ref_yr, ref_mon, curr_yr, curr_mon)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PPIContext is immutable, use replace() to change its dates')
+
+    def replace(self,**dates):
+        ''' return a copy with some of ref_yr, ref_mon, curr_yr, curr_mon replaced '''
+        values = dict((name, getattr(self, name)) for name in PPIContext.__slots__)
+        values.update(dates)
+        return PPIContext(**values)
+
+    def compute(self,escCode):
+        ''' cost escalator for escCode from the reference to the current yr/mon of this context '''
+        return self.ppi.escalate(escCode,self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon)
+
+    def __repr__(self):
+        return 'PPIContext(ref_yr={0}, ref_mon={1}, curr_yr={2}, curr_mon={3})'.format(self.ref_yr,self.ref_mon,self.curr_yr,self.curr_mon)
+
+#--------------------------------------------------------------------------------------
+
+class LazyPPI(object):
+    '''
+        stand-in for a PPI object that defers reading the PPI tables until an escalator is first needed.
+        The reference and current yr/mon can be read and set before the tables are loaded;
+        any other attribute access builds the PPI and is forwarded to it.
+    '''
+
+    _dates = ('ref_yr', 'ref_mon', 'curr_yr', 'curr_mon')
+    _lock = threading.Lock()
+
+    def __init__(self,ref_yr,ref_mon,curr_yr,curr_mon,debug=0):
+        object.__setattr__(self, '_args', {'ref_yr' : ref_yr, 'ref_mon' : ref_mon,
+                                           'curr_yr' : curr_yr, 'curr_mon' : curr_mon, 'debug' : debug})
+        object.__setattr__(self, '_ppi', None)
+
+    def load(self):
+        ''' build the PPI object (if not already built) and return it '''
+        if self._ppi is None:
+            with LazyPPI._lock:
+                if self._ppi is None:
+                    object.__setattr__(self, '_ppi', PPI(**self._args))
+        return self._ppi
+
+    @property
+    def loaded(self):
+        return self._ppi is not None
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the proxy itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._ppi is None and name in LazyPPI._dates:
+            return self._args[name]
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        if self._ppi is None and name in LazyPPI._dates:
+            self._args[name] = value
+        else:
+            setattr(self.load(), name, value)
+
+#--------------------------------------------------------------------------------------
+
 def example():
     
     # test cases
@@ -0,0 +1,175 @@
+"""
+csmRaster.py
+
+Capacity factor, AEP and LCOE rasters from gridded wind resource maps.
+
+The input grids (mean wind speed at 50 m, weibull k and optionally the shear exponent) are .npy files that
+are memory mapped and processed tile by tile, so peak memory is set by the tile size and not by the raster
+size.  Every tile is evaluated for all turbine designs with the vectorized aep_calc_csm, opex_csm and fin_csm
+and written straight into memory mapped .npy output rasters of shape (designs, rows, columns).  Tiles are
+independent, so they can be shared out over a process pool.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+from nrelcsm.nrel_csm import aep_calc_csm, opex_csm, fin_csm
+
+RASTER_OUTPUTS = ('capacity_factor', 'net_aep', 'lcoe')
+
+def raster_design(power_curve, wind_curve, machine_rating, hub_height, turbine_cost, bos_costs):
+    '''
+    Turbine design for capacity_factor_raster
+
+    Parameters
+    ----------
+    power_curve, wind_curve : array
+       power curve after drivetrain losses [kW] on evenly spaced wind speeds [m/s], e.g. from aep_csm
+    machine_rating : float
+       machine rating [kW]
+    hub_height : float
+       hub height [m]
+    turbine_cost : float
+       turbine capital cost [$], e.g. tcc_csm.turbine_cost
+    bos_costs : float
+       plant balance of station cost [$], e.g. bos_csm.bos_costs
+
+    Returns
+    -------
+    design : dict
+    '''
+
+    return dict(power_curve=np.asarray(power_curve, dtype=float), wind_curve=np.asarray(wind_curve, dtype=float),
+                machine_rating=float(machine_rating), hub_height=float(hub_height),
+                turbine_cost=float(turbine_cost), bos_costs=float(bos_costs))
+
+def raster_tiles(shape, tile_shape):
+    '''(row slice, column slice) of every tile of a raster of the given shape'''
+
+    rows, cols = shape
+    return [(slice(i, min(i + tile_shape[0], rows)), slice(j, min(j + tile_shape[1], cols)))
+            for i in range(0, rows, tile_shape[0]) for j in range(0, cols, tile_shape[1])]
+
+def _open_input(value):
+    '''memory map a .npy input raster, or pass a constant through'''
+
+    if isinstance(value, str):
+        return np.load(value, mmap_mode='r')
+    return value
+
+def _read_tile(value, tile):
+
+    if np.ndim(value) == 2:
+        return np.asarray(value[tile], dtype=float)
+    return value
+
+def compute_tile(tile, inputs, designs, outputs, params):
+    '''
+    Evaluate one tile for all designs and write it into the output rasters
+
+    inputs and outputs hold file names (as passed to the worker processes) and are memory mapped here.
+    Cells where an input is not finite are left as NaN.
+    '''
+
+    wind_speed = _read_tile(_open_input(inputs['wind_speed_50m']), tile)
+    weibull_k = _read_tile(_open_input(inputs['weibull_k']), tile)
+    shear_exponent = _read_tile(_open_input(inputs['shear_exponent']), tile)
+
+    wind_speed, weibull_k, shear_exponent = np.broadcast_arrays(wind_speed, weibull_k, shear_exponent)
+    valid = np.isfinite(wind_speed) & np.isfinite(weibull_k) & np.isfinite(shear_exponent) & (wind_speed > 0)
+
+    aep = aep_calc_csm()
+    opex = opex_csm()
+    fin = fin_csm(**params['finance'])
+    results = dict((name, np.full((len(designs),) + valid.shape, np.nan, dtype=np.float32)) for name in RASTER_OUTPUTS)
+
+    if valid.any():
+        for d, design in enumerate(designs):
+            aep.compute(design['power_curve'], design['wind_curve'], design['hub_height'], shear_exponent[valid],
+                        wind_speed[valid], weibull_k[valid], design['machine_rating'], params['soiling_losses'],
+                        params['array_losses'], params['availability'], params['turbine_number'])
+            opex.compute(params['sea_depth'], params['year'], params['month'], params['turbine_number'],
+                         design['machine_rating'], aep.net_aep)
+            fin.compute(design['turbine_cost'], params['turbine_number'], design['bos_costs'], opex.avg_annual_opex,
+                        aep.net_aep, params['sea_depth'])
+
+            results['capacity_factor'][d][valid] = aep.net_aep / (8760. * design['machine_rating'] * params['turbine_number'])
+            results['net_aep'][d][valid] = aep.net_aep
+            results['lcoe'][d][valid] = fin.lcoe
+
+    for name in RASTER_OUTPUTS:
+        out = np.load(outputs[name], mmap_mode='r+')
+        out[(slice(None),) + tile] = results[name]
+        out.flush()
+        del out
+
+def _compute_tile_star(args):
+    return compute_tile(*args)
+
+def capacity_factor_raster(wind_speed_50m, weibull_k, designs, out_prefix, shear_exponent=0.143, tile_shape=(128, 128),
+                           processes=1, soiling_losses=0.0, array_losses=0.06, availability=0.94287630736,
+                           turbine_number=100, sea_depth=0.0, year=2009, month=12, finance=None):
+    '''
+    Capacity factor, net AEP and LCOE rasters for one or more turbine designs
+
+    Parameters
+    ----------
+    wind_speed_50m : str
+       .npy file of the mean annual wind speed at 50 m [m/s], shape (rows, columns)
+    weibull_k : str or float
+       .npy file of the weibull shape factor with the same shape, or one value for all cells
+    designs : list of dict
+       turbine designs from raster_design
+    out_prefix : str
+       the rasters are written to out_prefix + '_capacity_factor.npy' (net capacity factor per turbine),
+       '_net_aep.npy' (plant) and '_lcoe.npy' as float32 arrays of shape (designs, rows, columns)
+    shear_exponent : str or float
+       .npy file of the shear exponent, or one value for all cells
+    tile_shape : tuple
+       (rows, columns) of a tile; a tile needs about rows*columns*(bins+20)*8 bytes per process
+    processes : int
+       number of worker processes, 1 to work in this process
+    soiling_losses, array_losses, availability, turbine_number, sea_depth, year, month
+       plant parameters as in aep_calc_csm and opex_csm
+    finance : dict
+       keyword arguments of fin_csm
+
+    Returns
+    -------
+    outputs : dict
+      file name of each output raster
+    '''
+
+    inputs = dict(wind_speed_50m=wind_speed_50m, weibull_k=weibull_k, shear_exponent=shear_exponent)
+    shape = np.load(wind_speed_50m, mmap_mode='r').shape
+    if len(shape) != 2:
+        raise ValueError('wind speed raster must be 2-D, not %r' % (shape,))
+    for name in ('weibull_k', 'shear_exponent'):
+        if isinstance(inputs[name], str) and np.load(inputs[name], mmap_mode='r').shape != shape:
+            raise ValueError('%s raster does not match the wind speed raster shape %r' % (name, shape))
+
+    outputs = {}
+    for name in RASTER_OUTPUTS:
+        outputs[name] = '%s_%s.npy' % (out_prefix, name)
+        out = np.lib.format.open_memmap(outputs[name], mode='w+', dtype=np.float32, shape=(len(designs),) + shape)
+        del out
+
+    params = dict(soiling_losses=soiling_losses, array_losses=array_losses, availability=availability,
+                  turbine_number=turbine_number, sea_depth=sea_depth, year=year, month=month,
+                  finance={} if finance is None else dict(finance))
+    jobs = [(tile, inputs, designs, outputs, params) for tile in raster_tiles(shape, tile_shape)]
+
+    if processes == 1:
+        for job in jobs:
+            compute_tile(*job)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            for _ in pool.imap_unordered(_compute_tile_star, jobs):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+
+    return outputs
@@ -0,0 +1,152 @@
+"""
+csmWake.py
+
+Jensen / Park wake model for layout dependent array losses of a wind plant.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+from nrelcsm.csmAEP import weibull
+from nrelcsm.utilities import scipy_module
+
+def _overlap_fraction(r, Rw, c):
+    '''fraction of a rotor disc of radius r inside a wake of radius Rw >= r whose centre is c away'''
+
+    r, Rw, c = np.broadcast_arrays(r, Rw, c)
+    frac = np.zeros(c.shape)
+
+    inside = c <= Rw - r
+    frac[inside] = 1.0
+
+    part = np.logical_and(~inside, c < Rw + r)
+    r, Rw, c = r[part], Rw[part], c[part]
+    a1 = np.arccos(np.clip((c**2 + r**2 - Rw**2) / (2*c*r), -1.0, 1.0))
+    a2 = np.arccos(np.clip((c**2 + Rw**2 - r**2) / (2*c*Rw), -1.0, 1.0))
+    lens = r**2*a1 + Rw**2*a2 - 0.5*np.sqrt(np.maximum((-c+r+Rw)*(c+r-Rw)*(c-r+Rw)*(c+r+Rw), 0.0))
+    frac[part] = lens / (np.pi*r**2)
+
+    return frac
+
+class ParkWakeModel(object):
+    '''
+    Jensen / Park wake losses of a plant layout over a wind rose
+
+    Each upstream turbine casts a top-hat wake that expands linearly with the wake decay constant,
+    with velocity deficit (1 - sqrt(1 - Ct)) * (R / (R + k*s))**2 times the fraction of the downstream rotor
+    inside the wake.  Deficits of several wakes combine as the root of the sum of squares.  Only turbine pairs
+    closer than cutoff rotor diameters interact, so the pair list stays short for large plants.
+    '''
+
+    def __init__(self, x, y, rotor_diameter, directions, frequencies, thrust_coefficient=0.75, wake_decay=0.05, cutoff=20.0):
+        '''
+        Parameters
+        ----------
+        x, y : array (n,)
+           turbine positions [m], x to the east and y to the north
+        rotor_diameter : float
+           rotor diameter [m]
+        directions : array (d,)
+           wind rose directions the wind comes from [deg], clockwise from north
+        frequencies : array (d,)
+           probability of each direction, normalized to a sum of one
+        thrust_coefficient : float
+           rotor thrust coefficient below rated power
+        wake_decay : float
+           wake expansion per unit downstream distance, about 0.075 on land and 0.04 to 0.05 offshore
+        cutoff : float
+           largest turbine separation [rotor diameters] for which wakes are computed
+        '''
+
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.rotor_diameter = float(rotor_diameter)
+        self.directions = np.atleast_1d(np.asarray(directions, dtype=float))
+        frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        self.frequencies = frequencies / frequencies.sum()
+        self.thrust_coefficient = thrust_coefficient
+        self.wake_decay = wake_decay
+        self.cutoff = cutoff
+
+        # pairs (i downstream candidate, j upstream candidate) within the cutoff distance, found with a
+        # k-d tree so that no n x n distance matrix is built
+        pairs = scipy_module('spatial').cKDTree(np.column_stack([self.x, self.y])).query_pairs(cutoff * self.rotor_diameter, output_type='ndarray')
+        pairs = pairs[np.hypot(self.x[pairs[:, 0]] - self.x[pairs[:, 1]], self.y[pairs[:, 0]] - self.y[pairs[:, 1]]) > 0.0]
+        self.pairs_i = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        self.pairs_j = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        self._dx = self.x[self.pairs_i] - self.x[self.pairs_j]
+        self._dy = self.y[self.pairs_i] - self.y[self.pairs_j]
+
+        self.deficits = self.velocity_deficits()
+
+    @property
+    def turbine_number(self):
+        return self.x.size
+
+    def velocity_deficits(self):
+        '''
+        Combined fractional velocity deficit of every turbine for every wind rose direction
+
+        Returns
+        -------
+        deficits : array (d, n)
+          1 - waked speed / free stream speed
+        '''
+
+        theta = np.radians(self.directions)[:, np.newaxis]
+        # unit vector the wind blows towards
+        ux = -np.sin(theta)
+        uy = -np.cos(theta)
+
+        R = 0.5 * self.rotor_diameter
+        s = self._dx * ux + self._dy * uy              # downstream distance of i behind j
+        c = np.abs(self._dx * uy - self._dy * ux)       # crosswind offset of i from the wake centre line
+        s = np.maximum(s, 0.0)
+        Rw = R + self.wake_decay * s
+
+        deficit = (1.0 - np.sqrt(1.0 - self.thrust_coefficient)) * (R / Rw)**2 * _overlap_fraction(R, Rw, c)
+        deficit[s <= 0.0] = 0.0
+
+        n = self.turbine_number
+        rows = np.arange(self.directions.size)[:, np.newaxis] * n + self.pairs_i
+        sum_sq = np.bincount(rows.ravel(), weights=(deficit**2).ravel(), minlength=self.directions.size * n)
+        return np.sqrt(sum_sq).reshape(self.directions.size, n)
+
+    def losses(self, power_curve, wind_curve, weibull_k, weibull_scale, bin_weights=None):
+        '''
+        Wake losses of each turbine and of the plant for a power curve and the site weibull distribution
+
+        Parameters
+        ----------
+        power_curve : array
+           turbine power [kW] on wind_curve
+        wind_curve : array
+           free stream wind speeds [m/s] of the power curve
+        weibull_k : float
+           weibull shape factor at hub height
+        weibull_scale : float
+           weibull scale factor at hub height [m/s]
+        bin_weights : array
+           quadrature weights of wind_curve (see aero_csm.wind_weights), None for evenly spaced bins
+
+        Returns
+        -------
+        turbine_losses : array (n,)
+          fraction of the free stream energy each turbine loses to wakes
+        plant_loss : float
+          fraction of the free stream plant energy lost to wakes
+        '''
+
+        power_curve = np.asarray(power_curve, dtype=float)
+        wind_curve = np.asarray(wind_curve, dtype=float)
+        weights = weibull(wind_curve, weibull_k, weibull_scale)
+        if bin_weights is not None:
+            weights = weights * bin_weights
+
+        free = np.dot(weights, power_curve)
+        waked = np.interp(wind_curve * (1.0 - self.deficits[..., np.newaxis]), wind_curve, power_curve, left=0.0, right=0.0)
+        energy = np.dot(self.frequencies, np.dot(waked, weights))
+
+        self.turbine_losses = 1.0 - energy / free
+        self.plant_loss = 1.0 - energy.mean() / free
+        return self.turbine_losses, self.plant_loss
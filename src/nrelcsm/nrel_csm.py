@@ -5,11 +5,21 @@ Created by NWTC Systems Engineering Sub-Task on 2012-08-01.
 Copyright (c) NREL. All rights reserved.
 """
 
+import hashlib
 import numpy as np
 from math import pi, gamma, exp
-from nrelcsm.utilities import smooth_abs, smooth_min, hstack
+from nrelcsm.utilities import smooth_abs, smooth_min, LRUCache, DiagonalJacobian
+from nrelcsm.csmAEP import weibull, drivetrain_loss_polynomial, exact_turbine_energy, gauss_legendre_nodes, \
+                          open_wind_record, timeseries_energy
 from nrelcsm.config import *
 
+def _ppi_context(ppi_context):
+    """
+    escalation context for one component evaluation: the PPIContext bound to the component,
+    or else a snapshot of the global ppi object (its reference dates as set by the calling program)
+    """
+    return ppi.context() if ppi_context is None else ppi_context
+
 # NREL Cost and Scaling Model plant energy modules
 ##################################################
 
@@ -38,15 +48,101 @@ class aero_csm(object):
         self.rotor_torque = 0. # Float(iotype='out', units='N * m', desc = 'torque from rotor at rated power')
         self.power_curve = np.zeros(161) # Array(iotype='out', units='kW', desc='total power before drivetrain losses')
         self.wind_curve = np.zeros(161) # Array(iotype='out', units='m/s', desc='wind curve associated with power curve')
+        self.thrust_curve = None # Array(iotype='out', units='N', desc='rotor thrust on wind_curve, with load_curves=True')
+        self.torque_curve = None # Array(iotype='out', units='N * m', desc='rotor torque on wind_curve, with load_curves=True')
+
+    # rotor state of the last compute / compute_batch call, (N, 1) columns in compute_batch and scalars in compute
+    _ROTOR_STATE = ('hubHt', 'ratedPower', 'maxTipSpd', 'rotorDiam', 'maxCp', 'maxTipSpdRatio', 'cutInWS', 'cutOutWS',
+                    'ratedHubPower', 'omegaM', 'ratedRPM', 'ratedWindSpeed', 'kTorque', 'windOmegaT', 'pwrOmegaT',
+                    'omegaTflag', 'air_density', 'thrust_coefficient')
 
     def compute(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
                 cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density, max_efficiency,
-                thrust_coefficient):
+                thrust_coefficient, quadrature='bins', n_nodes=None, load_curves=False):
         """
         Executes Aerodynamics Sub-module of the NREL _cost and Scaling Model to create a power curve based on a limited set of inputs.
         It then modifies the ideal power curve to take into account drivetrain efficiency losses through an interface to a drivetrain efficiency model.
+
+        quadrature selects the wind speeds of the power curve: 'bins' gives n_nodes (default 161) evenly spaced
+        speeds from 0 to 40 m/s, 'gauss' gives about n_nodes (default 30) Gauss-Legendre nodes per power curve
+        region with their quadrature weights in wind_weights (None for 'bins').
+
+        With load_curves=True the rotor thrust and torque are also computed on wind_curve (see loadCurves).
+        The model itself is the one of compute_batch, evaluated for a single design.
         """
 
+        if quadrature not in ('bins', 'gauss'):
+            raise ValueError('unknown power curve quadrature %r' % (quadrature,))
+
+        self._operating_point(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in \
+                                (machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                                 cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
+                                 max_efficiency, thrust_coefficient)])
+
+        # set up for idealized power curve
+        if quadrature == 'bins':
+            n = 161 if n_nodes is None else n_nodes # number of wind speed bins
+            ws_inc = 40. / (n - 1)  # size of wind speed bins for integrating power curve, 0.25 for 161 bins
+            Wind = ws_inc * np.arange(n)
+            self.wind_weights = None
+        else:
+            breaks, coeffs = self.power_curve_segments()
+            Wind, self.wind_weights = gauss_legendre_nodes(breaks[0], 30 if n_nodes is None else n_nodes)
+
+        self._curves(Wind, load_curves)
+
+        # single design: scalar rotor state and outputs, 1-D curves
+        for name in self._ROTOR_STATE:
+            setattr(self, name, getattr(self, name)[0, 0].item())
+        self.rated_wind_speed = self.rated_wind_speed[0]
+        self.rated_rotor_speed = self.rated_rotor_speed[0]
+        self.rotor_torque = self.rotor_torque[0]
+        self.rotor_thrust = self.rotor_thrust[0]
+        self.power_curve = self.power_curve[0]
+        if load_curves:
+            self.thrust_curve, self.torque_curve = self.thrust_curve[0], self.torque_curve[0]
+
+    def compute_batch(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                      cut_in_wind_speed=3.0, cut_out_wind_speed=25.0, hub_height=90.0, altitude=0.0, air_density=0.0,
+                      max_efficiency=0.902, thrust_coefficient=0.5, load_curves=False):
+        """
+        Batched version of compute for N rotor designs evaluated at once.
+
+        machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient and opt_tsr are 1-D arrays
+        of length N (or scalars); the remaining inputs may be scalars or length N arrays.  The outputs
+        rated_wind_speed, rated_rotor_speed, rotor_thrust and rotor_torque are length N arrays,
+        power_curve is an (N, n_bins) array and wind_curve is the common (n_bins,) wind speed grid.
+        With load_curves=True thrust_curve and torque_curve are (N, n_bins) arrays as well.
+        """
+
+        inputs = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in \
+                     (machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                      cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
+                      max_efficiency, thrust_coefficient)])
+        if inputs[0].ndim != 1:
+            raise ValueError('aero_csm.compute_batch takes 1-D arrays of design inputs')
+
+        self._operating_point(*inputs)
+
+        # idealized power curve on the same wind speed bins as compute
+        n = 161 # number of wind speed bins
+        ws_inc = 0.25  # size of wind speed bins for integrating power curve
+        self.wind_weights = None
+        self._curves(ws_inc * np.arange(n), load_curves)
+
+    def _operating_point(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                         cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density, max_efficiency,
+                         thrust_coefficient):
+        """rotor state (_ROTOR_STATE) of the designs given by 1-D input arrays, stored as (N, 1) columns"""
+
+        # column vectors so that the per-design values broadcast against the wind speed bins
+        machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr, \
+            cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density, \
+            max_efficiency, thrust_coefficient = [x[:, np.newaxis] for x in \
+                np.broadcast_arrays(machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                                    cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
+                                    max_efficiency, thrust_coefficient)]
+
         # initialize input parameters
         self.hubHt      = hub_height
         self.ratedPower = machine_rating
@@ -54,21 +150,20 @@ class aero_csm(object):
         self.rotorDiam  = rotor_diameter
         self.maxCp      = max_power_coefficient
         self.maxTipSpdRatio = opt_tsr
-        self.cutInWS    =  cut_in_wind_speed
+        self.cutInWS    = cut_in_wind_speed
         self.cutOutWS   = cut_out_wind_speed
+        self.thrust_coefficient = thrust_coefficient
 
-        if air_density == 0.0:
-            # Compute air density
-            ssl_pa     = 101300  # std sea-level pressure in Pa
-            gas_const  = 287.15  # gas constant for air in J/kg/K
-            gravity    = 9.80665 # standard gravity in m/sec/sec
-            lapse_rate = 0.0065  # temp lapse rate in K/m
-            ssl_temp   = 288.15  # std sea-level temp in K
+        # Compute air density where it is not given
+        ssl_pa     = 101300  # std sea-level pressure in Pa
+        gas_const  = 287.15  # gas constant for air in J/kg/K
+        gravity    = 9.80665 # standard gravity in m/sec/sec
+        lapse_rate = 0.0065  # temp lapse rate in K/m
+        ssl_temp   = 288.15  # std sea-level temp in K
 
-            air_density = (ssl_pa * (1-((lapse_rate*(altitude + self.hubHt))/ssl_temp))**(gravity/(lapse_rate*gas_const))) / \
-              (gas_const*(ssl_temp-lapse_rate*(altitude + self.hubHt)))
-        else:
-        		air_density = air_density
+        self.air_density = np.where(air_density == 0.0,
+            (ssl_pa * (1-((lapse_rate*(altitude + self.hubHt))/ssl_temp))**(gravity/(lapse_rate*gas_const))) / \
+              (gas_const*(ssl_temp-lapse_rate*(altitude + self.hubHt))), air_density)
 
         # determine power curve inputs
         self.reg2pt5slope  = 0.05
@@ -84,110 +179,155 @@ class aero_csm(object):
         self.ratedRPM = (30./pi) * self.omegaM
 
         # compute variable-speed torque constant k
-        kTorque = (air_density*pi*self.rotorDiam**5*self.maxCp)/(64*self.maxTipSpdRatio**3) # k
+        kTorque = (self.air_density*pi*self.rotorDiam**5*self.maxCp)/(64*self.maxTipSpdRatio**3) # k
 
         b = -Tm/(self.omegaM-omega0)                       # b - quadratic formula values to determine omegaT
         c = (Tm*omega0)/(self.omegaM-omega0)               # c
 
-        # omegaT is rotor speed at which regions 2 and 2.5 intersect
-        # add check for feasibility of omegaT calculation 09/20/2012
-        omegaTflag = True
-        if (b**2-4*kTorque*c) > 0:
-           omegaT = -(b/(2*kTorque))-(np.sqrt(b**2-4*kTorque*c)/(2*kTorque))  # Omega T
-
-           windOmegaT = (omegaT*self.rotorDiam)/(2*self.maxTipSpdRatio) # Wind  at omegaT (M25)
-           pwrOmegaT  = kTorque*omegaT**3/1000                                # Power at ometaT (M26)
-
-        else:
-           omegaTflag = False
-           windOmegaT = self.ratedRPM
-           pwrOmegaT = self.ratedPower
+        # omegaT is rotor speed at which regions 2 and 2.5 intersect, where the quadratic has real roots
+        # (feasibility check added 09/20/2012)
+        disc = b**2-4*kTorque*c
+        omegaTflag = disc > 0
+        omegaT = -(b/(2*kTorque))-(np.sqrt(np.where(omegaTflag, disc, 0.0))/(2*kTorque))  # Omega T
+        windOmegaT = np.where(omegaTflag, (omegaT*self.rotorDiam)/(2*self.maxTipSpdRatio), self.ratedRPM) # Wind at omegaT (M25)
+        pwrOmegaT  = np.where(omegaTflag, kTorque*omegaT**3/1000, self.ratedPower)                       # Power at ometaT (M26)
 
         # compute rated wind speed
-        d = air_density*np.pi*self.rotorDiam**2.*0.25*self.maxCp
+        d = self.air_density*np.pi*self.rotorDiam**2.*0.25*self.maxCp
         self.ratedWindSpeed = \
            0.33*( (2.*self.ratedHubPower*1000.      / (    d))**(1./3.) ) + \
            0.67*( (((self.ratedHubPower-pwrOmegaT)*1000.) / (1.5*d*windOmegaT**2.))  + windOmegaT )
 
-        # set up for idealized power curve
-        n = 161 # number of wind speed bins
-        itp = [None] * n
-        ws_inc = 0.25  # size of wind speed bins for integrating power curve
-        Wind = []
-        Wval = 0.0
-        Wind.append(Wval)
-        for i in range(1,n):
-           Wval += ws_inc
-           Wind.append(Wval)
+        self.kTorque, self.windOmegaT, self.pwrOmegaT, self.omegaTflag = kTorque, windOmegaT, pwrOmegaT, omegaTflag
+
+    def _curves(self, Wind, load_curves):
+        """power curve and rated outputs of the rotor state from _operating_point on the wind speeds in Wind"""
 
         # determine idealized power curve
-        self.idealPowerCurve(Wind, itp, kTorque, windOmegaT, pwrOmegaT, n , omegaTflag)
+        itp = self.idealPowerCurve(Wind, self.kTorque, self.windOmegaT, self.pwrOmegaT, self.omegaTflag)
 
-        # add a fix for rated wind speed calculation inaccuracies kld 9/21/2012
-        ratedWSflag = False
         # determine power curve after losses
-        mtp = [None] * n
-        for i in range(0,n):
-           mtp[i] = itp[i] #* self.drivetrain.getdrivetrain_efficiency(itp[i],self.ratedHubPower)
-           #print [Wind[i],itp[i],self.drivetrain.getdrivetrain_efficiency(itp[i],self.ratedHubPower),mtp[i]] # for testing
-           if (mtp[i] > self.ratedPower):
-              if not ratedWSflag:
-                ratedWSflag = True
-              mtp[i] = self.ratedPower
-
-        self.rated_wind_speed = self.ratedWindSpeed
-        self.rated_rotor_speed = self.ratedRPM
-        self.power_curve = np.array(mtp)
+        mtp = np.minimum(itp, self.ratedPower) #* self.drivetrain.getdrivetrain_efficiency(itp,self.ratedHubPower)
+
+        self.rated_wind_speed = self.ratedWindSpeed[:, 0]
+        self.rated_rotor_speed = self.ratedRPM[:, 0]
+        self.power_curve = mtp
         self.wind_curve = Wind
 
         # compute turbine load outputs
-        self.rotor_torque = self.ratedHubPower/(self.ratedRPM*(pi/30.))*1000.
-        self.rotor_thrust  = air_density * thrust_coefficient * pi * rotor_diameter**2 * (self.ratedWindSpeed**2) / 8.
+        self.rotor_torque = (self.ratedHubPower/(self.ratedRPM*(pi/30.))*1000.)[:, 0]
+        self.rotor_thrust  = (self.air_density * self.thrust_coefficient * pi * self.rotorDiam**2 * (self.ratedWindSpeed**2) / 8.)[:, 0]
+        if load_curves:
+            self.thrust_curve, self.torque_curve = self.loadCurves(Wind, itp, self.windOmegaT, self.omegaTflag,
+                                                                   self.air_density, self.thrust_coefficient)
+        else:
+            self.thrust_curve = self.torque_curve = None
+
+    def power_curve_segments(self):
+        """
+        Piecewise polynomial form of the power curve from the last compute (or compute_batch) call
 
-    def idealPowerCurve( self, Wind, ITP, kTorque, windOmegaT, pwrOmegaT, n , omegaTflag):
+        The segments are region 2 (cubic), region 2.5 (linear) and rated power (constant); a region that
+        does not occur for a design has zero width.  Power is zero outside of [cut-in, cut-out].
+
+        Returns
+        -------
+        breaks : array (..., 4)
+          segment boundaries [m/s]: cut-in, start of region 2.5, rated, cut-out
+        coeffs : array (..., 3, 4)
+          power [kW] of each segment as polynomial coefficients in ascending powers of wind speed
+        """
+
+        params = [self.cutInWS, self.cutOutWS, self.ratedPower, self.ratedHubPower, self.ratedWindSpeed, \
+                  self.maxTipSpdRatio, self.rotorDiam, self.kTorque, self.windOmegaT, self.pwrOmegaT, self.omegaTflag]
+        if np.ndim(self.ratedPower) == 2: # compute_batch stores (N, 1) columns
+            params = [np.asarray(x).reshape(-1) for x in np.broadcast_arrays(*params)]
+        cutIn, cutOut, ratedPower, ratedHubPower, ratedWindSpeed, tsr, diam, kTorque, windOmegaT, pwrOmegaT, \
+            omegaTflag = [np.asarray(x, dtype=float) for x in params]
+
+        kCubic = kTorque * (tsr/(diam/2.0))**3 / 1000.0 # region 2 power = kCubic * V**3
+        windCubicRated = (ratedPower / kCubic)**(1./3.)
+
+        # region 2.5 only exists if region 2 has not reached rated power at omegaT
+        reg2pt5 = np.logical_and(omegaTflag, windOmegaT < windCubicRated)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (ratedHubPower-pwrOmegaT)/(ratedWindSpeed-windOmegaT)
+            windRated = np.where(slope > 0, windOmegaT + (ratedPower-pwrOmegaT)/slope, np.inf)
+        slope = np.where(reg2pt5, slope, 0.0)
+        windReg2pt5 = np.clip(np.where(reg2pt5, windOmegaT, windCubicRated), cutIn, cutOut)
+        windRated = np.clip(np.where(reg2pt5, windRated, windReg2pt5), windReg2pt5, cutOut)
+
+        breaks = np.stack(np.broadcast_arrays(cutIn, windReg2pt5, windRated, cutOut), axis=-1)
+        coeffs = np.zeros(breaks.shape[:-1] + (3, 4))
+        coeffs[..., 0, 3] = kCubic
+        coeffs[..., 1, 0] = np.where(reg2pt5, pwrOmegaT - slope*windOmegaT, 0.0)
+        coeffs[..., 1, 1] = slope
+        coeffs[..., 2, 0] = ratedPower
+
+        return breaks, coeffs
+
+    def loadCurves(self, Wind, ITP, windOmegaT, omegaTflag, air_density, thrust_coefficient):
         """
-        Determine the ITP (idealized turbine power) array
+        Rotor thrust and torque at the wind speeds in Wind, from the same region parameters as the power curve
+
+        The rotor follows the CSM torque schedule: optimum tip speed ratio in region 2 (limited to omegaM), the linear
+        torque-speed line from omega0 to omegaM in region 2.5 and omegaM at rated hub power.  Torque is the hub power
+        (ideal power limited to rated hub power) over rotor speed, so it reaches rotor_torque at rated.  Thrust uses
+        thrust_coefficient up to rated wind speed, where it equals rotor_thrust, and falls off as 1/V above rated
+        (thrust coefficient scaling like the power coefficient).  Both are zero outside of cut-in / cut-out.
+
+        Returns
+        -------
+        thrust : array
+          rotor thrust [N]
+        torque : array
+          rotor torque [N*m]
         """
 
-        idealPwr = 0.0
+        Wind = np.asarray(Wind, dtype=float)
+        R = self.rotorDiam/2.0
+        hubPwr = np.minimum(ITP, self.ratedHubPower)
 
-        for i in range(0,n):
-            if (Wind[i] >= self.cutOutWS ) or (Wind[i] <= self.cutInWS):
-                idealPwr = 0.0  # cut out
-            else:
-                if omegaTflag:
-                    if ( Wind[i] > windOmegaT ):
-                       idealPwr = (self.ratedHubPower-pwrOmegaT)/(self.ratedWindSpeed-windOmegaT) * (Wind[i]-windOmegaT) + pwrOmegaT # region 2.5
-                    else:
-                       idealPwr = kTorque * (Wind[i]*self.maxTipSpdRatio/(self.rotorDiam/2.0))**3 / 1000.0 # region 2
-                else:
-                    idealPwr = kTorque * (Wind[i]*self.maxTipSpdRatio/(self.rotorDiam/2.0))**3 / 1000.0 # region 2
+        # rotor speed [rad/s]
+        omega0 = self.omegaM/(1+self.reg2pt5slope)
+        Tm = self.ratedHubPower*1000/self.omegaM
+        omega = np.minimum(Wind*self.maxTipSpdRatio/R, self.omegaM) # region 2
+        omega2pt5 = 0.5*(omega0 + np.sqrt(omega0**2 + 4.*hubPwr*1000.*(self.omegaM-omega0)/Tm)) # region 2.5, T*omega = P
+        omega = np.where(np.logical_and(omegaTflag, Wind > windOmegaT), omega2pt5, omega)
+        omega = np.where(hubPwr >= self.ratedHubPower, self.omegaM, omega)
 
-            ITP[i] = idealPwr
-            #print [Wind[i],ITP[i]]
+        operating = np.logical_and(Wind > self.cutInWS, Wind < self.cutOutWS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            torque = np.where(operating, hubPwr*1000./omega, 0.0)
+            thrust = air_density * thrust_coefficient * pi * self.rotorDiam**2 * np.minimum(Wind, self.ratedWindSpeed)**2 / 8. * \
+                     np.where(Wind > self.ratedWindSpeed, self.ratedWindSpeed/Wind, 1.0)
+        thrust = np.where(operating, thrust, 0.0)
 
-        return
+        return thrust, torque
 
-def weibull(X,K,L):
-    '''
-    Return Weibull probability at speed X for distribution with k=K, c=L
+    def idealPowerCurve(self, Wind, kTorque, windOmegaT, pwrOmegaT, omegaTflag):
+        """
+        Determine the ITP (idealized turbine power) array for the wind speeds in Wind
 
-    Parameters
-    ----------
-    X : float
-       wind speed of interest [m/s]
-    K : float
-       Weibull shape factor for site
-    L : float
-       Weibull scale factor for site [m/s]
+        The rotor parameters may be (N, 1) columns (as set by compute_batch), in which case
+        the result is an (N, len(Wind)) array.
 
-    Returns
-    -------
-    w : float
-      Weibull pdf value
-    '''
-    w = (K/L) * ((X/L)**(K-1)) * exp(-((X/L)**K))
-    return w
+        Returns
+        -------
+        ITP : array
+          idealized power [kW] at each wind speed, zero outside of the cut-in / cut-out band
+        """
+
+        Wind = np.asarray(Wind, dtype=float)
+
+        idealPwr = kTorque * (Wind*self.maxTipSpdRatio/(self.rotorDiam/2.0))**3 / 1000.0 # region 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reg2pt5Pwr = (self.ratedHubPower-pwrOmegaT)/(self.ratedWindSpeed-windOmegaT) * \
+                         (Wind-windOmegaT) + pwrOmegaT # region 2.5
+        idealPwr = np.where(np.logical_and(omegaTflag, Wind > windOmegaT), reg2pt5Pwr, idealPwr)
+        idealPwr[np.broadcast_to((Wind >= self.cutOutWS) | (Wind <= self.cutInWS), idealPwr.shape)] = 0.0  # cut out
+
+        return idealPwr
 
 class aep_calc_csm(object):
 
@@ -213,31 +353,235 @@ class aep_calc_csm(object):
         net_aep = 0. # Float(units= 'kW * h', iotype='out', desc='Annual energy production in kWh')  # use PhysicalUnits to set units='kWh'
         power_array = 0. # Array(iotype='out', units='kW', desc='total power after drivetrain losses')
         capacity_factor = 0. # Float(iotype='out', desc='plant capacity factor')
+        self.integration_error = 0. # Float(units= 'kW * h', iotype='out', desc='estimated error of net_aep from the wind speed discretization')
+        self.turbine_array_losses = np.zeros(0) # Array(iotype='out', desc='wake losses of each turbine when a wake model is given, else empty')
+        self.sector_aep = np.zeros(0) # Array(units= 'kW * h', iotype='out', desc='net AEP of each wind rose entry when a wind rose is given, else empty')
 
     def compute(self, power_curve, wind_curve, hub_height, shear_exponent,
                 wind_speed_50m, weibull_k, machine_rating, soiling_losses,
-                array_losses, availability, turbine_number):
+                array_losses, availability, turbine_number, wind_weights=None, wake_model=None, wind_rose=None):
         """
         Executes AEP Sub-module of the NREL _cost and Scaling Model by convolving a wind turbine power curve with a weibull distribution.
         It then discounts the resulting AEP for availability, plant and soiling losses.
+
+        hub_height, shear_exponent, wind_speed_50m and weibull_k may be arrays describing many sites,
+        in which case gross_aep, net_aep and capacity_factor are arrays of their broadcast shape.
+
+        Without wind_weights the wind_curve must be evenly spaced bins; otherwise wind_weights are the (2, n) quadrature
+        weights from aero_csm (main rule and half order rule).  integration_error is the difference between the
+        result of the main rule and that of the coarser rule (every other bin for evenly spaced bins).
+
+        With a wake_model (csmWake.ParkWakeModel of the plant layout, one site only) the array losses come from the
+        wake model instead of array_losses; the per-turbine losses are in turbine_array_losses.
+
+        A wind_rose (frequency, weibull scale at 50 m, weibull k) replaces wind_speed_50m and weibull_k; the three
+        arrays broadcast to the shape of the rose, e.g. (sectors,) or (months, sectors).  All entries are evaluated
+        at once and sector_aep holds the net AEP contributed by each entry, which sum to net_aep.  Without a wake_model
+        or wind_rose, turbine_array_losses or sector_aep are empty.
         """
 
         power_array = np.array([wind_curve, power_curve])
 
-        hubHeightWindSpeed = ((hub_height/50)**shear_exponent)*wind_speed_50m
-        K = weibull_k
-        L = hubHeightWindSpeed / exp(np.log(gamma(1.+1./K)))
+        if wind_rose is None:
+            K, L = self.weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k)
+        else:
+            frequency, K, L = self.wind_rose_parameters(hub_height, shear_exponent, wind_rose)
+
+        if wake_model is not None:
+            if K.ndim > 0:
+                raise ValueError('wake losses need a single weibull distribution (one site, no wind rose)')
+            if wake_model.turbine_number != turbine_number:
+                raise ValueError('wake model layout has %d turbines but turbine_number is %d' % \
+                                 (wake_model.turbine_number, turbine_number))
+            self.turbine_array_losses, array_losses = wake_model.losses(power_array[1], power_array[0], K, L, \
+                                                          None if wind_weights is None else wind_weights[0])
+        else:
+            self.turbine_array_losses = np.zeros(0)
+        self.array_losses = array_losses
+
+        # weibull weights of every site (rows) at every wind speed bin (columns)
+        weights = weibull(power_array[0], K[..., np.newaxis], L[..., np.newaxis])
+        if wind_weights is None:
+            ws_inc = power_array[0,1] - power_array[0,0]
+            turbine_energy = np.dot(weights, power_array[1]) * ws_inc
+            coarse_energy = np.dot(weights[..., ::2], power_array[1, ::2]) * 2.0 * ws_inc
+        else:
+            turbine_energy, coarse_energy = np.rollaxis(np.dot(weights * power_array[1], np.transpose(wind_weights)), -1)
+        if wind_rose is not None:
+            self.sector_aep = frequency * turbine_energy * 8760.0 * turbine_number * \
+                              (1.0-soiling_losses)* (1.0-array_losses) * availability
+            turbine_energy = np.sum(frequency * turbine_energy)
+            coarse_energy = np.sum(frequency * coarse_energy)
+        else:
+            self.sector_aep = np.zeros(0)
+        if turbine_energy.ndim == 0:
+            turbine_energy = float(turbine_energy)
+
+        self.gross_aep = turbine_energy * 8760.0 * turbine_number
+        self.net_aep = self.gross_aep * (1.0-soiling_losses)* (1.0-array_losses) * availability
+        self.capacity_factor = self.net_aep / (8760 * machine_rating)
+        self.integration_error = np.abs(turbine_energy - coarse_energy) * 8760.0 * turbine_number * \
+                                 (1.0-soiling_losses)* (1.0-array_losses) * availability
+
+    def compute_exact(self, breaks, coeffs, hub_height, shear_exponent,
+                      wind_speed_50m, weibull_k, machine_rating, soiling_losses,
+                      array_losses, availability, turbine_number, wind_rose=None):
+        """
+        AEP from the exact integral of a piecewise polynomial power curve against the weibull distribution.
 
-        turbine_energy = 0.0
-        for i in range(0,power_array.shape[1]):
-           X = power_array[0,i]
-           result = power_array[1,i] * weibull(X, K, L)
-           turbine_energy += result
+        breaks and coeffs describe the power curve after drivetrain losses as returned by aero_csm.power_curve_segments
+        (and drivetrain_loss_polynomial); the integral uses regularized incomplete gamma functions so there is
+        no wind speed discretization.  The site inputs and wind_rose may be arrays as in compute.
+        """
 
-        ws_inc = power_array[0,1] - power_array[0,0]
-        self.gross_aep = turbine_energy * 8760.0 * turbine_number * ws_inc
+        if wind_rose is None:
+            K, L = self.weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k)
+        else:
+            frequency, K, L = self.wind_rose_parameters(hub_height, shear_exponent, wind_rose)
+
+        turbine_energy = exact_turbine_energy(breaks, coeffs, K, L)
+        if wind_rose is not None:
+            self.sector_aep = frequency * turbine_energy * 8760.0 * turbine_number * \
+                              (1.0-soiling_losses)* (1.0-array_losses) * availability
+            turbine_energy = np.sum(frequency * turbine_energy)
+        else:
+            self.sector_aep = np.zeros(0)
+        if turbine_energy.ndim == 0:
+            turbine_energy = float(turbine_energy)
+
+        self.gross_aep = turbine_energy * 8760.0 * turbine_number
         self.net_aep = self.gross_aep * (1.0-soiling_losses)* (1.0-array_losses) * availability
         self.capacity_factor = self.net_aep / (8760 * machine_rating)
+        self.integration_error = 0.0
+        self.array_losses = array_losses
+
+    def load_summary(self, wind_curve, load_curves, hub_height, shear_exponent, wind_speed_50m, weibull_k,
+                     wind_weights=None, wohler_exponent=4.0):
+        """
+        Probability weighted summary of load curves (e.g. aero_csm thrust_curve and torque_curve) over the weibull distribution.
+
+        load_curves is a dict of name: array on wind_curve (rows of a 2-D array are separate designs).  wind_weights are the
+        aero_csm quadrature weights, None for evenly spaced bins.  The loads are zero outside of wind_curve, so the
+        statistics are over all of the time, including when the turbine is not operating.
+
+        Returns
+        -------
+        summary : dict
+          for each load a dict of 'mean', 'rms', 'max' (over wind speeds with non-zero probability) and 'equivalent',
+          the (sum p * load**m)**(1/m) load with m = wohler_exponent
+        """
+
+        wind_curve = np.asarray(wind_curve, dtype=float)
+        K, L = self.weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k)
+        if K.ndim > 0:
+            raise ValueError('load summary is computed for one site at a time')
+
+        prob = weibull(wind_curve, K, L)
+        if wind_weights is None:
+            prob = prob * (wind_curve[1] - wind_curve[0])
+        else:
+            prob = prob * wind_weights[0]
+
+        summary = {}
+        for name, curve in load_curves.items():
+            curve = np.abs(np.asarray(curve, dtype=float))
+            summary[name] = {'mean': np.dot(curve, prob),
+                             'rms': np.sqrt(np.dot(curve**2, prob)),
+                             'max': np.max(np.where(prob > 0, curve, 0.0), axis=-1),
+                             'equivalent': np.dot(curve**wohler_exponent, prob)**(1./wohler_exponent)}
+        return summary
+
+    @staticmethod
+    def weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k):
+        """weibull shape and scale factors at hub height, broadcast against each other"""
+
+        hubHeightWindSpeed = ((np.asarray(hub_height, dtype=float)/50)**shear_exponent)*wind_speed_50m
+        K = np.asarray(weibull_k, dtype=float)
+        L = hubHeightWindSpeed / np.exp(np.log(np.vectorize(gamma, otypes=[float])(1.+1./K)))
+
+        return np.broadcast_arrays(K, L)
+
+    @staticmethod
+    def wind_rose_parameters(hub_height, shear_exponent, wind_rose):
+        """normalized frequencies and weibull shape and scale factors at hub height of the wind_rose entries"""
+
+        frequency, scale, K = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in wind_rose])
+        L = ((hub_height/50.)**shear_exponent) * scale
+
+        return frequency / frequency.sum(), K, L
+
+class aep_timeseries_csm(object):
+
+    def __init__(self):
+
+        # Variables
+        # power_curve = Array(iotype='in', units='kW', desc='total power after drivetrain losses')
+        # wind_curve = Array(iotype='in', units='m/s', desc='wind curve associated with power curve')
+        # wind_record = Str(iotype='in', desc='.npy or raw binary file of measured wind speeds, or an array')
+        # measurement_height = Float(50.0, iotype='in', units = 'm', desc='height of the wind speed measurements')
+        # time_step = Float(1.0, iotype='in', units = 'h', desc='time between records, 1/6 for 10-minute data')
+
+        # Outputs
+        self.gross_aep = 0. # Float(iotype='out', desc='Gross Annual Energy Production before availability and loss impacts', unit='kWh')
+        self.net_aep = 0. # Float(units= 'kW * h', iotype='out', desc='Annual energy production in kWh')
+        self.capacity_factor = 0. # Float(iotype='out', desc='plant capacity factor')
+        self.record_energy = 0. # Float(units= 'kW * h', iotype='out', desc='net plant energy over the whole record')
+        self.record_hours = 0. # Float(units= 'h', iotype='out', desc='duration of the valid samples in the record')
+        self.wind_histogram = np.zeros(161) # Array(iotype='out', units='h', desc='hours at hub height in bins centred on wind_curve')
+        self.outside_hours = 0. # Float(units= 'h', iotype='out', desc='valid hours with hub height wind speeds outside of wind_curve')
+
+    def compute(self, power_curve, wind_curve, wind_record, hub_height, shear_exponent,
+                machine_rating, soiling_losses, array_losses, availability, turbine_number,
+                measurement_height=50.0, time_step=1.0, dtype='<f4', chunk_size=2**20):
+        """
+        AEP from a measured wind speed time series instead of a weibull distribution.
+
+        The record is memory mapped (see csmAEP.open_wind_record) and streamed in chunks of chunk_size samples,
+        so it is never loaded into memory as a whole.  Wind speeds are corrected from measurement_height to hub_height
+        with shear_exponent and interpolated on the power curve; missing samples (NaN) are skipped.  AEP is the mean
+        plant power over the valid samples times 8760 hours.  Samples outside of wind_curve produce no power and
+        are reported in outside_hours rather than in wind_histogram.
+        """
+
+        if isinstance(wind_record, str):
+            wind_record = open_wind_record(wind_record, dtype)
+
+        shear = (hub_height/measurement_height)**shear_exponent
+        power_sum, n_valid, histogram, n_outside = timeseries_energy(wind_record, wind_curve, power_curve, shear, chunk_size)
+        if n_valid == 0:
+            raise ValueError('wind record has no valid samples')
+
+        losses = (1.0-soiling_losses)* (1.0-array_losses) * availability
+        self.gross_aep = power_sum / n_valid * 8760.0 * turbine_number
+        self.net_aep = self.gross_aep * losses
+        self.capacity_factor = self.net_aep / (8760 * machine_rating)
+        self.record_hours = n_valid * time_step
+        self.record_energy = power_sum * time_step * turbine_number * losses
+        self.wind_histogram = histogram * time_step
+        self.outside_hours = n_outside * time_step
+
+DRIVETRAIN_TYPES = ('geared', 'single_stage', 'multi_drive', 'pm_direct_drive')
+
+# constant, linear and quadratic coefficients of the drivetrain loss model, one row per DRIVETRAIN_TYPES entry
+DRIVETRAIN_LOSSES = np.array([[0.01289, 0.08510, 0.0    ],
+                              [0.01331, 0.03655, 0.06107],
+                              [0.01547, 0.04463, 0.05790],
+                              [0.01007, 0.02000, 0.06899]])
+
+def drivetrain_type_index(drivetrain_type):
+    """
+    row of a drivetrain type in DRIVETRAIN_TYPES, or an index array for a sequence of types or 'all'.
+    'multi-drive' (as used by nacelle_csm) and 'multi_drive' are the same type.
+    """
+
+    if isinstance(drivetrain_type, str):
+        if drivetrain_type == 'all':
+            return np.arange(len(DRIVETRAIN_TYPES))
+        try:
+            return DRIVETRAIN_TYPES.index(drivetrain_type.replace('-', '_'))
+        except ValueError:
+            raise ValueError('unknown drivetrain type %r, expected one of %s' % (drivetrain_type, ', '.join(DRIVETRAIN_TYPES)))
+    return np.array([drivetrain_type_index(t) for t in drivetrain_type], dtype=int)
 
 class drivetrain_csm(object):
     """drivetrain losses from NREL cost and scaling model"""
@@ -247,30 +591,53 @@ class drivetrain_csm(object):
         self.drivetrain_type = drivetrain_type
 
         power = np.zeros(161) # Array(iotype='out', units='kW', desc='total power after drivetrain losses')
+        self.power_types = None # Array(iotype='out', units='kW', desc='power after drivetrain losses, one row per type of compute_types')
 
-    def compute(self, aero_power, aero_torque, aero_thrust, rated_power):
+    def loss_coefficients(self):
+        """constant, linear and quadratic coefficients of the drivetrain loss model for drivetrain_type"""
 
+        constant, linear, quadratic = DRIVETRAIN_LOSSES[drivetrain_type_index(self.drivetrain_type)]
 
-        if self.drivetrain_type == 'geared':
-            constant = 0.01289
-            linear = 0.08510
-            quadratic = 0.0
+        return constant, linear, quadratic
 
-        elif self.drivetrain_type == 'single_stage':
-            constant = 0.01331
-            linear = 0.03655
-            quadratic = 0.06107
+    def compute_types(self, aero_power, rated_power, drivetrain_types='all'):
+        """
+        power after drivetrain losses for several drivetrain types in one pass
+
+        Parameters
+        ----------
+        aero_power : array
+           power curve(s) before drivetrain losses [kW], e.g. aero_csm.power_curve
+        rated_power : float or array
+           machine rating [kW], broadcast against aero_power
+        drivetrain_types : str or sequence of str
+           drivetrain types from DRIVETRAIN_TYPES, or 'all'
+
+        Returns
+        -------
+        power_types : array (types, ...)
+          power after drivetrain losses [kW], one aero_power shaped slice per drivetrain type
+        """
+
+        index = np.atleast_1d(drivetrain_type_index(drivetrain_types))
+        self.drivetrain_types = tuple(DRIVETRAIN_TYPES[i] for i in index)
+
+        aero_power = np.asarray(aero_power, dtype=float)
+        Pbar0 = aero_power / rated_power
+        Pbar1, _ = smooth_abs(Pbar0, dx=0.01)
+        Pbar, _, _ = smooth_min(Pbar1, 1.0, pct_offset=0.01)
 
-        elif self.drivetrain_type == 'multi_drive':
-            constant = 0.01547
-            linear = 0.04463
-            quadratic = 0.05790
+        # (types, 1, ...) coefficients broadcast against the type independent normalized power
+        coeffs = DRIVETRAIN_LOSSES[index].T.reshape((3, index.size) + (1,)*Pbar.ndim)
+        constant, linear, quadratic = coeffs
+        eff = 1.0 - (constant/Pbar + linear + quadratic*Pbar)
+
+        self.power_types = aero_power * eff
+        return self.power_types
 
-        elif self.drivetrain_type == 'pm_direct_drive':
-            constant = 0.01007
-            linear = 0.02000
-            quadratic = 0.06899
+    def compute(self, aero_power, aero_torque, aero_thrust, rated_power):
 
+        constant, linear, quadratic = self.loss_coefficients()
 
         Pbar0 = aero_power / rated_power
 
@@ -285,45 +652,196 @@ class drivetrain_csm(object):
 
         self.power = aero_power * eff
 
-    def provideJ(self):
-
-        # gradients
+        # gradients, kept for provideJ
         dPbar_dPa = dPbar_dPbar1*dPbar1_dPbar0/rated_power
         dPbar_dPr = -dPbar_dPbar1*dPbar1_dPbar0*aero_power/rated_power**2
 
         deff_dPa = dPbar_dPa*(constant/Pbar**2 - quadratic)
         deff_dPr = dPbar_dPr*(constant/Pbar**2 - quadratic)
 
-        dP_dPa = eff + aero_power*deff_dPa
-        dP_dPr = aero_power*deff_dPr
+        self.dP_dPa = eff + aero_power*deff_dPa
+        self.dP_dPr = aero_power*deff_dPr
 
-        self.J = hstack([np.diag(dP_dPa), dP_dPr])
+    def provideJ(self, dense=False):
+        """
+        Jacobian of power with respect to aero_power and rated_power.  power depends on each aero_power bin only
+        through its own bin, so the Jacobian is returned as a DiagonalJacobian holding the diagonal and the
+        rated_power column (with a leading batch axis for batched power curves); dense=True returns the
+        (bins x bins+1) matrix instead.
+        """
 
+        self.J = DiagonalJacobian(self.dP_dPa, np.asarray(self.dP_dPr)[..., np.newaxis])
 
+        if dense:
+            return self.J.toarray()
         return self.J
 
 
 class aep_csm(object):
 
-    def __init__(self, drivetrain_type='geared'):
+    """
+    Power curve, drivetrain losses and AEP.
+
+    The power curve stage (aero_csm and drivetrain_csm) depends only on the aerodynamic inputs, so its results are
+    cached per (aero inputs, quadrature, drivetrain type) in power_curve_cache, which holds up to cache_size power
+    curves; cost and loss sweeps with fixed aero inputs then only rerun the weibull and loss stages.
+    power_curve_cache.info() gives the hit and miss counts, cache_size=0 disables the cache.
+    """
+
+    def __init__(self, drivetrain_type='geared', cache_size=32):
         self.aero = aero_csm()
         self.drivetrain = drivetrain_csm(drivetrain_type)
         self.aep = aep_calc_csm()
+        self.power_curve_cache = LRUCache(cache_size)
+
+    def power_curve(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                    cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
+                    max_efficiency, thrust_coefficient, quadrature='bins', n_nodes=None):
+        """
+        run (or restore from power_curve_cache) aero_csm.compute and drivetrain_csm.compute for the aero inputs;
+        afterwards self.aero and self.drivetrain hold the outputs as if they had just been computed.
+        The cached arrays are shared with self.aero and self.drivetrain and must not be modified in place.
+        """
+
+        key = (machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr, cut_in_wind_speed,
+               cut_out_wind_speed, hub_height, altitude, air_density, max_efficiency, thrust_coefficient,
+               quadrature, n_nodes, self.drivetrain.drivetrain_type)
+        try:
+            state = self.power_curve_cache.get(key)
+        except TypeError: # array inputs are not cached
+            key = state = None
+
+        if state is not None:
+            aero_state, drivetrain_state = state
+            self.aero.__dict__.update(aero_state)
+            self.drivetrain.__dict__.update(drivetrain_state)
+            return
+
+        self.aero.compute(machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                    cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density, max_efficiency,
+                    thrust_coefficient, quadrature, n_nodes)
+
+        self.drivetrain.compute(self.aero.power_curve, self.aero.rotor_torque, self.aero.rotor_thrust, machine_rating)
+
+        if key is not None:
+            self.power_curve_cache.put(key, (dict(self.aero.__dict__), dict(self.drivetrain.__dict__)))
 
     def compute(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
                 cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
                 max_efficiency, thrust_coefficient, soiling_losses, array_losses, availability,
-                turbine_number, shear_exponent, wind_speed_50m, weibull_k):
+                turbine_number, shear_exponent, wind_speed_50m, weibull_k, exact=False, quadrature='bins', n_nodes=None,
+                wake_model=None, wind_rose=None):
+        """
+        Power curve, drivetrain losses and AEP.  With exact=True the AEP integral uses the power curve regions
+        in closed form (aep_calc_csm.compute_exact) instead of the 0.25 m/s binned power curve.
+        quadrature and n_nodes select the power curve wind speeds as in aero_csm.compute.
+        wake_model replaces array_losses with layout dependent wake losses and wind_rose replaces wind_speed_50m and
+        weibull_k with sectors (and seasons) of weibull distributions (see aep_calc_csm.compute).
+        """
 
-        self.aero.compute(machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+        self.power_curve(machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
                     cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density, max_efficiency,
-                    thrust_coefficient)
+                    thrust_coefficient, quadrature, n_nodes)
+
+        if exact:
+            if wake_model is not None:
+                if wind_rose is not None:
+                    raise ValueError('wake losses need a single weibull distribution (one site, no wind rose)')
+                if wake_model.turbine_number != turbine_number:
+                    raise ValueError('wake model layout has %d turbines but turbine_number is %d' % \
+                                     (wake_model.turbine_number, turbine_number))
+                K, L = self.aep.weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k)
+                self.aep.turbine_array_losses, array_losses = wake_model.losses(self.drivetrain.power, self.aero.wind_curve, K, L, \
+                    None if self.aero.wind_weights is None else self.aero.wind_weights[0])
+            else:
+                self.aep.turbine_array_losses = np.zeros(0)
+            breaks, coeffs = self.aero.power_curve_segments()
+            coeffs = drivetrain_loss_polynomial(coeffs, machine_rating, *self.drivetrain.loss_coefficients())
+            self.aep.compute_exact(breaks, coeffs, hub_height, shear_exponent, wind_speed_50m,
+                            weibull_k, machine_rating, soiling_losses, array_losses, availability,
+                            turbine_number, wind_rose)
+        else:
+            self.aep.compute(self.drivetrain.power, self.aero.wind_curve, hub_height, shear_exponent, wind_speed_50m,
+                            weibull_k, machine_rating, soiling_losses, array_losses, availability,
+                            turbine_number, self.aero.wind_weights, wake_model, wind_rose)
 
-        self.drivetrain.compute(self.aero.power_curve, self.aero.rotor_torque, self.aero.rotor_thrust, machine_rating)
 
-        self.aep.compute(self.drivetrain.power, self.aero.wind_curve, hub_height, shear_exponent, wind_speed_50m,
-                        weibull_k, machine_rating, soiling_losses, array_losses, availability,
-                        turbine_number)
+class aep_matrix_csm(object):
+    """
+    AEP of every combination of M turbine designs and S sites.
+
+    The (M x bins) power curve matrix comes from one batched aero_csm / drivetrain_csm evaluation and the
+    (bins x S) weibull weight matrix from one vectorized weibull call per hub height; AEP is their matrix product.
+    Weight matrices are cached per (weibull k, weibull scale, bin grid) so repeated screening runs over the
+    same sites reuse them; the cache holds up to cache_size weight matrices of at most memory_budget bytes each.
+    """
+
+    def __init__(self, drivetrain_type='geared', cache_size=8):
+
+        self.aero = aero_csm()
+        self.drivetrain = drivetrain_csm(drivetrain_type)
+        self.weight_cache = LRUCache(cache_size)
+
+        # Outputs
+        self.power_matrix = np.zeros((0, 161)) # Array(iotype='out', units='kW', desc='power curves after drivetrain losses, one row per design')
+        self.gross_aep = np.zeros((0, 0)) # Array(iotype='out', units='kW * h', desc='gross AEP, designs x sites')
+        self.net_aep = np.zeros((0, 0)) # Array(iotype='out', units='kW * h', desc='net AEP, designs x sites')
+        self.capacity_factor = np.zeros((0, 0)) # Array(iotype='out', desc='plant capacity factor, designs x sites')
+
+    def compute(self, machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr, hub_height,
+                shear_exponent, wind_speed_50m, weibull_k, cut_in_wind_speed=3.0, cut_out_wind_speed=25.0,
+                altitude=0.0, air_density=0.0, max_efficiency=0.902, thrust_coefficient=0.5, soiling_losses=0.0,
+                array_losses=0.06, availability=0.94287630736, turbine_number=100, memory_budget=2**28):
+        """
+        machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr and hub_height describe the
+        M designs (1-D arrays or scalars, see aero_csm.compute_batch); shear_exponent, wind_speed_50m and weibull_k
+        describe the S sites.  The sites are processed in chunks so that the weight matrix and product of one chunk
+        stay within memory_budget bytes.
+        """
+
+        machine_rating, hub_height = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in \
+                                         (machine_rating, hub_height, max_tip_speed, rotor_diameter,
+                                          max_power_coefficient, opt_tsr)])[:2]
+        shear_exponent, wind_speed_50m, weibull_k = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float)) \
+                                         for x in (shear_exponent, wind_speed_50m, weibull_k)])
+
+        # (M x bins) power curves after drivetrain losses
+        self.aero.compute_batch(machine_rating, max_tip_speed, rotor_diameter, max_power_coefficient, opt_tsr,
+                                cut_in_wind_speed, cut_out_wind_speed, hub_height, altitude, air_density,
+                                max_efficiency, thrust_coefficient)
+        self.drivetrain.compute(self.aero.power_curve, self.aero.rotor_torque, self.aero.rotor_thrust, machine_rating[:, np.newaxis])
+        self.power_matrix = self.drivetrain.power
+
+        wind_curve = self.aero.wind_curve
+        ws_inc = wind_curve[1] - wind_curve[0]
+        M, nbins = self.power_matrix.shape
+        S = weibull_k.size
+        chunk = int(max(1, memory_budget // (8 * (nbins + M))))
+
+        turbine_energy = np.empty((M, S))
+        for hh in np.unique(hub_height):
+            rows = hub_height == hh
+            for start in range(0, S, chunk):
+                sites = slice(start, start + chunk)
+                weights = self.weight_matrix(wind_curve, hh, shear_exponent[sites], wind_speed_50m[sites], weibull_k[sites])
+                turbine_energy[rows, sites] = np.dot(self.power_matrix[rows], weights)
+
+        self.gross_aep = turbine_energy * 8760.0 * turbine_number * ws_inc
+        self.net_aep = self.gross_aep * (1.0-soiling_losses)* (1.0-array_losses) * availability
+        self.capacity_factor = self.net_aep / (8760 * machine_rating[:, np.newaxis])
+
+    def weight_matrix(self, wind_curve, hub_height, shear_exponent, wind_speed_50m, weibull_k):
+        """(bins x S) weibull probabilities of the sites at hub_height, cached per (k, scale, bin grid)"""
+
+        K, L = aep_calc_csm.weibull_parameters(hub_height, shear_exponent, wind_speed_50m, weibull_k)
+        K, L, wind_curve = [np.ascontiguousarray(x, dtype=float) for x in (K, L, wind_curve)]
+        key = hashlib.sha1(K.tobytes() + L.tobytes() + wind_curve.tobytes()).hexdigest()
+
+        weights = self.weight_cache.get(key)
+        if weights is None:
+            weights = weibull(wind_curve[:, np.newaxis], K, L)
+            self.weight_cache.put(key, weights)
+        return weights
 
 
 # NREL Cost and Scaling Model cost modules
@@ -339,12 +857,14 @@ class blades_csm(object):
        object to wrap python code for NREL cost and scaling model for a wind turbine blade
     """
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
         """
         OpenMDAO object to wrap blade model of the NREL _cost and Scaling Model (csmBlades.py)
         
         """
         super(blades_csm, self).__init__()
+
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
         
         # Outputs
         self.blade_cost = 0.0 # Float(0.0, units='USD', iotype='out', desc='cost for a single wind turbine blade')
@@ -372,20 +892,16 @@ class blades_csm(object):
         
         self.blade_mass = (massCoeff*(self.rotor_diameter/2.0)**massExp)
 
-        ppi.curr_yr = curr_yr
-        ppi.curr_mon = curr_mon
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=curr_yr, curr_mon=curr_mon)
 
-        ppi_labor  = ppi.compute('IPPI_BLL')
+        ppi_labor  = esc.compute('IPPI_BLL')
 
         if (self.advanced_blade == True):
-            ref_yr = ppi.ref_yr
-            ppi.ref_yr = 2003
-            ppi_mat   = ppi.compute('IPPI_BLA')
-            ppi.ref_yr = ref_yr
+            ppi_mat   = esc.replace(ref_yr=2003).compute('IPPI_BLA')
             slopeR3   = 0.4019376
             intR3     = -21051.045983
         else:
-            ppi_mat   = ppi.compute('IPPI_BLD')
+            ppi_mat   = esc.compute('IPPI_BLD')
             slopeR3   = 0.4019376
             intR3     = -955.24267
             
@@ -420,12 +936,14 @@ class hub_csm(object):
        object to wrap python code for NREL cost and scaling model for a wind turbine hub
     """
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
         """
         OpenMDAO object to wrap hub model of the NREL _cost and Scaling Model (csmHub.py)  
         """
         super(hub_csm, self).__init__()
 
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
+
         # Outputs
         self.hub_system_cost = 0.0 #Float(0.0, units='USD', iotype='out', desc='hub system cost')
         self.hub_system_mass = 0.0 #Float(0.0, units='kg', iotype='out', desc='hub system mass')
@@ -464,21 +982,20 @@ class hub_csm(object):
 
         self.hub_system_mass = self.hub_mass + self.pitch_system_mass + self.spinner_mass
 
-        ppi.curr_yr = curr_yr
-        ppi.curr_mon = curr_mon
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=curr_yr, curr_mon=curr_mon)
 
         #*** Pitch bearing and mechanism    
         bearingCost = (0.2106*self.rotor_diameter**2.6576)
-        bearingCostEscalator = ppi.compute('IPPI_PMB')
+        bearingCostEscalator = esc.compute('IPPI_PMB')
         self.pitch_system_cost = bearingCostEscalator * ( bearingCost + bearingCost * 1.28 )
     
         #*** Hub
         hubCost2002 = self.hub_mass * 4.25 # $/kg       
-        hubCostEscalator = ppi.compute('IPPI_HUB')
+        hubCostEscalator = esc.compute('IPPI_HUB')
         self.hub_cost = hubCost2002 * hubCostEscalator
     
         #*** NoseCone/Spinner
-        spinnerCostEscalator = ppi.compute('IPPI_NAC')
+        spinnerCostEscalator = esc.compute('IPPI_NAC')
         self.spinner_cost = spinnerCostEscalator * (5.57*self.spinner_mass)         
 
         self.hub_system_cost = self.hub_cost + self.pitch_system_cost + self.spinner_cost
@@ -528,17 +1045,74 @@ class hub_csm(object):
 
 ##### Nacelle
 
+# gearbox cost coefficient and exponent (on machine rating) and mass coefficient and exponent (on rotor torque),
+# one row per DRIVETRAIN_TYPES entry
+GEARBOX_COEFFICIENTS = np.array([[16.45      , 1.2491,  65.601     , 0.759 ],
+                                 [74.101     , 1.002 ,  81.63967335, 0.7738],
+                                 [15.25697015, 1.2491, 129.1702924 , 0.7738],
+                                 [ 0.        , 0.    ,   0.        , 0.    ]])
+
+# generator cost coefficient [$/kW] ('Generators' worksheet) and mass coefficient and exponent (on machine rating,
+# on rotor torque for direct drive), one row per DRIVETRAIN_TYPES entry
+GENERATOR_COEFFICIENTS = np.array([[ 65.000  ,  6.4737 , 0.9223],
+                                   [ 54.72533, 10.50972, 0.9223],
+                                   [ 48.02963,  5.343902, 0.9223],
+                                   [219.3333 , 37.68400, 1.0   ]])
+
+# bedplate mass coefficient and exponent (on rotor diameter, used for single_stage and multi_drive) and main frame
+# cost coefficient and exponent (on rotor diameter), one row per DRIVETRAIN_TYPES entry
+MAINFRAME_COEFFICIENTS = np.array([[22448.  , 0.    ,   9.4885, 1.9525],
+                                   [    1.29490, 1.9525, 303.96  , 1.0669],
+                                   [    1.72080, 1.9525,  17.923 , 1.6716],
+                                   [22448.  , 0.    , 627.28  , 0.8500]])
+
+# nacelle subcomponents, each with a _mass and a _cost output
+NACELLE_PARTS = ('nacelle', 'lowSpeedShaft', 'bearings', 'gearbox', 'mechanicalBrakes', 'generator', 'VSElectronics',
+                 'yawSystem', 'mainframeTotal', 'electronicCabling', 'HVAC', 'nacelleCover', 'controls')
+
+# record of the nacelle breakdown from nacelle_csm.compute_batch: all subcomponent masses [kg], then all costs [USD]
+NACELLE_DTYPE = np.dtype([(part + '_mass', float) for part in NACELLE_PARTS] + [(part + '_cost', float) for part in NACELLE_PARTS])
+
+def _drivetrain_design_index(drivetrain_design):
+    """DRIVETRAIN_TYPES row of a drivetrain design name, or an index array for an array of names or of indices"""
+
+    if isinstance(drivetrain_design, str):
+        return drivetrain_type_index(drivetrain_design)
+    drivetrain_design = np.asarray(drivetrain_design)
+    if drivetrain_design.dtype.kind in 'iu':
+        if np.any((drivetrain_design < 0) | (drivetrain_design >= len(DRIVETRAIN_TYPES))):
+            raise ValueError('drivetrain design index out of range')
+        return drivetrain_design
+    names, inverse = np.unique(drivetrain_design, return_inverse=True)
+    return np.array([drivetrain_type_index(str(name)) for name in names], dtype=int)[inverse].reshape(drivetrain_design.shape)
+
+def _drivetrain_masses(index, rotor_torque, machine_rating, esc):
+    """gearbox and generator mass and cost for the DRIVETRAIN_TYPES rows in index, broadcast against the inputs"""
+
+    costCoeff, costExp, massCoeff, massExp = np.moveaxis(GEARBOX_COEFFICIENTS[index], -1, 0)
+    gearbox_mass = massCoeff * (rotor_torque/1000) ** massExp
+    gearbox_cost = costCoeff * machine_rating ** costExp * esc.compute('IPPI_GRB')
+
+    costCoeff, massCoeff, massExp = np.moveaxis(GENERATOR_COEFFICIENTS[index], -1, 0)
+    direct_drive = index == DRIVETRAIN_TYPES.index('pm_direct_drive')
+    generator_mass = massCoeff * np.where(direct_drive, rotor_torque, machine_rating) ** massExp
+    generator_cost = costCoeff * machine_rating * esc.compute('IPPI_GEN')
+
+    return gearbox_mass, gearbox_cost, generator_mass, generator_cost
+
 class nacelle_csm(object):
     """
        object to wrap python code for NREL cost and scaling model for a wind turbine nacelle
     """
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
         """
         OpenMDAO object to wrap nacelle mass-cost model based on the NREL _cost and Scaling model data (csmNacelle.py).             
         """
         super(nacelle_csm, self).__init__()
 
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
+
         # Outputs
         self.nacelle_mass = 0.0 #Float(0.0, units='kg', iotype='out', desc='nacelle mass')
         self.lowSpeedShaft_mass = 0.0 #Float(0.0, units='kg', iotype='out', desc= 'low speed shaft mass')
@@ -568,10 +1142,160 @@ class nacelle_csm(object):
         self.nacelleCover_cost = 0.0 # Float(0.0, units='kg', iotype='out', desc= 'nacelle cover _cost')
         self.controls_cost = 0.0 # Float(0.0, units='kg', iotype='out', desc= 'control system _cost')
 
+        # Outputs of compute_drivetrains, one row per drivetrain type
+        self.gearbox_mass_types = None # Array(units='kg', iotype='out', desc= 'gearbox and housing mass per drivetrain type')
+        self.gearbox_cost_types = None # Array(units='USD', iotype='out', desc= 'gearbox and housing cost per drivetrain type')
+        self.generator_mass_types = None # Array(units='kg', iotype='out', desc= 'generator and housing mass per drivetrain type')
+        self.generator_cost_types = None # Array(units='USD', iotype='out', desc= 'generator and housing cost per drivetrain type')
+
+        # Output of compute_batch
+        self.breakdown = None # structured array of NACELLE_DTYPE, one record per design
+
+    def compute_drivetrains(self, rotor_torque, machine_rating, drivetrain_designs='all', year=2009, month=12):
+        """
+        gearbox and generator masses and costs of several drivetrain designs in one evaluation
+
+        Parameters
+        ----------
+        rotor_torque : float or array
+           torque from rotor at rated power [N*m]
+        machine_rating : float or array
+           machine rated power [kW], broadcast against rotor_torque
+        drivetrain_designs : str or sequence of str
+           drivetrain designs from DRIVETRAIN_TYPES ('multi-drive' is accepted for 'multi_drive'), or 'all'
+        year, month : int
+           project start date for the cost escalators
+
+        Returns
+        -------
+        gearbox_mass_types, gearbox_cost_types, generator_mass_types, generator_cost_types : array (types, ...)
+          masses [kg] and costs [USD] with one rotor_torque / machine_rating shaped slice per drivetrain design
+        """
+
+        index = np.atleast_1d(drivetrain_type_index(drivetrain_designs))
+        self.drivetrain_types = tuple(DRIVETRAIN_TYPES[i] for i in index)
+
+        rotor_torque, machine_rating = np.broadcast_arrays(np.asarray(rotor_torque, dtype=float), \
+                                                           np.asarray(machine_rating, dtype=float))
+        expand = (index.size,) + (1,)*rotor_torque.ndim
+
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=year, curr_mon=month)
+
+        self.gearbox_mass_types, self.gearbox_cost_types, self.generator_mass_types, self.generator_cost_types = \
+            _drivetrain_masses(index.reshape(expand), rotor_torque, machine_rating, esc)
+
+        return self.gearbox_mass_types, self.gearbox_cost_types, self.generator_mass_types, self.generator_cost_types
+
+    def compute_batch(self, rotor_diameter, rotor_mass, rotor_thrust, rotor_torque, machine_rating, drivetrain_design='geared', \
+                      crane=True, advanced_bedplate=0, year=2009, month=12, offshore=True):
+        """
+        Batched nacelle model for arrays of designs.
+
+        Parameters
+        ----------
+        rotor_diameter, rotor_mass, rotor_thrust, rotor_torque, machine_rating : float or array
+           design inputs as in compute, broadcast against each other and the options
+        drivetrain_design : str or array
+           drivetrain design name, or an array of names or of DRIVETRAIN_TYPES indices
+        crane, offshore : bool or array
+           service crane and offshore masks
+        advanced_bedplate : int or array
+           bedplate design, 0 conventional, 1 modular-advanced, 2 advanced
+        year, month : int
+           project start date for the cost escalators, shared by all designs
+
+        Returns
+        -------
+        breakdown : structured array of NACELLE_DTYPE
+          the mass and cost of every subcomponent in NACELLE_PARTS, one record per design.  The same arrays are
+          set as the mass and cost outputs (e.g. gearbox_mass), which are views of the fields of breakdown.
+        """
+
+        index = _drivetrain_design_index(drivetrain_design)
+        rotor_diameter, rotor_mass, rotor_thrust, rotor_torque, machine_rating, index, crane, advanced_bedplate, offshore = \
+            np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (rotor_diameter, rotor_mass, rotor_thrust,
+                                                                       rotor_torque, machine_rating)] +
+                                [np.asarray(index), np.asarray(crane, dtype=bool), np.asarray(advanced_bedplate),
+                                 np.asarray(offshore, dtype=bool)])
+
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=year, curr_mon=month)
+        rec = np.empty(rotor_diameter.shape, dtype=NACELLE_DTYPE)
+
+        # Low Speed Shaft
+        lenShaft  = 0.03 * rotor_diameter
+        bendMom   = 1.25*9.81*rotor_mass * (lenShaft / 5)
+        hollow    = 1/(1-(0.1)**4)
+        outDiam   = ((32./np.pi)*hollow*3.25*((rotor_torque*3./371000000.)**2+(bendMom/71070000)**2)**(0.5))**(1./3.)
+        inDiam    = outDiam * 0.1
+        rec['lowSpeedShaft_mass'] = 1.25*(np.pi/4)*(outDiam**2-inDiam**2)*lenShaft*7860
+        rec['lowSpeedShaft_cost'] = 0.0998 * rotor_diameter ** 2.8873 * esc.compute('IPPI_LSS')
+
+        # Gearbox and generator
+        rec['gearbox_mass'], rec['gearbox_cost'], rec['generator_mass'], rec['generator_cost'] = \
+            _drivetrain_masses(index, rotor_torque, machine_rating, esc)
+
+        # bearings
+        bearingMass = 0.00012266667 * (rotor_diameter ** 3.5) - 0.00030360 * (rotor_diameter ** 2.5)
+        rec['bearings_mass'] = bearingMass + bearingMass
+        rec['bearings_cost'] = (bearingMass * 17.6 + bearingMass * 17.6) * esc.compute('IPPI_BRN')
+
+        # mechanical brake
+        mechBrakeCost2002 = 1.9894 * machine_rating + (-0.1141)
+        rec['mechanicalBrakes_mass'] = mechBrakeCost2002 * 0.10
+        rec['mechanicalBrakes_cost'] = esc.compute('IPPI_BRK') * mechBrakeCost2002
+
+        # variable-speed electronics, yaw drive bearings, hydraulics and cooling, electrical connections
+        rec['VSElectronics_mass'] = 0.0
+        rec['VSElectronics_cost'] = 79.32 * machine_rating * esc.compute('IPPI_VSE')
+        rec['yawSystem_mass'] = 1.6 * (0.0009 * rotor_diameter ** 3.314)
+        rec['yawSystem_cost'] = 2 * ( 0.0339 * rotor_diameter ** 2.9637 ) * esc.compute('IPPI_YAW')
+        rec['HVAC_mass'] = 0.08 * machine_rating
+        rec['HVAC_cost'] = 12.0 * machine_rating * esc.compute('IPPI_HYD')
+        rec['electronicCabling_mass'] = 0.0
+        rec['electronicCabling_cost'] = 40.0 * machine_rating * esc.compute('IPPI_ELC')
+
+        # main frame: bedplate, platforms and crane
+        BedplateWeightFac = np.where(advanced_bedplate == 0, 2.86, np.where(advanced_bedplate == 1, 2.40, 0.71))
+        TowerTopDiam = (12.29*rotor_diameter+2648)/1000
+        BedplateLength = 1.5874 * 0.052 * rotor_diameter
+        TotalMass = BedplateWeightFac * 0.00368 * rotor_torque + \
+                    0.00158 * BedplateWeightFac * rotor_thrust * TowerTopDiam + \
+                    0.015   * BedplateWeightFac * rotor_mass * TowerTopDiam + \
+                    100 * BedplateWeightFac * (0.5 * BedplateLength * BedplateLength)
+
+        mfmMassCoeff, mfmMassExp, mfmCostCoeff, mfmCostExp = np.moveaxis(MAINFRAME_COEFFICIENTS[index], -1, 0)
+        modular = (index == DRIVETRAIN_TYPES.index('geared')) | (index == DRIVETRAIN_TYPES.index('pm_direct_drive'))
+        bedplate_mass = np.where(modular, TotalMass, mfmMassCoeff * rotor_diameter ** mfmMassExp)
+        NacellePlatformsMass = .125 * bedplate_mass
+        rec['mainframeTotal_mass'] = bedplate_mass + NacellePlatformsMass + np.where(crane, 3000., 0.)
+
+        MainFrameCost2002 = mfmCostCoeff * rotor_diameter ** mfmCostExp
+        rec['mainframeTotal_cost'] = (MainFrameCost2002 + 8.7 * NacellePlatformsMass + np.where(crane, 12000., 0.) + \
+                                      MainFrameCost2002 * 0.7) * esc.compute('IPPI_MFM')
+
+        # nacelle cover and control system
+        nacelleCovCost2002 = 11.537 * machine_rating + (3849.7)
+        rec['nacelleCover_mass'] = nacelleCovCost2002 * 0.111111
+        rec['nacelleCover_cost'] = esc.compute('IPPI_NAC') * nacelleCovCost2002
+        rec['controls_mass'] = 0.0
+        rec['controls_cost'] = np.where(offshore, 55900, 35000) * esc.compute('IPPI_CTL') # land, off-shore
+
+        # nacelle totals
+        for suffix in ('_mass', '_cost'):
+            rec['nacelle' + suffix] = sum(rec[part + suffix] for part in NACELLE_PARTS[1:])
+
+        self.breakdown = rec
+        for name in NACELLE_DTYPE.names:
+            setattr(self, name, rec[name])
+
+        return rec
+
     def compute(self, rotor_diameter, rotor_mass, rotor_thrust, rotor_torque, machine_rating, drivetrain_design='geared', \
                 crane=True, advanced_bedplate=0, year=2009, month=12, offshore=True):
         """
         compute nacelle model of the NREL _cost and Scaling Model.
+
+        The masses and costs come from compute_batch for a single design; only the derivatives are computed here.
         """
 
         # Variables
@@ -582,21 +1306,26 @@ class nacelle_csm(object):
         self.machine_rating = machine_rating #Float(5000.0, units='kW', iotype='in', desc = 'Machine rated power')
     
         # Parameters
-        self.drivetrain_design = drivetrain_design #Enum('geared', ('geared', 'single_stage', 'multi_drive', 'pm_direct_drive'), iotype='in')
+        self.drivetrain_design = drivetrain_design #Enum('geared', ('geared', 'single_stage', 'multi_drive', 'pm_direct_drive'), iotype='in') - 'multi-drive' is also accepted
         self.crane = crane #Bool(True, iotype='in', desc = 'boolean for presence of a service crane up tower')
         self.advanced_bedplate = advanced_bedplate #Int(0, iotype='in', desc= 'indicator for drivetrain bedplate design 0 - conventional')   
         self.year = year #Int(2009, iotype='in', desc = 'year of project start')
         self.month = month #Int(12, iotype='in', desc = 'month of project start')
         self.offshore = offshore #Bool(True, iotype='in', desc = 'boolean for land or offshore wind project')
 
-        # basic variable initialization        
-        if self.offshore == False:
-           offshore = 0
-        else:
-           offshore = 1
+        rec = self.compute_batch(rotor_diameter, rotor_mass, rotor_thrust, rotor_torque, machine_rating, drivetrain_design, \
+                                 crane, advanced_bedplate, year, month, offshore)
+        for name in NACELLE_DTYPE.names:
+            setattr(self, name, float(rec[name]))
 
-        ppi.curr_yr = self.year
-        ppi.curr_mon = self.month
+        self.crane_mass = 3000. if self.crane else 0.
+        self.crane_cost = 12000. if self.crane else 0.
+        self.bedplate_mass = (self.mainframeTotal_mass - self.crane_mass) / 1.125
+
+        # Derivatives
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=self.year, curr_mon=self.month)
+        drivetrain_design = drivetrain_type_index(self.drivetrain_design)
+        direct_drive = drivetrain_design == DRIVETRAIN_TYPES.index('pm_direct_drive')
 
         # Low Speed Shaft
         lenShaft  = 0.03 * self.rotor_diameter                                                                   
@@ -607,13 +1336,6 @@ class nacelle_csm(object):
         hollow    = 1/(1-(hFact)**4)                                                                   
         outDiam   = ((32./np.pi)*hollow*3.25*((self.rotor_torque*3./371000000.)**2+(bendMom/71070000)**2)**(0.5))**(1./3.) 
         inDiam    = outDiam * hFact 
-                                                                              
-        self.lowSpeedShaft_mass      = 1.25*(np.pi/4)*(outDiam**2-inDiam**2)*lenShaft*7860
-
-        LowSpeedShaftCost2002 = 0.0998 * self.rotor_diameter ** 2.8873
-        lssCostEsc     = ppi.compute('IPPI_LSS')
-        
-        self.lowSpeedShaft_cost = LowSpeedShaftCost2002 * lssCostEsc
 
         d_mass_d_outD = 1.25*(np.pi/4) * (1 - 0.1**2) * 2 * outDiam * lenShaft*7860
         d_outD_mult = ((32./np.pi)*hollow*3.25)**(1./3.) * (1./6.) * ((self.rotor_torque*3./371000000.)**2+(bendMom/71070000.)**2)**(-5./6.)
@@ -625,138 +1347,45 @@ class nacelle_csm(object):
         self.d_lss_mass_d_r_mass = d_mass_d_outD * d_outD_d_mass
         self.d_lss_mass_d_r_torque = d_mass_d_outD * d_outD_d_torque
 
-        self.d_lss_cost_d_r_diameter = lssCostEsc * 2.8873 * 0.0998 * self.rotor_diameter ** 1.8873
+        self.d_lss_cost_d_r_diameter = esc.compute('IPPI_LSS') * 2.8873 * 0.0998 * self.rotor_diameter ** 1.8873
         
         # Gearbox
-        costCoeff = [None, 16.45  , 74.101     ,   15.25697015,  0 ]
-        costExp   = [None,  1.2491,  1.002     ,    1.2491    ,  0 ]
-        massCoeff = [None, 65.601 , 81.63967335,  129.1702924 ,  0 ]
-        massExp   = [None,  0.759 ,  0.7738    ,    0.7738    ,  0 ]
-        
-        if self.drivetrain_design == 'geared':
-            drivetrain_design = 1
-        elif self.drivetrain_design == 'single_stage':
-            drivetrain_design = 2
-        elif self.drivetrain_design == 'multi-drive':
-            drivetrain_design = 3
-        elif self.drivetrain_design == 'pm_direct_drive':
-            drivetrain_design = 4
-
-        self.gearbox_mass = massCoeff[drivetrain_design] * (self.rotor_torque/1000) ** massExp[drivetrain_design] 
-
-        gearboxCostEsc     = ppi.compute('IPPI_GRB')        
-        Gearbox2002 = costCoeff[drivetrain_design] * self.machine_rating ** costExp[drivetrain_design]  
-        self.gearbox_cost = Gearbox2002 * gearboxCostEsc   
-        
-        if drivetrain_design == 4:
+        costCoeff, costExp, massCoeff, massExp = GEARBOX_COEFFICIENTS[drivetrain_design]
+        if direct_drive:
             self.d_gearbox_mass_d_r_torque = 0.0
             self.d_gearbox_cost_d_rating = 0.0
         else:
-            self.d_gearbox_mass_d_r_torque = massExp[drivetrain_design]  * massCoeff[drivetrain_design] * ((self.rotor_torque/1000.) ** (massExp[drivetrain_design] - 1)) * (1/1000.)
-            self.d_gearbox_cost_d_rating = gearboxCostEsc * costExp[drivetrain_design] * costCoeff[drivetrain_design] * self.machine_rating ** (costExp[drivetrain_design] - 1)
+            self.d_gearbox_mass_d_r_torque = massExp * massCoeff * ((self.rotor_torque/1000.) ** (massExp - 1)) * (1/1000.)
+            self.d_gearbox_cost_d_rating = esc.compute('IPPI_GRB') * costExp * costCoeff * self.machine_rating ** (costExp - 1)
 
         # Generator
-        costCoeff = [None, 65.000, 54.72533,  48.02963 , 219.3333 ] # $/kW - from 'Generators' worksheet
-        massCoeff = [None, 6.4737, 10.50972,  5.343902 , 37.68400 ]
-        massExp   = [None, 0.9223, 0.922300,  0.922300 , 1.000000 ]
-
-        if (drivetrain_design < 4):
-            self.generator_mass = massCoeff[drivetrain_design] * self.machine_rating ** massExp[drivetrain_design]   
-        else:  # direct drive
-            self.generator_mass = massCoeff[drivetrain_design] * self.rotor_torque ** massExp[drivetrain_design] 
-
-        generatorCostEsc     = ppi.compute('IPPI_GEN')                                                  
-        GeneratorCost2002 = costCoeff[drivetrain_design] * self.machine_rating 
-        self.generator_cost = GeneratorCost2002 * generatorCostEsc
-
-        if drivetrain_design < 4:
-            self.d_generator_mass_d_r_torque = 0.0
-            self.d_generator_mass_d_rating = massExp[drivetrain_design] * massCoeff[drivetrain_design] * self.machine_rating ** (massExp[drivetrain_design]-1)
-        else:
-            self.d_generator_mass_d_r_torque = massExp[drivetrain_design] * massCoeff[drivetrain_design] * self.rotor_torque ** (massExp[drivetrain_design]-1)
+        costCoeff, massCoeff, massExp = GENERATOR_COEFFICIENTS[drivetrain_design]
+        if direct_drive:
+            self.d_generator_mass_d_r_torque = massExp * massCoeff * self.rotor_torque ** (massExp-1)
             self.d_generator_mass_d_rating = 0.0
-        self.d_generator_cost_d_rating = generatorCostEsc * costCoeff[drivetrain_design]
-        
+        else:
+            self.d_generator_mass_d_r_torque = 0.0
+            self.d_generator_mass_d_rating = massExp * massCoeff * self.machine_rating ** (massExp-1)
+        self.d_generator_cost_d_rating = esc.compute('IPPI_GEN') * costCoeff
+
         # Rest of the system
-        
-        # --- electrical connections           
-        self.electronicCabling_mass = 0.0
-        
-        # --- bearings           
-        self.bearings_mass = 0.00012266667 * (self.rotor_diameter ** 3.5) - 0.00030360 * (self.rotor_diameter ** 2.5)
-        HousingMass  = self.bearings_mass 
-        self.bearings_mass  += HousingMass
-        
         self.d_bearings_mass_d_r_diameter = 2 * ( 3.5 * 0.00012266667 * (self.rotor_diameter ** 2.5) - 0.00030360 * 2.5 * (self.rotor_diameter ** 1.5))
-        
-        # --- mechanical brake           
-        mechBrakeCost2002 = 1.9894 * self.machine_rating + (-0.1141)
-        self.mechanicalBrakes_mass = mechBrakeCost2002 * 0.10
-        
         self.d_brakes_mass_d_rating = 0.10 * 1.9894
-        
-        # --- variable-speed electronics
-        self.VSElectronics_mass = 0.0
-
-        # --- yaw drive bearings
-        self.yawSystem_mass = 1.6 * (0.0009 * self.rotor_diameter ** 3.314)
-        
         self.d_yaw_mass_d_r_diameter = 3.314 * 1.6 * (0.0009 * self.rotor_diameter ** 2.314)
-        
-        # --- hydraulics, cooling
-        self.HVAC_mass = 0.08 * self.machine_rating
-        
         self.d_hvac_mass_d_rating = 0.08
+        self.d_cover_mass_d_rating = 0.111111 * 11.537
 
-        # --- bedplate ---        
+        # --- main frame ---
         if (self.advanced_bedplate == 0):   # not an actual option in cost and scaling model                                           
             BedplateWeightFac = 2.86  # modular
         elif (self.advanced_bedplate == 1): # test for mod-adv
             BedplateWeightFac = 2.40  # modular-advanced
         else:
             BedplateWeightFac = 0.71  # advanced
-
-        # These RD functions from spreadsheet don't quite form a continuous composite function        
-        '''if (self.rotor_diameter <= 15.0): # Removing for gradients - assuming large turbines only
-            TowerTopDiam = 0.3
-        elif (self.rotor_diameter <= 60.0):
-            TowerTopDiam = (0.07042*self.rotor_diameter-0.715)
-        else:'''
         TowerTopDiam = (12.29*self.rotor_diameter+2648)/1000
 
-        MassFromTorque = BedplateWeightFac * 0.00368 * self.rotor_torque
-        MassFromThrust      = 0.00158 * BedplateWeightFac * self.rotor_thrust * TowerTopDiam
-        MassFromRotorWeight = 0.015   * BedplateWeightFac * self.rotor_mass     * TowerTopDiam
-        
-        # Bedplate(Length|Area) added by GNS
-        BedplateLength = 1.5874 * 0.052 * self.rotor_diameter
-        BedplateArea = 0.5 * BedplateLength * BedplateLength
-        MassFromArea = 100 * BedplateWeightFac * BedplateArea
-
-        # mfmCoeff[1,4] for different drivetrain configurations
-        mfmCoeff = [None,22448,1.29490,1.72080,22448 ]
-        mfmExp   = [None,    0,1.9525, 1.9525 ,    0 ]
-
-        # --- nacelle totals        
-        TotalMass = MassFromTorque + MassFromThrust + MassFromRotorWeight + MassFromArea
-        
-        if (drivetrain_design == 1) or (drivetrain_design == 4):
-            self.bedplate_mass = TotalMass
-        else:
-            self.bedplate_mass = mfmCoeff[drivetrain_design] * (self.rotor_diameter ** mfmExp[drivetrain_design] )
-
-        NacellePlatformsMass = .125 * self.bedplate_mass            
-     
-        # --- crane ---        
-        if (self.crane):
-            self.crane_mass =  3000.
-        else:
-            self.crane_mass = 0.  
-            
-        # --- main frame ---       
-        self.mainframeTotal_mass = self.bedplate_mass + NacellePlatformsMass + self.crane_mass
-
-        if (drivetrain_design == 1) or (drivetrain_design == 4):
+        mfmMassCoeff, mfmMassExp, mfmCostCoeff, mfmCostExp = MAINFRAME_COEFFICIENTS[drivetrain_design]
+        if drivetrain_design in (DRIVETRAIN_TYPES.index('geared'), DRIVETRAIN_TYPES.index('pm_direct_drive')):
             self.d_mainframe_mass_d_r_diameter = 1.125 * (((0.00158 * BedplateWeightFac * self.rotor_thrust * (12.29/1000.)) + \
                                                   (0.015   * BedplateWeightFac * self.rotor_mass * (12.29/1000.)) + \
                                                   (100 * BedplateWeightFac * 0.5 * (1.5874 * 0.052)**2. * (2 * self.rotor_diameter))))
@@ -764,35 +1393,11 @@ class nacelle_csm(object):
             self.d_mainframe_mass_d_r_thrust = 1.125 * (0.00158 * BedplateWeightFac * TowerTopDiam)
             self.d_mainframe_mass_d_r_torque = 1.125 * BedplateWeightFac * 0.00368
         else:
-            self.d_mainframe_mass_d_r_diameter = 1.125 * mfmCoeff[drivetrain_design] * \
-                                                  (mfmExp[drivetrain_design] * self.rotor_diameter ** (mfmExp[drivetrain_design]-1))
+            self.d_mainframe_mass_d_r_diameter = 1.125 * mfmMassCoeff * (mfmMassExp * self.rotor_diameter ** (mfmMassExp-1))
             self.d_mainframe_mass_d_r_mass = 0.0
             self.d_mainframe_mass_d_r_thrust = 0.0
             self.d_mainframe_mass_d_r_torque = 0.0      
 
-        # --- nacelle cover ---        
-        nacelleCovCost2002 = 11.537 * self.machine_rating + (3849.7)
-        self.nacelleCover_mass = nacelleCovCost2002 * 0.111111
-        
-        self.d_cover_mass_d_rating = 0.111111 * 11.537
-
-        # --- control system ---
-        self.controls_mass = 0.0
-
-        # overall mass   
-        self.nacelle_mass = self.lowSpeedShaft_mass + \
-                    self.bearings_mass + \
-                    self.gearbox_mass + \
-                    self.mechanicalBrakes_mass + \
-                    self.generator_mass + \
-                    self.VSElectronics_mass + \
-                    self.yawSystem_mass + \
-                    self.mainframeTotal_mass + \
-                    self.electronicCabling_mass + \
-                    self.HVAC_mass + \
-                    self.nacelleCover_mass + \
-                    self.controls_mass
-        
         self.d_nacelle_mass_d_r_diameter = self.d_lss_mass_d_r_diameter + self.d_bearings_mass_d_r_diameter + self.d_yaw_mass_d_r_diameter + self.d_mainframe_mass_d_r_diameter
         self.d_nacelle_mass_d_r_mass = self.d_lss_mass_d_r_mass + self.d_mainframe_mass_d_r_mass
         self.d_nacelle_mass_d_r_thrust = self.d_mainframe_mass_d_r_thrust
@@ -800,111 +1405,21 @@ class nacelle_csm(object):
         self.d_nacelle_mass_d_rating = self.d_generator_mass_d_rating + self.d_brakes_mass_d_rating + self.d_hvac_mass_d_rating + self.d_cover_mass_d_rating
         
         # Rest of System Costs
-        # Cost Escalators - obtained from ppi tables
-        bearingCostEsc       = ppi.compute('IPPI_BRN')
-        mechBrakeCostEsc     = ppi.compute('IPPI_BRK')
-        VspdEtronicsCostEsc  = ppi.compute('IPPI_VSE')
-        yawDrvBearingCostEsc = ppi.compute('IPPI_YAW')
-        nacelleCovCostEsc    = ppi.compute('IPPI_NAC')
-        hydrCoolingCostEsc   = ppi.compute('IPPI_HYD')
-        mainFrameCostEsc     = ppi.compute('IPPI_MFM')
-        econnectionsCostEsc  = ppi.compute('IPPI_ELC')
-
-        # These RD functions from spreadsheet don't quite form a continuous composite function
-        
-        # --- electrical connections
-        self.electronicCabling_cost = 40.0 * self.machine_rating # 2002
-        self.electronicCabling_cost *= econnectionsCostEsc
-        
-        self.d_electronics_cost_d_rating = 40.0 * econnectionsCostEsc
-        
-        # --- bearings
-        bearingMass = 0.00012266667 * (self.rotor_diameter ** 3.5) - 0.00030360 * (self.rotor_diameter ** 2.5)
-        HousingMass  = bearingMass 
-        brngSysCostFactor = 17.6 # $/kg
-        Bearings2002 = bearingMass * brngSysCostFactor
-        Housing2002  = HousingMass      * brngSysCostFactor
-        self.bearings_cost = ( Bearings2002 + Housing2002 ) * bearingCostEsc
-        
-        self.d_bearings_cost_d_r_diameter = bearingCostEsc * brngSysCostFactor * self.d_bearings_mass_d_r_diameter
-        
-        # --- mechanical brake           
-        mechBrakeCost2002 = 1.9894 * self.machine_rating + (-0.1141)
-        self.mechanicalBrakes_cost = mechBrakeCostEsc * mechBrakeCost2002
-        
-        self.d_brakes_cost_d_rating = mechBrakeCostEsc * 1.9894
-        
-        # --- variable-speed electronics           
-        VspdEtronics2002 = 79.32 * self.machine_rating
-        self.VSElectronics_cost = VspdEtronics2002 * VspdEtronicsCostEsc
-        
-        self.d_vselectronics_cost_d_rating = VspdEtronicsCostEsc * 79.32
-
-        # --- yaw drive bearings
-        YawDrvBearing2002 = 2 * ( 0.0339 * self.rotor_diameter ** 2.9637 )
-        self.yawSystem_cost = YawDrvBearing2002 * yawDrvBearingCostEsc
-        
-        self.d_yaw_cost_d_r_diameter = yawDrvBearingCostEsc * 2 * 2.9637 * ( 0.0339 * self.rotor_diameter ** 1.9637 )
-        
-        # --- hydraulics, cooling
-        self.HVAC_cost = 12.0 * self.machine_rating # 2002
-        self.HVAC_cost *= hydrCoolingCostEsc 
-        
-        self.d_hvac_cost_d_rating = hydrCoolingCostEsc * 12.0
- 
-        # --- control system ---   
-        initControlCost = [ 35000, 55900 ]  # land, off-shore
-        self.controls_cost = initControlCost[offshore] * ppi.compute('IPPI_CTL')
-
-        # --- nacelle totals
-        NacellePlatforms2002 = 8.7 * NacellePlatformsMass
-        
-        # --- nacelle cover ---        
-        nacelleCovCost2002 = 11.537 * self.machine_rating + (3849.7)
-        self.nacelleCover_cost = nacelleCovCostEsc * nacelleCovCost2002
-        
-        self.d_cover_cost_d_rating = nacelleCovCostEsc * 11.537
-        
-        # --- crane ---
-        
-        if (self.crane):
-            self.crane_cost = 12000.
-        else:
-            self.crane_cost = 0.0
-            
-        # --- main frame ---
-        # mfmCoeff[1,4] for different drivetrain configurations
-        mfmCoeff = [None,9.4885,303.96,17.923,627.28 ]
-        mfmExp   = [None,1.9525,1.0669,1.6716,0.8500 ]
-        
-        MainFrameCost2002 = mfmCoeff[drivetrain_design] * self.rotor_diameter ** mfmExp[drivetrain_design]
-        BaseHardware2002  = MainFrameCost2002 * 0.7
-        MainFrame2002 = ( MainFrameCost2002    + 
-                          NacellePlatforms2002 + 
-                          self.crane_cost       + # service crane 
-                          BaseHardware2002 )
-        self.mainframeTotal_cost = MainFrame2002 * mainFrameCostEsc
-        
-        self.d_mainframe_cost_d_r_diameter = mainFrameCostEsc * (1.7 * mfmCoeff[drivetrain_design] * mfmExp[drivetrain_design] * self.rotor_diameter ** (mfmExp[drivetrain_design]-1) + \
+        mainFrameCostEsc = esc.compute('IPPI_MFM')
+        self.d_electronics_cost_d_rating = 40.0 * esc.compute('IPPI_ELC')
+        self.d_bearings_cost_d_r_diameter = esc.compute('IPPI_BRN') * 17.6 * self.d_bearings_mass_d_r_diameter
+        self.d_brakes_cost_d_rating = esc.compute('IPPI_BRK') * 1.9894
+        self.d_vselectronics_cost_d_rating = esc.compute('IPPI_VSE') * 79.32
+        self.d_yaw_cost_d_r_diameter = esc.compute('IPPI_YAW') * 2 * 2.9637 * ( 0.0339 * self.rotor_diameter ** 1.9637 )
+        self.d_hvac_cost_d_rating = esc.compute('IPPI_HYD') * 12.0
+        self.d_cover_cost_d_rating = esc.compute('IPPI_NAC') * 11.537
+
+        self.d_mainframe_cost_d_r_diameter = mainFrameCostEsc * (1.7 * mfmCostCoeff * mfmCostExp * self.rotor_diameter ** (mfmCostExp-1) + \
                                                                 8.7 * self.d_mainframe_mass_d_r_diameter * (0.125/1.125))
         self.d_mainframe_cost_d_r_mass = mainFrameCostEsc * 8.7 * self.d_mainframe_mass_d_r_mass * (0.125/1.125)
         self.d_mainframe_cost_d_r_thrust = mainFrameCostEsc * 8.7 * self.d_mainframe_mass_d_r_thrust * (0.125/1.125)
         self.d_mainframe_cost_d_r_torque = mainFrameCostEsc * 8.7 * self.d_mainframe_mass_d_r_torque * (0.125/1.125)
 
-        # overall system cost  
-        self.nacelle_cost = self.lowSpeedShaft_cost + \
-                    self.bearings_cost + \
-                    self.gearbox_cost + \
-                    self.mechanicalBrakes_cost + \
-                    self.generator_cost + \
-                    self.VSElectronics_cost + \
-                    self.yawSystem_cost + \
-                    self.mainframeTotal_cost + \
-                    self.electronicCabling_cost + \
-                    self.HVAC_cost + \
-                    self.nacelleCover_cost + \
-                    self.controls_cost
-
         self.d_nacelle_cost_d_r_diameter = self.d_lss_cost_d_r_diameter + self.d_bearings_cost_d_r_diameter + self.d_yaw_cost_d_r_diameter + self.d_mainframe_cost_d_r_diameter
         self.d_nacelle_cost_d_r_mass = self.d_mainframe_cost_d_r_mass
         self.d_nacelle_cost_d_r_thrust = self.d_mainframe_cost_d_r_thrust
@@ -954,6 +1469,42 @@ class nacelle_csm(object):
         return self.J
 
 
+def compare_drivetrains(aero_power, machine_rating, rotor_torque, drivetrain_types='all', year=2009, month=12, ppi_context=None):
+    """
+    power after drivetrain losses and gearbox and generator masses and costs of several drivetrain types in one call
+
+    Parameters
+    ----------
+    aero_power : array
+       power curve(s) before drivetrain losses [kW], e.g. aero_csm.power_curve
+    machine_rating : float or array
+       machine rated power [kW]
+    rotor_torque : float or array
+       torque from rotor at rated power [N*m], e.g. aero_csm.rotor_torque
+    drivetrain_types : str or sequence of str
+       drivetrain types from DRIVETRAIN_TYPES ('multi-drive' is accepted for 'multi_drive'), or 'all'
+    year, month : int
+       project start date for the cost escalators
+    ppi_context : PPIContext
+       escalators, default is the global ppi
+
+    Returns
+    -------
+    drivetrains : dict
+      for each DRIVETRAIN_TYPES name a dict of 'power' (drivetrain_csm.compute_types), 'gearbox_mass', 'gearbox_cost',
+      'generator_mass' and 'generator_cost' (nacelle_csm.compute_drivetrains)
+    """
+
+    power = drivetrain_csm().compute_types(aero_power, machine_rating, drivetrain_types)
+    nacelle = nacelle_csm(ppi_context)
+    nacelle.compute_drivetrains(rotor_torque, machine_rating, drivetrain_types, year, month)
+
+    return dict((name, {'power': power[i],
+                        'gearbox_mass': nacelle.gearbox_mass_types[i], 'gearbox_cost': nacelle.gearbox_cost_types[i],
+                        'generator_mass': nacelle.generator_mass_types[i], 'generator_cost': nacelle.generator_cost_types[i]})
+                for i, name in enumerate(nacelle.drivetrain_types))
+
+
 ##### Tower
 
 class tower_csm(object):
@@ -961,12 +1512,14 @@ class tower_csm(object):
        object to wrap python code for NREL cost and scaling model for a wind turbine tower
     """
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
         """
         OpenMDAO object to wrap tower model based of the NREL _cost and Scaling Model data (csmTower.py).     
         """        
         super(tower_csm, self).__init__()
 
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
+
         # Outputs 
         self.tower_cost = 0.0 # Float(0.0, units='USD', iotype='out', desc='cost for a tower')
         self.tower_mass = 0.0 # Float(0.0, units='kg', iotype='out', desc='mass for a turbine tower')
@@ -994,11 +1547,10 @@ class tower_csm(object):
 
         self.tower_mass = windpactMassSlope * np.pi * (self.rotor_diameter/2.)**2 * self.hub_height + windpactMassInt
 
-        ppi.curr_yr = curr_yr
-        ppi.curr_mon = curr_mon
+        esc = _ppi_context(self.ppi_context).replace(curr_yr=curr_yr, curr_mon=curr_mon)
 
         twrCostEscalator  = 1.5944
-        twrCostEscalator  = ppi.compute('IPPI_TWR')
+        twrCostEscalator  = esc.compute('IPPI_TWR')
         twrCostCoeff      = 1.5 # $/kg    
 
         self.towerCost2002 = self.tower_mass * twrCostCoeff               
@@ -1080,6 +1632,9 @@ class turbine_csm(object):
                 blade_number=3, offshore=True):
         """
         compute Turbine Capital _costs Model of the NREL _cost and Scaling Model.
+
+        offshore may be a boolean array matching the other inputs (see tcc_csm.compute_batch), in which case
+        the offshore transportation factor and the cost derivatives are applied per design.
         """
 
         # Variables    
@@ -1102,8 +1657,11 @@ class turbine_csm(object):
         self.turbine_mass = self.rotor_mass + self.nacelle_mass + self.tower_mass
         self.turbine_cost = self.rotor_cost + self.nacelle_cost + self.tower_cost
 
-        if self.offshore:
-            self.turbine_cost *= 1.1
+        # offshore transportation adder
+        offshore_factor = np.where(self.offshore, 1.1, 1.0)
+        if offshore_factor.ndim == 0:
+            offshore_factor = float(offshore_factor)
+        self.turbine_cost = self.turbine_cost * offshore_factor
    
         # derivatives     
         self.d_mass_d_blade_mass = self.blade_number
@@ -1111,16 +1669,10 @@ class turbine_csm(object):
         self.d_mass_d_nacelle_mass = 1.0
         self.d_mass_d_tower_mass = 1.0
         
-        if self.offshore:
-            self.d_cost_d_blade_cost = 1.1 * self.blade_number
-            self.d_cost_d_hub_cost = 1.1
-            self.d_cost_d_nacelle_cost = 1.1
-            self.d_cost_d_tower_cost = 1.1
-        else:
-            self.d_cost_d_blade_cost = self.blade_number
-            self.d_cost_d_hub_cost = 1.0
-            self.d_cost_d_nacelle_cost = 1.0
-            self.d_cost_d_tower_cost = 1.0
+        self.d_cost_d_blade_cost = offshore_factor * self.blade_number
+        self.d_cost_d_hub_cost = offshore_factor
+        self.d_cost_d_nacelle_cost = offshore_factor
+        self.d_cost_d_tower_cost = offshore_factor
 
     def list_deriv_vars(self):
 
@@ -1139,17 +1691,37 @@ class turbine_csm(object):
         return self.J
 
 # --------------------------------------------------------------------
+
+# (component, attribute) of every mass and cost in the tcc_csm breakdown
+TCC_OUTPUTS = [('blade', 'blade_mass'), ('blade', 'blade_cost'),
+               ('hub', 'hub_mass'), ('hub', 'hub_cost'), ('hub', 'pitch_system_mass'), ('hub', 'pitch_system_cost'),
+               ('hub', 'spinner_mass'), ('hub', 'spinner_cost'), ('hub', 'hub_system_mass'), ('hub', 'hub_system_cost'),
+               ('turbine', 'rotor_mass'), ('turbine', 'rotor_cost')] + \
+              [('nacelle', part + suffix) for part in NACELLE_PARTS for suffix in ('_mass', '_cost')] + \
+              [('tower', 'tower_mass'), ('tower', 'tower_cost'), ('turbine', 'turbine_mass'), ('turbine', 'turbine_cost')]
+
 class tcc_csm(object):
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
 
         super(tcc_csm, self).__init__()  # will actually run the workflow
 
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
+
+        # sub-components, reused by every compute call
+        self.blade = blades_csm(ppi_context)
+        self.hub = hub_csm(ppi_context)
+        self.rotor = rotor_mass_adder()
+        self.nacelle = nacelle_csm(ppi_context)
+        self.tower = tower_csm(ppi_context)
+        self.turbine = turbine_csm()
+
         # Outputs
         self.turbine_cost = 0.0 # Float(0.0, iotype='out', desc='Overall wind turbine capial costs including transportation costs')
         self.rotor_cost = 0.0 # Float(0.0, iotype='out', desc='Rotor cost')
         self.nacelle_cost = 0.0 # Float(0.0, iotype='out', desc='Nacelle cost')
         self.tower_cost = 0.0 # Float(0.0, iotype='out', desc='Tower cost')
+        self.breakdown = {} # dict of every mass and cost in TCC_OUTPUTS from compute_batch
 
     def compute(self, rotor_diameter, machine_rating, hub_height, rotor_thrust, rotor_torque, \
                 year=2009, month=12, blade_number=3, offshore=True, advanced_blade=False, drivetrain_design='geared', \
@@ -1168,43 +1740,179 @@ class tcc_csm(object):
         self.blade_number = blade_number #Int(3, iotype='in', desc = 'number of rotor blades')
         self.offshore = offshore #Bool(True, iotype='in', desc = 'boolean for offshore')
         self.advanced_blade = advanced_blade #Bool(False, iotype='in', desc = 'boolean for use of advanced blade curve')
-        self.drivetrain_design = drivetrain_design #Enum('geared', ('geared', 'single_stage', 'multi_drive', 'pm_direct_drive'), iotype='in')
+        self.drivetrain_design = drivetrain_design #Enum('geared', ('geared', 'single_stage', 'multi_drive', 'pm_direct_drive'), iotype='in') - 'multi-drive' is also accepted
         self.crane = crane #Bool(True, iotype='in', desc = 'boolean for presence of a service crane up tower')
         self.advanced_bedplate = advanced_bedplate #Int(0, iotype='in', desc= 'indicator for drivetrain bedplate design 0 - conventional')   
         self.advanced_tower = advanced_tower #Bool(False, iotype='in', desc = 'advanced tower configuration')
 
-        blade = blades_csm()
+        blade = self.blade
         blade.compute(rotor_diameter, year, month, advanced_blade)
 
-        hub = hub_csm()
+        hub = self.hub
         hub.compute(rotor_diameter, blade.blade_mass, year, month, blade_number)
         
-        rotor = rotor_mass_adder()
+        rotor = self.rotor
         rotor.compute(blade.blade_mass, hub.hub_system_mass, blade_number)
         
-        nacelle = nacelle_csm()
+        nacelle = self.nacelle
         nacelle.compute(rotor_diameter, rotor.rotor_mass, rotor_thrust, rotor_torque, machine_rating, \
                         drivetrain_design, crane, advanced_bedplate, year, month, offshore)
         
-        tower = tower_csm()
+        tower = self.tower
         tower.compute(rotor_diameter, hub_height, year, month, advanced_tower)
         
-        turbine = turbine_csm()
+        turbine = self.turbine
         turbine.compute(blade.blade_cost, blade.blade_mass, hub.hub_system_cost, hub.hub_system_mass, \
                         nacelle.nacelle_mass, nacelle.nacelle_cost, tower.tower_cost, tower.tower_mass, \
                         blade_number, offshore)
         
         self.rotor_cost = turbine.rotor_cost
         self.rotor_mass = turbine.rotor_mass
+        self.nacelle_cost = nacelle.nacelle_cost
+        self.tower_cost = tower.tower_cost
+        self.turbine_cost = turbine.turbine_cost
+        self.turbine_mass = turbine.turbine_mass
+
+    def compute_batch(self, rotor_diameter, machine_rating, hub_height, rotor_thrust, rotor_torque, \
+                      year=2009, month=12, blade_number=3, offshore=True, advanced_blade=False, drivetrain_design='geared', \
+                      crane=True, advanced_bedplate=0, advanced_tower=False):
+        """
+        Batched version of compute for arrays of turbine designs.
+
+        rotor_diameter, machine_rating, hub_height, rotor_thrust and rotor_torque are arrays of any (broadcast
+        compatible) shape.  offshore, drivetrain_design, crane and advanced_bedplate may be arrays as well (see
+        nacelle_csm.compute_batch); the other options are shared by all designs.  The blade, hub, rotor, nacelle,
+        tower and turbine models are evaluated once on the whole arrays, with each escalator computed once per call.
+
+        Returns
+        -------
+        breakdown : dict
+          every mass [kg] and cost [USD] of TCC_OUTPUTS by attribute name, as arrays of the design shape
+        """
+
+        inputs = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in \
+                     (rotor_diameter, machine_rating, hub_height, rotor_thrust, rotor_torque)])
+        rotor_diameter, machine_rating, hub_height, rotor_thrust, rotor_torque = inputs
+        offshore = np.asarray(offshore, dtype=bool)
+
+        self.blade.compute(rotor_diameter, year, month, advanced_blade)
+        self.hub.compute(rotor_diameter, self.blade.blade_mass, year, month, blade_number)
+        self.rotor.compute(self.blade.blade_mass, self.hub.hub_system_mass, blade_number)
+        self.nacelle.compute_batch(rotor_diameter, self.rotor.rotor_mass, rotor_thrust, rotor_torque, machine_rating, \
+                                   drivetrain_design, crane, advanced_bedplate, year, month, offshore)
+        self.tower.compute(rotor_diameter, hub_height, year, month, advanced_tower)
+
+        # offshore transportation adder applied per design
+        turbine = self.turbine
+        turbine.compute(self.blade.blade_cost, self.blade.blade_mass, self.hub.hub_system_cost, self.hub.hub_system_mass, \
+                        self.nacelle.nacelle_mass, self.nacelle.nacelle_cost, self.tower.tower_cost, self.tower.tower_mass, \
+                        blade_number, offshore)
+
+        self.rotor_cost = turbine.rotor_cost
+        self.rotor_mass = turbine.rotor_mass
+        self.nacelle_cost = self.nacelle.nacelle_cost
+        self.tower_cost = self.tower.tower_cost
         self.turbine_cost = turbine.turbine_cost
         self.turbine_mass = turbine.turbine_mass
 
+        shape = np.broadcast(inputs[0], self.nacelle.breakdown, offshore).shape
+        self.breakdown = dict((name, np.array(np.broadcast_to(getattr(getattr(self, component), name), shape))) \
+                              for component, name in TCC_OUTPUTS)
+        return self.breakdown
+
 # Balance of System Costs
 ################################################## 
 
+# the eight bos_breakdown outputs of bos_csm
+BOS_BREAKDOWN = ('bos_breakdown_development_costs', 'bos_breakdown_preparation_and_staging_costs',
+                 'bos_breakdown_transportation_costs', 'bos_breakdown_foundation_and_substructure_costs',
+                 'bos_breakdown_electrical_costs', 'bos_breakdown_assembly_and_installation_costs',
+                 'bos_breakdown_soft_costs', 'bos_breakdown_other_costs')
+
+def bos_depth_class(sea_depth):
+    """type of plant for bos_csm: 1 land (sea_depth 0), 2 shallow (< 30 m), 3 transitional (< 60 m), 4 deep water"""
+
+    sea_depth = np.asarray(sea_depth)
+    return np.where(sea_depth == 0, 1, np.where(sea_depth < 30, 2, np.where(sea_depth < 60, 3, 4)))
+
+# bos_csm cost factors, shared by compute and compute_batch
+# land plants: (quadratic, linear, constant) fits in machine rating [kW] and power laws (coefficient, exponent)
+BOS_LAND_FOUNDATION = (303.23, 0.4037)             # on hub height * swept area
+BOS_LAND_PERMITS = (9.94E-04, 20.31)               # quadratic and linear, engineering and permits
+BOS_LAND_ELECTRICAL = (3.49E-06, -0.0221, 109.7)   # $/kW
+BOS_LAND_ROADS_CIVIL = (2.17E-06, -0.0145, 69.54)  # $/kW
+BOS_LAND_INSTALLATION = (1.965, 1.1736)            # on hub height * rotor diameter
+BOS_TRANSPORTATION = (0.00001581, -0.0375, 54.7)   # $/kW, land and offshore shallow
+# offshore plants, $/kW (2003) unless noted
+BOS_SHALLOW_FOUNDATION = 300.0
+BOS_TRANSITIONAL_FOUNDATION = 450.0
+BOS_OFFSHORE_PERMITS = 37.0
+BOS_SCOUR = 55.0
+BOS_PORT_STAGING = 20.0
+BOS_SHALLOW_ELECTRICAL = 260.0
+BOS_TRANSITIONAL_ELECTRICAL = 290.0
+BOS_SUPPORT_TRANSPORT = 25.0        # transitional
+BOS_TURBINE_TRANSPORT = 77.0        # transitional
+BOS_OFFSHORE_INSTALLATION = 100.0   # shallow & transitional
+BOS_SUPPORT_INSTALLATION = 330.0    # transitional additional
+BOS_PERSONNEL_ACCESS = 60000.0      # $ per turbine
+BOS_SURETY_RATE = 0.03              # surety bond, 3% of ICC
+
+# escalators of the bos_csm and opex_csm formulas for land and offshore plants, with their reference (yr, mon);
+# None keeps the reference date of the escalation context
+PLANT_ESCALATORS = {
+    False : {'IPPI_FND' : (2002, 9), 'IPPI_LPM' : (2002, 3), 'IPPI_LEL' : (2002, 9), 'IPPI_RDC' : (2002, 9),
+             'IPPI_LAI' : (2002, 9), 'IPPI_TPT' : (2002, 9),
+             'IPPI_LOM' : (None, None), 'IPPI_LLR' : (None, None), 'IPPI_LSE' : (None, None)},
+    True :  {'IPPI_MPF' : (2003, 9), 'IPPI_OAI' : (2003, 9), 'IPPI_PAE' : (2003, 9), 'IPPI_STP' : (2003, 9),
+             'IPPI_OPM' : (2003, 9), 'IPPI_OEL' : (2003, 9), 'IPPI_TPT' : (2002, 9),
+             'IPPI_OOM' : (2003, None), 'IPPI_OLR' : (2003, None), 'IPPI_LSE' : (None, None)},
+}
+
+def escalation_bundle(year, month, offshore, ppi_context=None):
+    """
+    Resolved cost escalators of the BOS and OPEX formulas for one project start date and plant class
+
+    Each bundle is computed once per (year, month, land / offshore, reference date of the context) and then
+    shared by every bos_csm and opex_csm evaluation with the same keys.  Bundles are kept in the bundles cache
+    of the context's PPI object, so they are dropped with its escalators when the tables are reloaded or
+    recompiled and counted under 'bundles' in its cache_info().
+
+    Parameters
+    ----------
+    year, month : int
+       project start date
+    offshore : bool
+       offshore (any sea_depth other than 0) or land plant
+    ppi_context : PPIContext
+       escalation context, default the global ppi; only its PPI and reference date are used
+
+    Returns
+    -------
+    escalators : dict
+      escalator by code (PLANT_ESCALATORS), each referenced to its own date.  The dict is shared and must not
+      be modified.
+    """
+
+    base = _ppi_context(ppi_context).replace(curr_yr=year, curr_mon=month)
+    offshore = bool(offshore)
+    key = (base.ref_yr, base.ref_mon, year, month, offshore)
+
+    escalators = base.ppi.bundles.get(key)
+    if escalators is None:
+        escalators = {}
+        for code, (ref_yr, ref_mon) in PLANT_ESCALATORS[offshore].items():
+            esc = base.replace(ref_yr=base.ref_yr if ref_yr is None else ref_yr, \
+                               ref_mon=base.ref_mon if ref_mon is None else ref_mon)
+            escalators[code] = esc.compute(code)
+        base.ppi.bundles.put(key, escalators)
+    return escalators
+
 class bos_csm(object):
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
+
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
 
         # Outputs
         #bos_breakdown = VarTree(BOSVarTree(), iotype='out', desc='BOS cost breakdown')
@@ -1220,6 +1928,11 @@ class bos_csm(object):
         self.bos_breakdown_other_costs = 0.0 # (pai_costs + scour_costs + suretyBond) * self.turbine_number
 
     def compute(self, machine_rating, rotor_diameter, hub_height, RNA_mass, turbine_cost, turbine_number = 100, sea_depth = 20.0, year = 2009, month=12, multiplier = 1.0):
+        """
+        compute BOS costs of the NREL _cost and Scaling Model.
+
+        The costs come from compute_batch for a single plant; only the derivatives are computed here.
+        """
 
         # for coding ease
         # Default Variables
@@ -1236,82 +1949,26 @@ class bos_csm(object):
         self.month = month #Int(12, iotype = 'in', desc= 'month for project start')
         self.multiplier = multiplier #Float(1.0, iotype='in')
 
-        lPrmtsCostCoeff1 = 9.94E-04
-        lPrmtsCostCoeff2 = 20.31
-        oPrmtsCostFactor = 37.0 # $/kW (2003)
-        scourCostFactor =  55.0 # $/kW (2003)
-        ptstgCostFactor =  20.0 # $/kW (2003)
-        ossElCostFactor = 260.0 # $/kW (2003) shallow
-        ostElCostFactor = 290.0 # $/kW (2003) transitional
-        ostSTransFactor  =  25.0 # $/kW (2003)
-        ostTTransFactor  =  77.0 # $/kW (2003)
-        osInstallFactor  = 100.0 # $/kW (2003) shallow & trans
-        suppInstallFactor = 330.0 # $/kW (2003) trans additional
-        paiCost         = 60000.0 # per turbine
-
-        suretyBRate     = 0.03  # 3% of ICC
-        suretyBond      = 0.0
-
-        #set variables
-        if self.sea_depth == 0:            # type of plant # 1: Land, 2: < 30m, 3: < 60m, 4: >= 60m
-            iDepth = 1
-        elif self.sea_depth < 30:
-            iDepth = 2
-        elif self.sea_depth < 60:
-            iDepth = 3
-        else:
-            iDepth = 4
+        iDepth = int(bos_depth_class(self.sea_depth)) # type of plant # 1: Land, 2: < 30m, 3: < 60m, 4: >= 60m
+        if (iDepth == 4):  # offshore deep
+            print("\ncsmBOS: Add costCat 4 code\n\n")
 
-        # initialize self.ppi index calculator
-        if iDepth == 1:
-            ref_yr  = 2002
-            ref_mon =    9
-        else:
-            ref_yr = 2003
-            ref_mon = 9
-        ppi.ref_yr = ref_yr
-        ppi.ref_mon = ref_mon
-        ppi.curr_yr = self.year
-        ppi.curr_mon = self.month
+        breakdown = self.compute_batch(self.machine_rating, self.rotor_diameter, self.hub_height, self.turbine_cost, \
+                                       self.turbine_number, self.sea_depth, self.year, self.month, self.multiplier)
+        self.bos_costs = float(self.bos_costs)
+        for name in BOS_BREAKDOWN:
+            setattr(self, name, float(breakdown[name]))
+
+        # escalators, each with its own reference date
+        esc = escalation_bundle(self.year, self.month, iDepth != 1, self.ppi_context)
+
+        # derivatives
+        r = self.machine_rating
+        tpC1, tpC2, tpInt = BOS_TRANSPORTATION
 
         self.d_foundation_d_diameter = 0.0
         self.d_foundation_d_hheight = 0.0
         self.d_foundation_d_rating = 0.0
-        # foundation costs
-        if (iDepth == 1): # land
-            fcCoeff = 303.23
-            fcExp   = 0.4037
-            SweptArea = (self.rotor_diameter*0.5)**2.0 * np.pi
-            foundation_cost = fcCoeff * (self.hub_height*SweptArea)**fcExp
-            fndnCostEscalator = ppi.compute('IPPI_FND')
-            self.d_foundation_d_diameter = fndnCostEscalator * fcCoeff * fcExp * ((self.hub_height*(2.0 * 0.5 * (self.rotor_diameter * 0.5) * np.pi))**(fcExp-1)) * self.hub_height
-            self.d_foundation_d_hheight = fndnCostEscalator * fcCoeff * fcExp * ((self.hub_height*SweptArea)**(fcExp-1)) * SweptArea
-        elif (iDepth == 2):
-            sscf = 300.0 # $/kW
-            foundation_cost = sscf*self.machine_rating
-            fndnCostEscalator = ppi.compute('IPPI_MPF')
-            self.d_foundation_d_rating = fndnCostEscalator * sscf
-        elif (iDepth == 3):
-            sscf = 450.0 # $/kW
-            foundation_cost = sscf*self.machine_rating
-            fndnCostEscalator = ppi.compute('IPPI_OAI')
-            self.d_foundation_d_rating = fndnCostEscalator * sscf
-        elif (iDepth == 4):
-            foundation_cost = 0.0
-            fndnCostEscalator = 1.0
-
-        foundation_cost *= fndnCostEscalator
-
-        # cost calculations
-        tpC1  =0.00001581
-        tpC2  =-0.0375
-        tpInt =54.7
-        tFact = tpC1*self.machine_rating*self.machine_rating + tpC2*self.machine_rating + tpInt
-
-        roadsCivil_costs = 0.0
-        portStaging_costs = 0.0
-        pai_costs = 0.0
-        scour_costs = 0.0
         self.d_assembly_d_diameter = 0.0
         self.d_assembly_d_hheight = 0.0
         self.d_development_d_rating = 0.0
@@ -1320,118 +1977,52 @@ class bos_csm(object):
         self.d_electrical_d_rating = 0.0
         self.d_assembly_d_rating = 0.0
         self.d_other_d_rating = 0.0
-        if (iDepth == 1):
-            engPermits_costs  = (lPrmtsCostCoeff1 * self.machine_rating * self.machine_rating) + \
-                               (lPrmtsCostCoeff2 * self.machine_rating)
-            ppi.ref_mon = 3
-            engPermits_costs *= ppi.compute('IPPI_LPM')
-            self.d_development_d_rating = ppi.compute('IPPI_LPM') * (2.0 * lPrmtsCostCoeff1 * self.machine_rating + lPrmtsCostCoeff2)
-            ppi.ref_mon = 9
-
-            elC1  = 3.49E-06
-            elC2  = -0.0221
-            elInt = 109.7
-            eFact = elC1*self.machine_rating*self.machine_rating + elC2*self.machine_rating + elInt
-            electrical_costs = self.machine_rating * eFact * ppi.compute('IPPI_LEL')
-            self.d_electrical_d_rating = ppi.compute('IPPI_LEL') * (3. * elC1*self.machine_rating**2. + \
-                                    2. * elC2*self.machine_rating + elInt)
-
-            rcC1  = 2.17E-06
-            rcC2  = -0.0145
-            rcInt =69.54
-            rFact = rcC1*self.machine_rating*self.machine_rating + rcC2*self.machine_rating + rcInt
-            roadsCivil_costs = self.machine_rating * rFact * ppi.compute('IPPI_RDC')
-            self.d_preparation_d_rating = ppi.compute('IPPI_RDC') * (3. * rcC1 * self.machine_rating**2. + \
-                                     2. * rcC2 * self.machine_rating + rcInt)
-
-            iCoeff = 1.965
-            iExp   = 1.1736
-            installation_costs = iCoeff * ((self.hub_height*self.rotor_diameter)**iExp) * ppi.compute('IPPI_LAI')
-            self.d_assembly_d_diameter = iCoeff * ((self.hub_height*self.rotor_diameter)**(iExp-1)) * self.hub_height * ppi.compute('IPPI_LAI')
-            self.d_assembly_d_hheight = iCoeff * ((self.hub_height*self.rotor_diameter)**(iExp-1)) * self.rotor_diameter * ppi.compute('IPPI_LAI')
-
-            transportation_costs = self.machine_rating * tFact * ppi.compute('IPPI_TPT')
-            self.d_transport_d_rating = ppi.compute('IPPI_TPT') * (tpC1* 3. * self.machine_rating**2. + \
-                                   tpC2* 2. * self.machine_rating + tpInt )
+        if (iDepth == 1): # land
+            fcCoeff, fcExp = BOS_LAND_FOUNDATION
+            SweptArea = (self.rotor_diameter*0.5)**2.0 * np.pi
+            self.d_foundation_d_diameter = esc['IPPI_FND'] * fcCoeff * fcExp * ((self.hub_height*(2.0 * 0.5 * (self.rotor_diameter * 0.5) * np.pi))**(fcExp-1)) * self.hub_height
+            self.d_foundation_d_hheight = esc['IPPI_FND'] * fcCoeff * fcExp * ((self.hub_height*SweptArea)**(fcExp-1)) * SweptArea
+
+            lPrmtsCostCoeff1, lPrmtsCostCoeff2 = BOS_LAND_PERMITS
+            self.d_development_d_rating = esc['IPPI_LPM'] * (2.0 * lPrmtsCostCoeff1 * r + lPrmtsCostCoeff2)
+
+            elC1, elC2, elInt = BOS_LAND_ELECTRICAL
+            self.d_electrical_d_rating = esc['IPPI_LEL'] * (3. * elC1*r**2. + 2. * elC2*r + elInt)
+
+            rcC1, rcC2, rcInt = BOS_LAND_ROADS_CIVIL
+            self.d_preparation_d_rating = esc['IPPI_RDC'] * (3. * rcC1 * r**2. + 2. * rcC2 * r + rcInt)
+
+            iCoeff, iExp = BOS_LAND_INSTALLATION
+            self.d_assembly_d_diameter = iCoeff * ((self.hub_height*self.rotor_diameter)**(iExp-1)) * self.hub_height * esc['IPPI_LAI']
+            self.d_assembly_d_hheight = iCoeff * ((self.hub_height*self.rotor_diameter)**(iExp-1)) * self.rotor_diameter * esc['IPPI_LAI']
+
+            self.d_transport_d_rating = esc['IPPI_TPT'] * (tpC1* 3. * r**2. + tpC2* 2. * r + tpInt )
 
         elif (iDepth == 2):  # offshore shallow
-            ppi.ref_yr = 2003
-            pai_costs            = paiCost * ppi.compute('IPPI_PAE')
-            portStaging_costs    = ptstgCostFactor  * self.machine_rating * ppi.compute('IPPI_STP') # 1.415538133
-            self.d_preparation_d_rating = ptstgCostFactor * ppi.compute('IPPI_STP')
-            engPermits_costs     = oPrmtsCostFactor * self.machine_rating * ppi.compute('IPPI_OPM')
-            self.d_development_d_rating = oPrmtsCostFactor * ppi.compute('IPPI_OPM')
-            scour_costs         = scourCostFactor  * self.machine_rating * ppi.compute('IPPI_STP') # 1.415538133#
-            self.d_other_d_rating = scourCostFactor  * ppi.compute('IPPI_STP')
-            installation_costs   = osInstallFactor  * self.machine_rating * ppi.compute('IPPI_OAI')
-            self.d_assembly_d_rating = osInstallFactor * ppi.compute('IPPI_OAI')
-            electrical_costs     = ossElCostFactor  * self.machine_rating * ppi.compute('IPPI_OEL')
-            self.d_electrical_d_rating = ossElCostFactor  * ppi.compute('IPPI_OEL')
-            ppi.ref_yr  = 2002
-            transportation_costs = self.machine_rating * tFact * ppi.compute('IPPI_TPT')
-            self.d_transport_d_rating = ppi.compute('IPPI_TPT') * (tpC1* 3. * self.machine_rating**2. + \
-                                   tpC2* 2. * self.machine_rating + tpInt )
-            ppi.ref_yr = 2003
+            self.d_foundation_d_rating = esc['IPPI_MPF'] * BOS_SHALLOW_FOUNDATION
+            self.d_preparation_d_rating = BOS_PORT_STAGING * esc['IPPI_STP']
+            self.d_development_d_rating = BOS_OFFSHORE_PERMITS * esc['IPPI_OPM']
+            self.d_other_d_rating = BOS_SCOUR * esc['IPPI_STP']
+            self.d_assembly_d_rating = BOS_OFFSHORE_INSTALLATION * esc['IPPI_OAI']
+            self.d_electrical_d_rating = BOS_SHALLOW_ELECTRICAL * esc['IPPI_OEL']
+            self.d_transport_d_rating = esc['IPPI_TPT'] * (tpC1* 3. * r**2. + tpC2* 2. * r + tpInt )
 
         elif (iDepth == 3):  # offshore transitional depth
-            ppi.ref_yr = 2003
-            turbInstall   = osInstallFactor  * self.machine_rating * ppi.compute('IPPI_OAI')
-            supportInstall = suppInstallFactor * self.machine_rating * ppi.compute('IPPI_OAI')
-            installation_costs = turbInstall + supportInstall
-            self.d_assembly_d_rating = (osInstallFactor + suppInstallFactor) * ppi.compute('IPPI_OAI')
-            pai_costs          = paiCost                          * ppi.compute('IPPI_PAE')
-            electrical_costs     = ostElCostFactor  * self.machine_rating * ppi.compute('IPPI_OEL')
-            self.d_electrical_d_rating = ossElCostFactor  * ppi.compute('IPPI_OEL')
-            portStaging_costs   = ptstgCostFactor  * self.machine_rating * ppi.compute('IPPI_STP')
-            self.d_preparation_d_rating = ptstgCostFactor * ppi.compute('IPPI_STP')
-            engPermits_costs     = oPrmtsCostFactor * self.machine_rating * ppi.compute('IPPI_OPM')
-            self.d_development_d_rating = oPrmtsCostFactor * ppi.compute('IPPI_OPM')
-            scour_costs          = scourCostFactor  * self.machine_rating * ppi.compute('IPPI_STP')
-            self.d_other_d_rating = scourCostFactor * ppi.compute('IPPI_STP')
-            ppi.ref_yr  = 2002
-            turbTrans           = ostTTransFactor  * self.machine_rating * ppi.compute('IPPI_TPT')
-            self.d_transport_d_rating = ostTTransFactor  * ppi.compute('IPPI_TPT')
-            ppi.ref_yr = 2003
-            supportTrans        = ostSTransFactor  * self.machine_rating * ppi.compute('IPPI_OAI')
-            transportation_costs = turbTrans + supportTrans
-            self.d_transport_d_rating += ostSTransFactor  * ppi.compute('IPPI_OAI')
-
-        elif (iDepth == 4):  # offshore deep
-            print("\ncsmBOS: Add costCat 4 code\n\n")
-
-        bos_costs = foundation_cost + \
-                    transportation_costs + \
-                    roadsCivil_costs    + \
-                    portStaging_costs   + \
-                    installation_costs   + \
-                    electrical_costs     + \
-                    engPermits_costs    + \
-                    pai_costs          + \
-                    scour_costs
+            self.d_foundation_d_rating = esc['IPPI_OAI'] * BOS_TRANSITIONAL_FOUNDATION
+            self.d_assembly_d_rating = (BOS_OFFSHORE_INSTALLATION + BOS_SUPPORT_INSTALLATION) * esc['IPPI_OAI']
+            self.d_electrical_d_rating = BOS_SHALLOW_ELECTRICAL * esc['IPPI_OEL']
+            self.d_preparation_d_rating = BOS_PORT_STAGING * esc['IPPI_STP']
+            self.d_development_d_rating = BOS_OFFSHORE_PERMITS * esc['IPPI_OPM']
+            self.d_other_d_rating = BOS_SCOUR * esc['IPPI_STP']
+            self.d_transport_d_rating = BOS_TURBINE_TRANSPORT * esc['IPPI_TPT'] + BOS_SUPPORT_TRANSPORT * esc['IPPI_OAI']
 
         self.d_other_d_tcc = 0.0
         if (self.sea_depth > 0.0):
-            suretyBond = suretyBRate * (self.turbine_cost + bos_costs)
-            self.d_other_d_tcc = suretyBRate
-            d_surety_d_rating = suretyBRate * (self.d_development_d_rating + self.d_preparation_d_rating + self.d_transport_d_rating + \
+            self.d_other_d_tcc = BOS_SURETY_RATE
+            d_surety_d_rating = BOS_SURETY_RATE * (self.d_development_d_rating + self.d_preparation_d_rating + self.d_transport_d_rating + \
                           self.d_foundation_d_rating + self.d_electrical_d_rating + self.d_assembly_d_rating + self.d_other_d_rating)
             self.d_other_d_rating += d_surety_d_rating
-        else:
-            suretyBond = 0.0
-
-        self.bos_costs = self.turbine_number * (bos_costs + suretyBond)
-        self.bos_costs *= self.multiplier  # TODO: add to gradients
-
-        self.bos_breakdown_development_costs = engPermits_costs * self.turbine_number
-        self.bos_breakdown_preparation_and_staging_costs = (roadsCivil_costs + portStaging_costs) * self.turbine_number
-        self.bos_breakdown_transportation_costs = (transportation_costs * self.turbine_number)
-        self.bos_breakdown_foundation_and_substructure_costs = foundation_cost * self.turbine_number
-        self.bos_breakdown_electrical_costs = electrical_costs * self.turbine_number
-        self.bos_breakdown_assembly_and_installation_costs = installation_costs * self.turbine_number
-        self.bos_breakdown_soft_costs = 0.0
-        self.bos_breakdown_other_costs = (pai_costs + scour_costs + suretyBond) * self.turbine_number
 
-        # derivatives
         self.d_development_d_rating *= self.turbine_number
         self.d_preparation_d_rating *= self.turbine_number
         self.d_transport_d_rating *= self.turbine_number
@@ -1492,6 +2083,91 @@ class bos_csm(object):
                           self.d_foundation_d_rna + self.d_electrical_d_rna + self.d_assembly_d_rna + \
                           self.d_soft_d_rna + self.d_other_d_rna
 
+    def compute_batch(self, machine_rating, rotor_diameter, hub_height, turbine_cost, turbine_number=100, sea_depth=20.0, \
+                      year=2009, month=12, multiplier=1.0):
+        """
+        Batched version of compute for arrays of plants with mixed land, shallow and transitional depth sites.
+
+        machine_rating, rotor_diameter, hub_height, turbine_cost, turbine_number and sea_depth are broadcast
+        against each other.  Each depth class (bos_depth_class) is evaluated on its own cells, with the escalators of
+        the shared escalation_bundle of the project date.  The model has no deep water (>= 60 m) costs, those cells
+        are NaN.
+
+        Returns
+        -------
+        breakdown : dict
+          the BOS_BREAKDOWN costs [USD] by name as arrays of the plant shape; bos_costs and the bos_breakdown
+          outputs are set to the same arrays
+        """
+
+        machine_rating, rotor_diameter, hub_height, turbine_cost, turbine_number, sea_depth = \
+            np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in \
+                                  (machine_rating, rotor_diameter, hub_height, turbine_cost, turbine_number, sea_depth)])
+        depth_class = bos_depth_class(sea_depth)
+
+        # escalators of the land and offshore depth classes
+        land_esc = escalation_bundle(year, month, False, self.ppi_context)
+        offshore_esc = escalation_bundle(year, month, True, self.ppi_context)
+
+        shape = sea_depth.shape
+        engPermits_costs, preparation_costs, transportation_costs, foundation_cost, electrical_costs, \
+            installation_costs, other_costs = [np.full(shape, np.nan) for i in range(7)]
+
+        r = machine_rating
+        tpC1, tpC2, tpInt = BOS_TRANSPORTATION
+        tFact = tpC1*r*r + tpC2*r + tpInt
+
+        m = depth_class == 1 # land
+        fcCoeff, fcExp = BOS_LAND_FOUNDATION
+        lPrmtsCostCoeff1, lPrmtsCostCoeff2 = BOS_LAND_PERMITS
+        elC1, elC2, elInt = BOS_LAND_ELECTRICAL
+        rcC1, rcC2, rcInt = BOS_LAND_ROADS_CIVIL
+        iCoeff, iExp = BOS_LAND_INSTALLATION
+        SweptArea = (rotor_diameter[m]*0.5)**2.0 * np.pi
+        foundation_cost[m] = fcCoeff * (hub_height[m]*SweptArea)**fcExp * land_esc['IPPI_FND']
+        engPermits_costs[m] = ((lPrmtsCostCoeff1 * r[m] * r[m]) + (lPrmtsCostCoeff2 * r[m])) * land_esc['IPPI_LPM']
+        electrical_costs[m] = r[m] * (elC1*r[m]*r[m] + elC2*r[m] + elInt) * land_esc['IPPI_LEL']
+        preparation_costs[m] = r[m] * (rcC1*r[m]*r[m] + rcC2*r[m] + rcInt) * land_esc['IPPI_RDC']
+        installation_costs[m] = iCoeff * ((hub_height[m]*rotor_diameter[m])**iExp) * land_esc['IPPI_LAI']
+        transportation_costs[m] = r[m] * tFact[m] * land_esc['IPPI_TPT']
+        other_costs[m] = 0.0
+
+        m = depth_class == 2 # offshore shallow
+        foundation_cost[m] = BOS_SHALLOW_FOUNDATION * r[m] * offshore_esc['IPPI_MPF']
+        transportation_costs[m] = r[m] * tFact[m] * offshore_esc['IPPI_TPT']
+        installation_costs[m] = BOS_OFFSHORE_INSTALLATION * r[m] * offshore_esc['IPPI_OAI']
+        electrical_costs[m] = BOS_SHALLOW_ELECTRICAL * r[m] * offshore_esc['IPPI_OEL']
+
+        m = depth_class == 3 # offshore transitional depth
+        foundation_cost[m] = BOS_TRANSITIONAL_FOUNDATION * r[m] * offshore_esc['IPPI_OAI']
+        transportation_costs[m] = BOS_TURBINE_TRANSPORT * r[m] * offshore_esc['IPPI_TPT'] + \
+                                  BOS_SUPPORT_TRANSPORT * r[m] * offshore_esc['IPPI_OAI']
+        installation_costs[m] = BOS_OFFSHORE_INSTALLATION * r[m] * offshore_esc['IPPI_OAI'] + \
+                                BOS_SUPPORT_INSTALLATION * r[m] * offshore_esc['IPPI_OAI']
+        electrical_costs[m] = BOS_TRANSITIONAL_ELECTRICAL * r[m] * offshore_esc['IPPI_OEL']
+
+        m = (depth_class == 2) | (depth_class == 3) # both offshore classes
+        preparation_costs[m] = BOS_PORT_STAGING * r[m] * offshore_esc['IPPI_STP']
+        engPermits_costs[m] = BOS_OFFSHORE_PERMITS * r[m] * offshore_esc['IPPI_OPM']
+        other_costs[m] = BOS_PERSONNEL_ACCESS * offshore_esc['IPPI_PAE'] + BOS_SCOUR * r[m] * offshore_esc['IPPI_STP']
+
+        bos_costs = foundation_cost + transportation_costs + preparation_costs + installation_costs + \
+                    electrical_costs + engPermits_costs + other_costs
+        suretyBond = np.where(sea_depth > 0.0, BOS_SURETY_RATE * (turbine_cost + bos_costs), 0.0)
+
+        self.bos_costs = turbine_number * (bos_costs + suretyBond) * multiplier
+
+        self.bos_breakdown_development_costs = engPermits_costs * turbine_number
+        self.bos_breakdown_preparation_and_staging_costs = preparation_costs * turbine_number
+        self.bos_breakdown_transportation_costs = transportation_costs * turbine_number
+        self.bos_breakdown_foundation_and_substructure_costs = foundation_cost * turbine_number
+        self.bos_breakdown_electrical_costs = electrical_costs * turbine_number
+        self.bos_breakdown_assembly_and_installation_costs = installation_costs * turbine_number
+        self.bos_breakdown_soft_costs = np.where(depth_class == 4, np.nan, 0.0)
+        self.bos_breakdown_other_costs = (other_costs + suretyBond) * turbine_number
+
+        return dict((name, getattr(self, name)) for name in BOS_BREAKDOWN)
+
     def list_deriv_vars(self):
 
         inputs = ['machine_rating', 'rotor_diameter', 'turbine_cost', 'hub_height', 'RNA_mass']
@@ -1522,7 +2198,9 @@ class bos_csm(object):
 class opex_csm(object):
 
 
-    def __init__(self):
+    def __init__(self, ppi_context=None):
+
+        self.ppi_context = ppi_context # PPIContext for the escalators, default is the global ppi
         # variables
 
         # Outputs
@@ -1541,42 +2219,37 @@ class opex_csm(object):
             offshore = False
         else:
             offshore = True
-        ppi.curr_yr = year
-        ppi.curr_mon = month
+        esc = escalation_bundle(year, month, offshore, self.ppi_context)
 
         #O&M
         offshoreCostFactor = 0.0200  # $/kwH
         landCostFactor     = 0.0070  # $/kwH
         if not offshore:  # kld - place for an error check - iShore should be in 1:4
             cost = net_aep * landCostFactor
-            costEscalator = ppi.compute('IPPI_LOM')
+            costEscalator = esc['IPPI_LOM']
         else:
             cost = net_aep * offshoreCostFactor
-            ppi.ref_yr = 2003
-            costEscalator = ppi.compute('IPPI_OOM')
-            ppi.ref_yr = 2002
+            costEscalator = esc['IPPI_OOM']
 
         self.opex_breakdown_preventative_opex = cost * costEscalator # in $/year
 
         #LRC
         if not offshore:
             lrcCF = 10.70 # land based
-            costlrcEscFactor = ppi.compute('IPPI_LLR')
+            costlrcEscFactor = esc['IPPI_LLR']
         else: #TODO: transition and deep water options if applicable
             lrcCF = 17.00 # offshore
-            ppi.ref_yr = 2003
-            costlrcEscFactor = ppi.compute('IPPI_OLR')
-            ppi.ref_yr = 2002
+            costlrcEscFactor = esc['IPPI_OLR']
 
         self.opex_breakdown_corrective_opex = machine_rating * lrcCF * costlrcEscFactor * turbine_number # in $/yr
 
         #LLC
         if not offshore:
             leaseCF = 0.00108 # land based
-            costlandEscFactor = ppi.compute('IPPI_LSE')
+            costlandEscFactor = esc['IPPI_LSE']
         else: #TODO: transition and deep water options if applicable
             leaseCF = 0.00108 # offshore
-            costlandEscFactor = ppi.compute('IPPI_LSE')
+            costlandEscFactor = esc['IPPI_LSE']
 
         self.opex_breakdown_lease_opex = net_aep * leaseCF * costlandEscFactor # in $/yr
 
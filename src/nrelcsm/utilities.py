@@ -8,7 +8,15 @@ Copyright (c) NREL. All rights reserved.
 """
 
 import numpy as np
-from scipy.linalg import solve_banded
+import importlib
+import threading
+from collections import OrderedDict
+
+
+def scipy_module(name):
+    """scipy.<name>, imported on first use so that scipy stays out of the package import time"""
+
+    return importlib.import_module('scipy.' + name)
 
 
 def cosd(value):
@@ -160,7 +168,7 @@ def cubic_with_deriv(x, xp, yp):
     # l[-1] = 0.0
 
     # solve for second derivatives
-    fpp = solve_banded((1, 1), np.matrix([u, d, l]), b)
+    fpp = scipy_module('linalg').solve_banded((1, 1), np.matrix([u, d, l]), b)
     fpp = np.concatenate([[0.0], fpp, [0.0]])  # natural spline
 
     # find location in vector
@@ -310,6 +318,116 @@ def smooth_abs(x, dx=0.01):
 
 
 
+class LRUCache(object):
+    """bounded least-recently-used cache with hit/miss counters.  safe to share between threads"""
+
+    _missing = object()
+
+    def __init__(self, maxsize=1024):
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key, default=None):
+        """return the value cached under key (and mark it recently used), or default.
+        raises TypeError if key is not hashable"""
+
+        with self._lock:
+            value = self._data.pop(key, self._missing)
+            if value is self._missing:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+
+    def put(self, key, value):
+        """cache value under key, evicting the least recently used entries beyond maxsize"""
+
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+    def clear(self):
+        """drop all entries and reset the counters"""
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+    def info(self):
+        """dict of hits, misses, current size and maxsize"""
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+
+class DiagonalJacobian(object):
+    """Jacobian of an elementwise output with respect to a vector input and a few scalar inputs,
+    stored as the diagonal block plus the dense columns of the scalar inputs.
+    Leading axes of diagonal and columns are batch axes"""
+
+    def __init__(self, diagonal, columns):
+
+        self.diagonal = np.asarray(diagonal)  # (..., n)
+        self.columns = np.asarray(columns)  # (..., n, c)
+
+
+    @property
+    def shape(self):
+        n, c = self.columns.shape[-2:]
+        return self.columns.shape[:-2] + (n, n + c)
+
+
+    def dot(self, x):
+        """Jacobian vector product J x, with x (..., n + c)"""
+
+        x = np.asarray(x)
+        n = self.diagonal.shape[-1]
+        return self.diagonal*x[..., :n] + np.einsum('...ij,...j->...i', self.columns, x[..., n:])
+
+
+    def rdot(self, v):
+        """vector Jacobian product v J, with v (..., n)"""
+
+        v = np.asarray(v)
+        return np.concatenate([self.diagonal*v, np.einsum('...i,...ij->...j', v, self.columns)], axis=-1)
+
+
+    def toarray(self):
+        """dense (..., n, n + c) Jacobian"""
+
+        n = self.diagonal.shape[-1]
+        J = np.zeros(self.shape)
+        idx = np.arange(n)
+        J[..., idx, idx] = self.diagonal
+        J[..., n:] = self.columns
+        return J
+
+
+    def __array__(self, dtype=None):
+        J = self.toarray()
+        return J if dtype is None else J.astype(dtype)
+
+
+
 def cubic_spline_eval(x1, x2, f1, f2, g1, g2, x):
 
     spline = CubicSplineSegment(x1, x2, f1, f2, g1, g2)
@@ -0,0 +1,62 @@
+"""
+benchmark_import.py
+
+Cold-start timing of the NREL_CSM package.  Each case runs in a fresh interpreter so nothing is
+shared through sys.modules:
+
+  import      - `import nrelcsm.nrel_csm` only (PPI tables are not read)
+  parse txt   - import plus a regex parse of PPI_Tables.txt, bypassing the .npz cache; the table
+                work the old eager import did on every start
+  first esc   - import plus the first escalator, reading the tables from the .npz cache
+  aep         - import plus one aep_csm evaluation (never touches the PPI tables)
+
+usage: python benchmark_import.py [repeats]
+"""
+
+import os
+import sys
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ('import', "import nrelcsm.nrel_csm"),
+    ('parse txt', "import os, nrelcsm.nrel_csm; from nrelcsm.csmPPI import _parse_ppi_tables; "
+                  "_parse_ppi_tables(os.path.join(nrelcsm.__path__[0], 'static', 'PPI_Tables.txt'))"),
+    ('first esc', "import nrelcsm.nrel_csm as m; m.ppi.compute('IPPI_BLL')"),
+    ('aep', "import nrelcsm.nrel_csm as m; a = m.aep_csm(); "
+            "a.compute(5000., 80., 126., 0.488, 7.525, 3., 25., 90., 0., 0., 0.902, 0.5, 0., 0.1, 0.941, "
+            "100, 0.1, 8.02, 2.15)"),
+]
+
+TIMER = "import time; _t0 = time.perf_counter(); {0}; print(time.perf_counter() - _t0)"
+
+
+def time_case(stmt, repeats):
+    """median wall time [s] of stmt over repeats fresh interpreters"""
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SRC_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    times = []
+    for i in range(repeats):
+        out = subprocess.check_output([sys.executable, '-c', TIMER.format(stmt)], env=env)
+        times.append(float(out.decode().split()[-1]))
+    times.sort()
+    return times[len(times)//2]
+
+
+def example(repeats=11):
+
+    # warm the OS file cache and the compiled PPI table cache
+    time_case(CASES[2][1], 1)
+
+    # time python itself importing numpy, the floor for any of the cases
+    base = time_case("import numpy", repeats)
+    print('{0:12s} {1:8.1f} ms'.format('numpy', base*1e3))
+    for name, stmt in CASES:
+        t = time_case(stmt, repeats)
+        print('{0:12s} {1:8.1f} ms  (+{2:.1f} ms over numpy)'.format(name, t*1e3, (t-base)*1e3))
+
+if __name__ == "__main__":
+
+    example(int(sys.argv[1]) if len(sys.argv) > 1 else 11)
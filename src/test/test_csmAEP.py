@@ -0,0 +1,58 @@
+"""
+test_csmAEP.py
+
+Checks of the AEP helpers in csmAEP.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+
+from nrelcsm.csmAEP import open_wind_record, timeseries_energy, AEPTable
+from nrelcsm.nrel_csm import aero_csm, aep_calc_csm
+
+
+def test_fortran_ordered_record_is_a_view(tmp_path):
+
+    filename = str(tmp_path / 'wind.npy')
+    wind = np.asfortranarray(np.arange(12., dtype='<f4').reshape(3, 4))
+    np.save(filename, wind)
+    record = open_wind_record(filename)
+    assert isinstance(record, np.memmap)
+    assert np.array_equal(record, wind.ravel(order='F'))
+
+
+def test_timeseries_energy_counts(tmp_path):
+
+    filename = str(tmp_path / 'wind.bin')
+    np.array([np.nan, 0.5, 4.0, 4.2, 10.0, 30.0, 25.0], dtype='<f4').tofile(filename)
+    record = open_wind_record(filename)
+    wind_curve = np.array([3.0, 4.0, 10.0, 25.0])
+    power_curve = np.array([0.0, 100.0, 1000.0, 1000.0])
+    for chunk_size in (2, 3, 100):
+        power_sum, n_valid, histogram, n_outside = timeseries_energy(record, wind_curve, power_curve, chunk_size=chunk_size)
+        assert n_valid == 6
+        assert n_outside == 2
+        assert np.array_equal(histogram, [0, 2, 1, 1])
+        assert np.isclose(power_sum, 100.0 + 130.0 + 1000.0 + 1000.0)
+
+
+def test_aep_table_matches_weibull_convolution(tmp_path):
+
+    aero = aero_csm()
+    aero.compute(5000., 80., 126., 0.488, 7.525, 3., 25., 90., 0., 0., 0.902, 0.5)
+    table = AEPTable(aero.power_curve, aero.wind_curve, 5000., np.arange(5., 11.01, 0.25), np.arange(1.5, 3.01, 0.1))
+    assert table.max_error['cubic'] < table.max_error['linear'] < 1e-3
+
+    # at 50 m hub height without shear the site mean speed is the hub height mean speed
+    aep = aep_calc_csm()
+    aep.compute(aero.power_curve, aero.wind_curve, 50., 0., 8.35, 2.1, 5000., 0., 0., 1., 1)
+    assert np.isclose(table.direct(8.35, 2.1), aep.capacity_factor, rtol=1e-12)
+    for method in ('linear', 'cubic'):
+        assert abs(table(8.35, 2.1, method) - aep.capacity_factor) <= table.max_error[method]
+
+    filename = str(tmp_path / 'table.npz')
+    table.save(filename)
+    loaded = AEPTable.load(filename)
+    assert loaded.max_error == table.max_error
+    assert loaded(np.array([6.1, 9.9]), 2.2, 'cubic').tolist() == table(np.array([6.1, 9.9]), 2.2, 'cubic').tolist()
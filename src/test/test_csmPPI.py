@@ -0,0 +1,149 @@
+"""
+test_csmPPI.py
+
+Checks of the PPI table cache, the compiled escalators and their memo caches.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+import nrelcsm
+from nrelcsm.csmPPI import PPI, PPITbl, read_ppi_tables
+
+PPI_TABLES = os.path.join(nrelcsm.__path__[0], 'static', 'PPI_Tables.txt')
+
+# one shared PPI object; tests that change it build their own
+PPI_OBJECT = PPI(2002, 9, 2009, 12)
+
+
+def test_table_cache_rebuilt_when_text_changes(tmp_path):
+
+    text = str(tmp_path / 'PPI_Tables.txt')
+    shutil.copy(PPI_TABLES, text)
+    tables = read_ppi_tables(text)
+    with np.load(str(tmp_path / 'PPI_Tables.npz')) as cache:
+        digest = str(cache['digest'])
+    assert tables['cost'][1, 0, 0] == 94.2
+
+    # January 2000 of the first NAICS table (3272123), after GDP
+    with open(text, 'rb') as f:
+        data = f.read()
+    with open(text, 'wb') as f:
+        f.write(data.replace(b'2000\t94.2\t', b'2000\t95.2\t', 1))
+    tables = read_ppi_tables(text)
+    with np.load(str(tmp_path / 'PPI_Tables.npz')) as cache:
+        assert str(cache['digest']) != digest
+        assert cache['cost'][1, 0, 0] == 95.2
+    assert tables['cost'][1, 0, 0] == 95.2
+
+
+def test_table_cache_write_failure(tmp_path, monkeypatch):
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    text = str(tmp_path / 'PPI_Tables.txt')
+    shutil.copy(PPI_TABLES, text)
+    monkeypatch.setattr(np, 'savez', fail)
+    tables = read_ppi_tables(text)
+    assert tables['cost'][1, 0, 0] == 94.2
+    assert os.listdir(str(tmp_path)) == ['PPI_Tables.txt']
+
+
+def test_ppi_table_rows_and_escalators():
+
+    table = PPITbl('1234567', 'test table')
+    table.add_row(2000, np.arange(1., 14.))
+    table.add_row(2001, np.arange(14., 24.))  # Nov, Dec and annual not published yet
+    assert table.years == [2000, 2001]
+    assert table.cost.shape == (2, 13)
+    assert table.flat[table.index(2001, 3)] == table.cost[1, 2] == 16.
+    assert table.getValue(2000, 13) == 13.
+    assert table.getEsc(2000, 2, 2001, 10) == 23. / 2.
+    assert np.array_equal(table.getEsc(2000, 1, np.array([2000, 2001]), 4), [4., 17.])
+
+    with pytest.raises(ValueError):
+        table.add_row(2003, np.arange(1., 14.))
+    with pytest.raises(IndexError):
+        table.getEsc(2000, 1, 2001, 12)  # not published
+    with pytest.raises(IndexError):
+        table.getEsc(2000, 1, 2002, 1)  # past the last year
+    with pytest.raises(IndexError):
+        table.index(2000, 14)
+
+
+def test_compiled_escalators_match_reference_escalators():
+
+    ppi = PPI_OBJECT
+    for code, esc in ppi.escData.items():
+        for year, month in [(2005, 3), (2009, 12), (2010, 13)]:
+            expected = esc.compute(ppi.ppitbls, 2002, 9, year, month)
+            assert np.isclose(ppi.escalate(code, 2002, 9, year, month), expected, rtol=1e-12), code
+
+
+def test_escalators_of_2d_dates():
+
+    ppi = PPI_OBJECT
+    years = np.array([[2009, 2010], [2010, 2009]])
+    hub = ppi.escalate('IPPI_HUB', 2002, 9, years, 12)
+    every = ppi.compute_all(curr=(years, 12))
+    assert hub.shape == years.shape
+    for (i, j), year in np.ndenumerate(years):
+        assert hub[i, j] == pytest.approx(ppi.escalate('IPPI_HUB', 2002, 9, int(year), 12), rel=1e-12)
+        # IPPI_BLA has a table pinned to its own start year
+        assert every['IPPI_BLA'][i, j] == pytest.approx(ppi.escalate('IPPI_BLA', 2002, 9, int(year), 12), rel=1e-12)
+
+
+def test_unknown_escalator_code():
+
+    with pytest.raises(KeyError, match='IPPI_XXX'):
+        PPI_OBJECT.escalate('IPPI_XXX', 2002, 9, 2009, 12)
+
+
+def test_escalator_memo_cache():
+
+    ppi = PPI(2002, 9, 2009, 12, cache_size=2)
+    first = ppi.compute('IPPI_HUB')
+    assert ppi.compute('IPPI_HUB') == first
+    ppi.compute('IPPI_BLL')
+    ppi.compute('IPPI_GRB')
+    info = ppi.cache_info()
+    assert (info['hits'], info['misses'], info['size'], info['maxsize']) == (1, 3, 2, 2)
+
+    ppi.compute('IPPI_HUB')  # evicted by the two newer codes
+    assert ppi.cache_info()['misses'] == 4
+    ppi.cache_clear()
+    assert ppi.cache_info()['size'] == 0
+
+
+def test_context_is_immutable():
+
+    ctx = PPI_OBJECT.context(curr_yr=2005)
+    later = ctx.replace(curr_yr=2010, curr_mon=3)
+    assert (ctx.curr_yr, ctx.curr_mon) == (2005, 12)
+    assert (later.ref_yr, later.curr_yr, later.curr_mon) == (2002, 2010, 3)
+    assert later.compute('IPPI_HUB') == PPI_OBJECT.escalate('IPPI_HUB', 2002, 9, 2010, 3)
+    with pytest.raises(AttributeError):
+        ctx.curr_yr = 2009
+    assert PPI_OBJECT.curr_yr == 2009
+
+
+def test_threaded_contexts_match_serial():
+
+    ppi = PPI(2002, 9, 2009, 12)
+    jobs = [(code, year, month) for code in sorted(ppi.escData) for year in (2003, 2006, 2009) for month in (1, 6, 13)]
+
+    def run(job):
+        code, year, month = job
+        return ppi.context(curr_yr=year, curr_mon=month).compute(code)
+
+    serial = [run(job) for job in jobs]
+    ppi.cache_clear()
+    with ThreadPoolExecutor(4) as pool:
+        threaded = list(pool.map(run, jobs * 4))
+    assert threaded == serial * 4
@@ -0,0 +1,55 @@
+"""
+test_csmRaster.py
+
+Checks of the tiled capacity factor rasters against cell by cell evaluations.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+
+from nrelcsm.csmRaster import raster_design, capacity_factor_raster
+from nrelcsm.nrel_csm import aero_csm, aep_calc_csm, opex_csm, fin_csm
+
+
+def test_tiles_match_cells(tmp_path):
+
+    aero = aero_csm()
+    aero.compute(5000., 80., 126., 0.488, 7.525, 3., 25., 90., 0., 0., 0.902, 0.5)
+    designs = [raster_design(aero.power_curve, aero.wind_curve, 5000., 90., 6.0e6, 3.0e8),
+               raster_design(aero.power_curve, aero.wind_curve, 5000., 110., 6.5e6, 3.2e8)]
+
+    rows, cols = np.mgrid[0:5, 0:7]
+    wind_speed = 5.0 + 0.2 * rows + 0.1 * cols
+    wind_speed[1, 2] = np.nan
+    weibull_k = 1.8 + 0.05 * cols
+    np.save(str(tmp_path / 'speed.npy'), wind_speed)
+    np.save(str(tmp_path / 'k.npy'), weibull_k)
+
+    tiled = capacity_factor_raster(str(tmp_path / 'speed.npy'), str(tmp_path / 'k.npy'), designs,
+                                   str(tmp_path / 'tiled'), tile_shape=(2, 3))
+    whole = capacity_factor_raster(str(tmp_path / 'speed.npy'), str(tmp_path / 'k.npy'), designs,
+                                   str(tmp_path / 'whole'))
+    for name in tiled:
+        assert np.array_equal(np.load(tiled[name]), np.load(whole[name]), equal_nan=True), name
+
+    capacity_factor = np.load(tiled['capacity_factor'])
+    net_aep = np.load(tiled['net_aep'])
+    lcoe = np.load(tiled['lcoe'])
+    assert capacity_factor.shape == (2, 5, 7)
+    assert np.isnan(capacity_factor[:, 1, 2]).all()
+
+    for d, design in enumerate(designs):
+        for (i, j), speed in np.ndenumerate(wind_speed):
+            if not np.isfinite(speed):
+                continue
+            aep = aep_calc_csm()
+            aep.compute(design['power_curve'], design['wind_curve'], design['hub_height'], 0.143, speed,
+                        weibull_k[i, j], 5000., 0.0, 0.06, 0.94287630736, 100)
+            opex = opex_csm()
+            opex.compute(0.0, 2009, 12, 100, 5000., aep.net_aep)
+            fin = fin_csm()
+            fin.compute(design['turbine_cost'], 100, design['bos_costs'], opex.avg_annual_opex, aep.net_aep, 0.0)
+            assert np.isclose(net_aep[d, i, j], aep.net_aep, rtol=1e-6)
+            assert np.isclose(capacity_factor[d, i, j], aep.net_aep / (8760. * 5000. * 100), rtol=1e-6)
+            assert np.isclose(lcoe[d, i, j], fin.lcoe, rtol=1e-6)
@@ -0,0 +1,60 @@
+"""
+test_csmWake.py
+
+Checks of the Jensen / Park wake losses.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+import pytest
+
+from nrelcsm.csmWake import ParkWakeModel
+from nrelcsm.nrel_csm import aero_csm, aep_calc_csm
+
+AERO = aero_csm()
+AERO.compute(5000., 80., 126., 0.488, 7.525, 3., 25., 90., 0., 0., 0.902, 0.5)
+
+
+def test_single_turbine_has_no_losses():
+
+    wake = ParkWakeModel([0.], [0.], 126., [0., 90., 180., 270.], [1., 1., 1., 1.])
+    turbine_losses, plant_loss = wake.losses(AERO.power_curve, AERO.wind_curve, 2.1, 9.0)
+    assert np.array_equal(wake.deficits, np.zeros((4, 1)))
+    assert np.array_equal(turbine_losses, [0.])
+    assert plant_loss == 0.0
+
+
+def test_crosswind_row_has_no_losses():
+
+    # a north-south row in a west wind
+    wake = ParkWakeModel([0., 0., 0.], [0., 500., 1000.], 126., [270.], [1.])
+    turbine_losses, plant_loss = wake.losses(AERO.power_curve, AERO.wind_curve, 2.1, 9.0)
+    assert np.array_equal(turbine_losses, np.zeros(3))
+    assert plant_loss == 0.0
+
+
+def test_downstream_turbine_loses_energy():
+
+    wake = ParkWakeModel([0., 630.], [0., 0.], 126., [270.], [1.], thrust_coefficient=0.75, wake_decay=0.05)
+    # fully waked: (1 - sqrt(1 - Ct)) * (R / (R + k*s))**2
+    assert wake.deficits[0, 0] == 0.0
+    assert np.isclose(wake.deficits[0, 1], 0.5 * (63. / (63. + 0.05 * 630.))**2, rtol=1e-12)
+
+    turbine_losses, plant_loss = wake.losses(AERO.power_curve, AERO.wind_curve, 2.1, 9.0)
+    assert turbine_losses[0] == 0.0
+    assert 0.0 < turbine_losses[1] < 1.0
+    assert np.isclose(plant_loss, 0.5 * turbine_losses[1], rtol=1e-12)
+
+    # beyond the cutoff the pair is ignored
+    far = ParkWakeModel([0., 630.], [0., 0.], 126., [270.], [1.], cutoff=4.0)
+    assert np.array_equal(far.deficits, np.zeros((1, 2)))
+
+
+def test_turbine_number_mismatch():
+
+    wake = ParkWakeModel([0., 630.], [0., 0.], 126., [270.], [1.])
+    aep = aep_calc_csm()
+    with pytest.raises(ValueError):
+        aep.compute(AERO.power_curve, AERO.wind_curve, 90., 0.143, 8.35, 2.1, 5000., 0., 0.1, 0.94, 100,
+                    wake_model=wake)
@@ -0,0 +1,274 @@
+"""
+test_nrel_csm.py
+
+Checks of the nrel_csm components, mostly of the batched and closed-form paths against the scalar models.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import math
+import numpy as np
+import pytest
+
+from nrelcsm.csmAEP import weibull
+from nrelcsm.csmPPI import PPI
+from nrelcsm.nrel_csm import aero_csm, aep_calc_csm, aep_csm, aep_matrix_csm, drivetrain_csm, nacelle_csm, \
+                             tcc_csm, turbine_csm, bos_csm, escalation_bundle, \
+                             BOS_BREAKDOWN, DRIVETRAIN_TYPES, NACELLE_DTYPE, TCC_OUTPUTS
+
+# 5 MW reference turbine and site
+AERO = (5000., 80., 126., 0.488, 7.525, 3., 25., 90., 0., 0., 0.902, 0.5)
+PLANT = (0., 0.1, 0.94, 100, 0.143, 8.35, 2.1)
+
+
+def reference_aep(**options):
+    aep = aep_csm()
+    aep.compute(*(AERO + PLANT), **options)
+    return aep.aep
+
+
+def test_weibull_broadcasts():
+
+    speeds = np.linspace(0.5, 30., 12)
+    shapes = np.array([[1.5], [2.0], [3.0]])
+    pdf = weibull(speeds, shapes, 9.0)
+    assert pdf.shape == (3, 12)
+    for (i, j), value in np.ndenumerate(pdf):
+        k = shapes[i, 0]
+        assert np.isclose(value, (k/9.0) * (speeds[j]/9.0)**(k-1) * math.exp(-(speeds[j]/9.0)**k), rtol=1e-12)
+
+
+def test_aero_batch_matches_scalar():
+
+    diameters = np.array([90., 126., 150.])
+    ratings = np.array([2000., 5000., 8000.])
+    batch = aero_csm()
+    batch.compute_batch(ratings, 80., diameters, 0.488, 7.525)
+    for i in range(diameters.size):
+        aero = aero_csm()
+        aero.compute(ratings[i], 80., diameters[i], *AERO[3:])
+        assert np.allclose(batch.power_curve[i], aero.power_curve, rtol=1e-12)
+        assert np.isclose(batch.rated_wind_speed[i], aero.rated_wind_speed, rtol=1e-12)
+        assert np.isclose(batch.rotor_torque[i], aero.rotor_torque, rtol=1e-12)
+        assert np.isclose(batch.rotor_thrust[i], aero.rotor_thrust, rtol=1e-12)
+
+
+def test_sites_match_single_site():
+
+    aero = aero_csm()
+    aero.compute(*AERO)
+    speeds = np.array([6.0, 7.5, 9.0])
+    shapes = np.array([1.8, 2.1, 2.5])
+    sites = aep_calc_csm()
+    sites.compute(aero.power_curve, aero.wind_curve, 90., 0.143, speeds, shapes, 5000., 0., 0.1, 0.94, 100)
+    for i in range(speeds.size):
+        site = aep_calc_csm()
+        site.compute(aero.power_curve, aero.wind_curve, 90., 0.143, speeds[i], shapes[i], 5000., 0., 0.1, 0.94, 100)
+        assert np.isclose(sites.net_aep[i], site.net_aep, rtol=1e-12)
+
+
+def test_exact_aep_close_to_binned():
+
+    # the exact mode does not model the drivetrain smoothing near zero and rated power
+    exact = reference_aep(exact=True).net_aep
+    assert abs(reference_aep().net_aep - exact) < 1e-3 * exact
+
+
+def test_gauss_error_estimate():
+
+    fine = reference_aep(quadrature='gauss', n_nodes=120).net_aep
+    gauss = reference_aep(quadrature='gauss', n_nodes=30)
+    assert abs(gauss.net_aep - fine) <= gauss.integration_error
+    assert gauss.integration_error < 1e-6 * fine
+    assert reference_aep().integration_error > 100 * gauss.integration_error
+
+    exact = reference_aep(exact=True)
+    assert exact.integration_error == 0.0
+    assert abs(gauss.net_aep - exact.net_aep) < 1e-4 * exact.net_aep
+
+
+def test_aep_matrix_matches_aep():
+
+    diameters = np.array([110., 126.])
+    hub_heights = np.array([80., 90.])
+    speeds = np.array([7.0, 8.35, 9.5])
+    shapes = np.array([1.9, 2.1, 2.4])
+    matrix = aep_matrix_csm()
+    matrix.compute(5000., 80., diameters, 0.488, 7.525, hub_heights, 0.143, speeds, shapes,
+                   soiling_losses=0., array_losses=0.1, availability=0.94, turbine_number=100, memory_budget=8*2*164)
+    assert matrix.net_aep.shape == (2, 3)
+    for i in range(diameters.size):
+        for j in range(speeds.size):
+            aep = aep_csm()
+            aep.compute(5000., 80., diameters[i], 0.488, 7.525, 3., 25., hub_heights[i], 0., 0., 0.902, 0.5,
+                        0., 0.1, 0.94, 100, 0.143, speeds[j], shapes[j])
+            assert np.isclose(matrix.net_aep[i, j], aep.aep.net_aep, rtol=1e-12)
+
+    # the second run reuses the weight matrices of every (hub height, site chunk)
+    misses = matrix.weight_cache.misses
+    matrix.compute(5000., 80., diameters, 0.488, 7.525, hub_heights, 0.143, speeds, shapes,
+                   soiling_losses=0., array_losses=0.1, availability=0.94, turbine_number=100, memory_budget=8*2*164)
+    assert matrix.weight_cache.misses == misses
+    assert matrix.weight_cache.hits == misses
+
+
+def test_sector_aep_reset_without_rose():
+
+    aero = aero_csm()
+    aero.compute(*AERO)
+    aep = aep_calc_csm()
+    aep.compute(aero.power_curve, aero.wind_curve, 90., 0.143, 8.35, 2.1, 5000., 0., 0.1, 0.94, 100,
+                wind_rose=([1., 2., 1.], [7., 9., 8.], [2., 2.2, 1.9]))
+    assert np.isclose(aep.sector_aep.sum(), aep.net_aep, rtol=1e-12)
+    aep.compute(aero.power_curve, aero.wind_curve, 90., 0.143, 8.35, 2.1, 5000., 0., 0.1, 0.94, 100)
+    assert aep.sector_aep.size == 0
+
+
+def test_load_curves():
+
+    aero = aero_csm()
+    aero.compute(*AERO, load_curves=True)
+    wind = aero.wind_curve
+    rated = aero.rated_wind_speed
+    operating = (wind > 3.) & (wind < 25.)
+    assert np.isclose(aero.torque_curve.max(), aero.rotor_torque, rtol=1e-12)
+    assert np.isclose(aero.loadCurves(rated, 0., aero.windOmegaT, aero.omegaTflag, aero.air_density, 0.5)[0],
+                      aero.rotor_thrust, rtol=1e-12)
+    assert np.all(aero.thrust_curve[~operating] == 0.0) and np.all(aero.torque_curve[~operating] == 0.0)
+    above = operating & (wind > rated)
+    assert np.allclose(aero.thrust_curve[above] * wind[above], aero.rotor_thrust * rated, rtol=1e-12)
+
+    batch = aero_csm()
+    batch.compute_batch(np.array([2000., 5000.]), 80., np.array([90., 126.]), 0.488, 7.525, load_curves=True)
+    assert np.allclose(batch.thrust_curve[1], aero.thrust_curve, rtol=1e-12)
+    assert np.allclose(batch.torque_curve[1], aero.torque_curve, rtol=1e-12)
+
+    aep = aep_calc_csm()
+    summary = aep.load_summary(wind, {'thrust': aero.thrust_curve, 'one': np.ones(wind.size)}, 90., 0.143, 8.35, 2.1)
+    total = summary['one']['mean']
+    assert np.isclose(summary['one']['equivalent'], total**0.25, rtol=1e-12)
+    thrust = summary['thrust']
+    assert thrust['mean'] < thrust['rms'] < thrust['equivalent'] / total**0.25 <= thrust['max'] <= aero.rotor_thrust
+
+
+def test_power_curve_cache_hit_gives_same_aep():
+
+    aep = aep_csm()
+    aep.compute(*(AERO + PLANT))
+    aep.compute(5000., 80., 110., *(AERO[3:] + PLANT))
+    assert aep.power_curve_cache.info()['misses'] == 2
+
+    # same aero inputs with other plant losses, then the first design again
+    aep.compute(*(AERO + (0., 0.2) + PLANT[2:]))
+    lossy = aep.aep.net_aep
+    aep.compute(*(AERO + PLANT))
+    assert aep.power_curve_cache.info()['hits'] == 2
+
+    uncached = aep_csm(cache_size=0)
+    uncached.compute(*(AERO + PLANT))
+    assert np.array_equal(aep.drivetrain.power, uncached.drivetrain.power)
+    assert aep.aep.net_aep == uncached.aep.net_aep
+    assert np.isclose(lossy, uncached.aep.net_aep * 0.8 / 0.9, rtol=1e-12)
+    assert uncached.power_curve_cache.info()['size'] == 0
+
+
+def test_drivetrain_jacobian_matches_finite_differences():
+
+    aero = aero_csm()
+    aero.compute(*AERO)
+    power = aero.power_curve[(aero.wind_curve > 3.) & (aero.wind_curve < 25.)]
+    drivetrain = drivetrain_csm('geared')
+    drivetrain.compute(power, 0., 0., 5000.)
+    J = drivetrain.provideJ()
+    assert np.array_equal(J.toarray(), drivetrain.provideJ(dense=True))
+
+    # each power bin depends on its own aero power only, so all bins can be stepped at once
+    step = 1e-3
+    fd = drivetrain_csm('geared')
+    fd.compute(power + step, 0., 0., 5000.)
+    upper = fd.power
+    fd.compute(power - step, 0., 0., 5000.)
+    assert np.allclose(J.diagonal, (upper - fd.power) / (2*step), rtol=1e-6)
+
+    fd.compute(power, 0., 0., 5000. + step)
+    upper = fd.power
+    fd.compute(power, 0., 0., 5000. - step)
+    assert np.allclose(J.columns[:, 0], (upper - fd.power) / (2*step), rtol=1e-6, atol=1e-10)
+
+
+@pytest.mark.parametrize('drivetrain_design', DRIVETRAIN_TYPES)
+def test_nacelle_batch_matches_scalar(drivetrain_design):
+
+    diameters = np.array([90., 126.])
+    torques = np.array([1.5e6, 4.4e6])
+    batch = nacelle_csm()
+    rec = batch.compute_batch(diameters, 1.2e5, 5.0e5, torques, 5000., drivetrain_design, crane=[True, False])
+    for i in range(diameters.size):
+        nacelle = nacelle_csm()
+        nacelle.compute(diameters[i], 1.2e5, 5.0e5, torques[i], 5000., drivetrain_design, crane=bool(i == 0))
+        for name in NACELLE_DTYPE.names:
+            assert np.isclose(rec[name][i], getattr(nacelle, name), rtol=1e-12, atol=1e-9), name
+
+
+def test_turbine_offshore_mask():
+
+    offshore = np.array([False, True])
+    batch = turbine_csm()
+    batch.compute(4.0e5, 1.7e4, 3.0e5, 5.0e4, 2.4e5, 3.0e6, 1.5e6, 3.5e5, 3, offshore)
+    for i in range(offshore.size):
+        turbine = turbine_csm()
+        turbine.compute(4.0e5, 1.7e4, 3.0e5, 5.0e4, 2.4e5, 3.0e6, 1.5e6, 3.5e5, 3, bool(offshore[i]))
+        assert np.isclose(batch.turbine_cost[i], turbine.turbine_cost, rtol=1e-12)
+        for name in ('d_cost_d_blade_cost', 'd_cost_d_hub_cost', 'd_cost_d_nacelle_cost', 'd_cost_d_tower_cost'):
+            assert np.isclose(getattr(batch, name)[i], getattr(turbine, name), rtol=1e-12), name
+
+
+def test_tcc_batch_matches_scalar():
+
+    diameters = np.array([90., 126., 150.])
+    offshore = np.array([False, True, True])
+    designs = np.array(['geared', 'single_stage', 'pm_direct_drive'])
+    batch = tcc_csm()
+    breakdown = batch.compute_batch(diameters, 5000., 90., 5.0e5, 4.4e6, 2009, 12, offshore=offshore,
+                                    drivetrain_design=designs)
+    for i in range(diameters.size):
+        tcc = tcc_csm()
+        tcc.compute(diameters[i], 5000., 90., 5.0e5, 4.4e6, 2009, 12, offshore=bool(offshore[i]),
+                    drivetrain_design=str(designs[i]))
+        for component, name in TCC_OUTPUTS:
+            assert np.isclose(breakdown[name][i], getattr(getattr(tcc, component), name), rtol=1e-12), name
+
+
+def test_bos_batch_matches_scalar():
+
+    depths = np.array([0., 10., 29.9, 30., 45.])
+    batch = bos_csm()
+    breakdown = batch.compute_batch(5000., 126., 90., 6e6, 100, depths, 2009, 12)
+    for i in range(depths.size):
+        bos = bos_csm()
+        bos.compute(5000., 126., 90., 3.0e5, 6e6, 100, depths[i], 2009, 12)
+        assert np.isclose(batch.bos_costs[i], bos.bos_costs, rtol=1e-12)
+        for name in BOS_BREAKDOWN:
+            assert np.isclose(breakdown[name][i], getattr(bos, name), rtol=1e-12), name
+
+    batch.compute_batch(5000., 126., 90., 6e6, 100, 80., 2009, 12)
+    assert np.isnan(batch.bos_costs)
+
+
+def test_escalation_bundle_follows_ppi_tables():
+
+    ppi = PPI(2002, 9, 2009, 12)
+    context = ppi.context()
+    before = dict(escalation_bundle(2009, 12, True, context))
+    assert escalation_bundle(2009, 12, True, context) == before
+    assert ppi.cache_info()['bundles']['hits'] == 1
+
+    # double every table in the current month; bundles cached before the clear must not be reused
+    ppi.flat[:, ppi._index(2009, 12)] *= 2.0
+    ppi.cache_clear()
+    after = escalation_bundle(2009, 12, True, context)
+    for code in before:
+        assert np.isclose(after[code], 2.0 * before[code], rtol=1e-12), code
+
+    ppi.compile()
+    assert escalation_bundle(2009, 12, True, context) == before
@@ -0,0 +1,53 @@
+"""
+test_utilities.py
+
+Checks of the helper classes in utilities.
+
+Copyright (c) NREL. All rights reserved.
+"""
+
+import numpy as np
+
+from nrelcsm.utilities import LRUCache, DiagonalJacobian
+
+
+def test_lru_cache_bound_and_eviction():
+
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.info() == {'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2}
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2}
+
+
+def test_lru_cache_disabled():
+
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert len(cache) == 0
+    assert cache.get('a', 'default') == 'default'
+
+
+def test_diagonal_jacobian_matches_dense():
+
+    rng = np.random.RandomState(0)
+    diagonal = rng.rand(2, 5)
+    columns = rng.rand(2, 5, 1)
+    J = DiagonalJacobian(diagonal, columns)
+    dense = np.concatenate([diagonal[:, :, np.newaxis] * np.eye(5), columns], axis=-1)
+    assert J.shape == (2, 5, 6)
+    assert np.array_equal(J.toarray(), dense)
+    assert np.array_equal(np.asarray(J), dense)
+
+    x = rng.rand(2, 6)
+    v = rng.rand(2, 5)
+    assert np.allclose(J.dot(x), np.einsum('bij,bj->bi', dense, x), rtol=1e-14)
+    assert np.allclose(J.rdot(v), np.einsum('bi,bij->bj', v, dense), rtol=1e-14)